@@ -0,0 +1,90 @@
+"""
+Cached token authentication
+API tokens are resolved to their users through the cache, so token authenticated requests
+don't look the token and the user up in the database every time
+Entries expire after NOTES_TOKEN_CACHE_TIMEOUT seconds and are dropped right away
+once a token is deleted or rotated and once its user is changed, deactivated or deleted
+Cache keys contain a hash of the token, not the token itself
+Deletions only reach processes sharing the Django cache, so tokens are not cached unless NOTES_SHARED_CACHE is set
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+KEY_PREFIX = "token:"
+
+
+def is_enabled():
+    """
+    Returns whether tokens are cached
+    Setting NOTES_TOKEN_CACHE_TIMEOUT to 0 or a process-local cache (NOTES_SHARED_CACHE unset) turns the cache off
+    :return: bool
+    """
+    return bool(settings.NOTES_TOKEN_CACHE_TIMEOUT) and settings.NOTES_SHARED_CACHE
+
+
+def get_key(token_key):
+    """
+    Returns cache key of the token
+    :param token_key: API token
+    :return: str
+    """
+    return f"{KEY_PREFIX}{hashlib.sha256(token_key.encode()).hexdigest()}"
+
+
+def invalidate(token_keys):
+    """
+    Drops cached tokens once the current transaction is committed
+    :param token_keys: iterable of API tokens
+    :return: None
+    """
+    keys = [get_key(token_key) for token_key in token_keys]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication reading tokens with their users from the cache
+    Only tokens of active users are cached
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_enabled():
+            return super().authenticate_credentials(key)
+        cache_key = get_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token, timeout=settings.NOTES_TOKEN_CACHE_TIMEOUT)
+        elif not token.user.is_active:
+            raise AuthenticationFailed("User inactive or deleted.")
+        return token.user, token
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    """
+    Drops the cached token when it is rotated or deleted
+    """
+    invalidate([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Drops cached tokens of a changed or deactivated user
+    Logins only update last_login which cached tokens don't depend on
+    """
+    if created or (update_fields is not None and set(update_fields) <= {"last_login"}):
+        return
+    invalidate(Token.objects.filter(user=instance).values_list("key", flat=True))
@@ -0,0 +1,60 @@
+"""
+Streaming export of notes
+Notes are loaded in primary key batches, so every query is short
+and only a single batch is kept in memory however many notes a user has
+Every note is written as a json line of the private note serializer (NDJSON)
+"""
+import zlib
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from api.serializers import PrivateNoteSerializer
+
+# amount of notes loaded with a single query
+BATCH_SIZE = 500
+
+
+def iter_batches(queryset, batch_size=BATCH_SIZE):
+    """
+    Yields lists of notes in primary key order
+    :param queryset: notes to export
+    :param batch_size: int
+    :return: generator of lists of Note
+    """
+    queryset = queryset.order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        last_pk = batch[-1].pk
+
+
+def iter_ndjson(queryset, batch_size=BATCH_SIZE):
+    """
+    Yields encoded json lines of the notes, one chunk per batch
+    :param queryset: notes to export
+    :param batch_size: int
+    :return: generator of bytes
+    """
+    encoder = JSONEncoder(ensure_ascii=False)
+    for batch in iter_batches(queryset, batch_size):
+        lines = [encoder.encode(data) for data in PrivateNoteSerializer(batch, many=True).data]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def iter_gzip(chunks):
+    """
+    Compresses a stream of chunks into a gzip stream
+    :param chunks: iterable of bytes
+    :return: generator of bytes
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
@@ -0,0 +1,206 @@
+"""
+Note API view mixins
+Conditional request support:
+ETag and Last-Modified validators are derived from date_edited with a lightweight query,
+so unchanged notes are answered with 304 Not Modified without loading or serializing bodies
+Sparse fieldsets:
+clients pick the returned fields with the "fields" url param and only those are loaded from the database
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.exceptions import NotFound, ValidationError
+
+
+def make_etag(*parts):
+    """
+    Returns a strong quoted ETag built from the parts
+    :param parts: values identifying a version of a resource
+    :return: str
+    """
+    digest = hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Adds ETag and Last-Modified headers to the response
+    :param response:
+    :param etag: str
+    :param last_modified: datetime or None
+    :return: response
+    """
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(int(last_modified.timestamp()))
+    return response
+
+
+class ConditionalObjectMixin:
+    """
+    Mixin for single note views
+    Fields listed in etag_fields make up the ETag,
+    they have to cover everything the serializer returns that can change without date_edited
+    Url params listed in etag_params change the representation, they are added to the ETag if present
+    """
+    etag_fields = ("date_edited",)
+    etag_params = ()
+
+    def get_etag_params(self):
+        """
+        Returns the representation url params of the request
+        :return: list of str
+        """
+        params = [(name, self.request.query_params.get(name)) for name in self.etag_params]
+        return [f"{name}={value}" for name, value in params if value]
+
+    def get_object_validators(self):
+        """
+        Returns ETag and Last-Modified of the requested note without loading the note itself
+        :return: (etag, last_modified)
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        row = queryset.filter(pk=self.kwargs["pk"]).values_list("pk", *self.etag_fields).first()
+        if row is None:
+            raise NotFound()
+        return make_etag(*row, *self.get_etag_params()), row[1]
+
+    def get_instance_validators(self, instance):
+        """
+        Returns ETag and Last-Modified of a loaded note
+        :param instance: Note
+        :return: (etag, last_modified)
+        """
+        row = [instance.pk, *[getattr(instance, name) for name in self.etag_fields]]
+        return make_etag(*row, *self.get_etag_params()), row[1]
+
+
+class ConditionalRetrieveMixin(ConditionalObjectMixin):
+    """
+    Answers If-None-Match and If-Modified-Since with 304 Not Modified
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = self.get_object_validators()
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+
+class ConditionalUpdateMixin(ConditionalObjectMixin):
+    """
+    Rejects an update with 412 Precondition Failed
+    if the If-Match (or If-Unmodified-Since) header doesn't match the current note
+    Returns validators of the updated note
+    """
+
+    def update(self, request, *args, **kwargs):
+        if "HTTP_IF_MATCH" in request.META or "HTTP_IF_UNMODIFIED_SINCE" in request.META:
+            etag, last_modified = self.get_object_validators()
+            response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+            if response is not None:
+                return response
+        response = super().update(request, *args, **kwargs)
+        return set_validators(response, *self.get_instance_validators(self._updated_object))
+
+    def get_object(self):
+        """
+        Keeps the updated note to build validators of its new version
+        :return: Note
+        """
+        self._updated_object = super().get_object()
+        return self._updated_object
+
+
+class ConditionalListMixin:
+    """
+    Answers If-None-Match and If-Modified-Since for list pages with 304 Not Modified
+    ETag is built from the latest date_edited and the amount of notes in the list
+    together with the url, so every page has its own ETag
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        summary = queryset.order_by().aggregate(last_modified=Max("date_edited"), count=Count("id"))
+        last_modified = summary["last_modified"]
+        etag = make_etag(request.get_full_path(), last_modified, summary["count"])
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None
+        )
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+
+class SparseFieldsMixin:
+    """
+    Returns only the note fields listed in the "fields" url param, e.g. ?fields=id,name,date_edited
+    and loads only them from the database
+    "summary" url param replaces the html body with its excerpt
+    Ordering fields needed for keyset pagination are always loaded
+    Requires a serializer with api.serializers.SparseFieldsSerializerMixin
+    """
+    fields_param = "fields"
+    summary_param = "summary"
+    # sparse representations get their own ETags
+    etag_params = (fields_param, summary_param)
+    # model fields loaded for serializer fields backed by relations
+    field_sources = {"user": ("user", "user__username")}
+
+    def is_summary(self):
+        """
+        Returns whether excerpts are requested instead of bodies
+        :return: bool
+        """
+        return self.request.query_params.get(self.summary_param, "").lower() in ("1", "true")
+
+    def get_requested_fields(self):
+        """
+        Returns names of the requested fields
+        Unknown names are rejected with 400 Bad Request
+        :return: list of str or None if all fields are requested
+        """
+        if not hasattr(self, "_requested_fields"):
+            value = self.request.query_params.get(self.fields_param, "")
+            fields = [name.strip() for name in value.split(",") if name.strip()] or None
+            if fields is not None:
+                available = self.get_serializer_class()(context={"summary": self.is_summary()}).fields
+                unknown = [name for name in fields if name not in available]
+                if unknown:
+                    raise ValidationError({self.fields_param: f"Unknown fields: {', '.join(unknown)}."})
+            self._requested_fields = fields
+        return self._requested_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fields"] = self.get_requested_fields()
+        context["summary"] = self.is_summary()
+        return context
+
+    def filter_queryset(self, queryset):
+        """
+        Loads only the fields of the requested representation
+        :param queryset: QuerySet or SearchResults
+        :return:
+        """
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_requested_fields()
+        if fields is None and not self.is_summary():
+            return queryset
+        if fields is None:
+            fields = self.get_serializer_class()(context={"summary": True}).fields
+
+        load = {"id"}
+        for name in fields:
+            load.update(self.field_sources.get(name, (name,)))
+        query = getattr(queryset, "query", None)
+        if query is not None:
+            load.update(name.lstrip("-") for name in query.order_by)
+        if "user" not in load:
+            # a deferred relation can't be joined
+            queryset = queryset.select_related(None)
+        return queryset.only(*load)
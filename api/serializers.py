@@ -3,17 +3,48 @@ from note.models import Note
 from django.contrib.auth.models import User
 
 
-class PublicNoteSerializer(serializers.ModelSerializer):
+class SparseFieldsSerializerMixin:
+    """
+    Serializer mixin returning only the fields listed in the "fields" context value
+    The "summary" context value replaces the html body with its excerpt
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.context.get("summary") and "body" in self.fields:
+            self.fields.pop("body")
+            self.fields["excerpt"] = serializers.CharField(read_only=True)
+        fields = self.context.get("fields")
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class PublicNoteSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for API Note model
+    Shows the author's username
     """
+    user = serializers.SlugRelatedField(slug_field="username", read_only=True)
 
     class Meta:
         model = Note
         fields = ["id", "user", "name", "date_created", "date_edited", "likes", "body"]
 
 
-class PrivateNoteSerializer(serializers.ModelSerializer):
+class HomepageNoteSerializer(serializers.ModelSerializer):
+    """
+    Serializer for API Note model for the homepage
+    Shows the precalculated excerpt instead of the body
+    """
+    user = serializers.SlugRelatedField(slug_field="username", read_only=True)
+
+    class Meta:
+        model = Note
+        fields = ["id", "user", "name", "date_created", "date_edited", "likes", "excerpt"]
+
+
+class PrivateNoteSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for API Note model
     """
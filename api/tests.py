@@ -0,0 +1,369 @@
+import datetime
+import gzip
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api import export, throttling
+from note import counters
+from note.models import Note, NoteLike, NoteStats
+from note.search import SearchResults
+
+
+class ConditionalRequestTest(TestCase):
+    """
+    Checks ETag and Last-Modified handling of note API endpoints
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="reader")
+        self.note = Note.objects.create(user=self.user, name="Note", body="<p>body</p>", public=True)
+        self.client.force_login(self.user)
+
+    def assert_not_modified(self, url, response):
+        etag = response["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+        # the note itself is never loaded
+        self.assertFalse(any('"body"' in query["sql"] for query in queries.captured_queries))
+
+        not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_retrieve(self):
+        for url in (f"/api/private/{self.note.pk}", f"/api/public/{self.note.pk}"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assert_not_modified(url, response)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.note.set_date_edited()
+                self.note.save()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_public_etag_follows_likes(self):
+        url = f"/api/public/{self.note.pk}"
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.note.change_like_user(self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get("/api/public/0").status_code, 404)
+
+    def test_list(self):
+        url = "/api/private"
+        response = self.client.get(url)
+        self.assert_not_modified(url, response)
+        self.assertNotEqual(self.client.get(url + "?page=1")["ETag"], response["ETag"])
+
+        Note.objects.create(user=self.user, name="Other", body="", date_edited=self.note.date_edited)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_if_match(self):
+        url = f"/api/private/{self.note.pk}/edit"
+        etag = self.client.get(f"/api/private/{self.note.pk}")["ETag"]
+
+        response = self.client.patch(url, {"name": "First"}, content_type="application/json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response["ETag"], self.client.get(f"/api/private/{self.note.pk}")["ETag"])
+
+        # the stale version is rejected
+        response = self.client.patch(url, {"name": "Second"}, content_type="application/json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.name, "First")
+
+
+class BulkApiTest(TestCase):
+    """
+    Checks bulk create, update and delete api endpoints
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="writer")
+        self.foreign = Note.objects.create(user=User.objects.create(username="stranger"), name="Foreign", body="")
+        self.client.force_login(self.user)
+
+    def post(self, url, data, method="post"):
+        return getattr(self.client, method)(url, data, content_type="application/json")
+
+    def test_create(self):
+        items = [{"name": f"Bulk {i}", "body": "<p>bulk <script>x</script></p>", "public": i % 2 == 0}
+                 for i in range(50)]
+        items.insert(3, {"body": "no name"})
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.post("/api/private/bulk/create", items)
+        self.assertLess(len(queries), 15)
+
+        results = response.json()["results"]
+        self.assertEqual(results[3]["status"], 400)
+        self.assertIn("name", results[3]["errors"])
+        created = [result["note"] for result in results if result["status"] == 201]
+        self.assertEqual([note["name"] for note in created], [f"Bulk {i}" for i in range(50)])
+        for note in created:
+            self.assertEqual(Note.objects.get(pk=note["id"]).name, note["name"])
+
+        note = Note.objects.get(name="Bulk 0")
+        self.assertNotIn("<script>", note.body)
+        self.assertTrue(note.excerpt)
+        stats = NoteStats.for_user(self.user)
+        self.assertEqual((stats.total_notes, stats.public_notes, stats.incomplete_notes), (50, 25, 50))
+        self.assertEqual(counters.get_counters()["total_notes"], 51)
+        self.assertEqual(SearchResults("bulk", user=self.user).count(), 50)
+
+    def test_update(self):
+        notes = [Note.objects.create(user=self.user, name=f"Note {i}", body="<p>old</p>") for i in range(3)]
+        items = [
+            {"id": notes[0].pk, "name": "Renamed", "public": True},
+            {"id": notes[1].pk, "body": "<p>fresh</p>", "completed": True},
+            {"id": notes[1].pk, "name": "Twice"},
+            {"id": notes[2].pk, "name": ""},
+            {"id": self.foreign.pk, "name": "Stolen"},
+            {"name": "No id"},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post("/api/private/bulk/edit", items, method="patch")
+        statuses = [result["status"] for result in response.json()["results"]]
+        self.assertEqual(statuses, [200, 200, 400, 400, 404, 404])
+        self.assertEqual(response.json()["results"][0]["note"]["name"], "Renamed")
+
+        notes[0].refresh_from_db()
+        notes[1].refresh_from_db()
+        self.foreign.refresh_from_db()
+        self.assertEqual((notes[0].name, notes[0].public), ("Renamed", True))
+        self.assertEqual((notes[1].body, notes[1].excerpt, notes[1].completed), ("<p>fresh</p>", "<p>fresh</p>", True))
+        self.assertEqual(self.foreign.name, "Foreign")
+
+        stats = NoteStats.for_user(self.user)
+        self.assertEqual((stats.total_notes, stats.public_notes, stats.incomplete_notes), (3, 1, 2))
+        self.assertEqual(SearchResults("fresh", user=self.user).count(), 1)
+        self.assertEqual(SearchResults("renamed", user=self.user).count(), 1)
+
+    def test_delete(self):
+        notes = [Note.objects.create(user=self.user, name=f"Gone {i}", body="", public=True) for i in range(3)]
+        NoteLike.objects.create(note=notes[0], user=self.user)
+        ids = [notes[0].pk, notes[1].pk, self.foreign.pk, "x"]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post("/api/private/bulk/delete", ids)
+        self.assertEqual([result["status"] for result in response.json()["results"]], [204, 204, 404, 404])
+
+        self.assertEqual(list(Note.objects.filter(user=self.user)), [notes[2]])
+        self.assertTrue(Note.objects.filter(pk=self.foreign.pk).exists())
+        self.assertFalse(NoteLike.objects.exists())
+        stats = NoteStats.for_user(self.user)
+        self.assertEqual((stats.total_notes, stats.public_notes), (1, 1))
+        self.assertEqual(SearchResults("gone", user=self.user).count(), 1)
+
+    def test_boolean_ids(self):
+        # json true equals 1 in python, it must not address the note with id 1
+        Note.objects.filter(pk=1).delete()
+        Note.objects.create(pk=1, user=self.user, name="First", body="")
+        response = self.post("/api/private/bulk/edit", [{"id": True, "name": "Renamed"}], method="patch")
+        self.assertEqual(response.json()["results"][0]["status"], 404)
+        response = self.post("/api/private/bulk/delete", [True])
+        self.assertEqual(response.json()["results"][0]["status"], 404)
+        self.assertEqual(Note.objects.get(pk=1).name, "First")
+
+    def test_limits(self):
+        self.assertEqual(self.post("/api/private/bulk/create", {"name": "not a list"}).status_code, 400)
+        with self.settings(NOTES_BULK_MAX_ITEMS=2):
+            self.assertEqual(self.post("/api/private/bulk/delete", [1, 2, 3]).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.post("/api/private/bulk/delete", [1]).status_code, 401)
+
+
+class ExportTest(TestCase):
+    """
+    Checks streaming NDJSON export of private notes
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username="exporter")
+        now = timezone.now()
+        for i in range(5):
+            Note.objects.create(user=self.user, name=f"Export {i}", body=f"<p>{i}</p>",
+                                date_edited=now - datetime.timedelta(days=i))
+        Note.objects.create(user=User.objects.create(username="stranger"), name="Foreign", body="")
+        self.client.force_login(self.user)
+
+    def read_lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        content = b"".join(response.streaming_content)
+        if response.get("Content-Encoding") == "gzip":
+            content = gzip.decompress(content)
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def test_export(self):
+        response = self.client.get("/api/private/export")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        notes = self.read_lines(response)
+        self.assertEqual([note["name"] for note in notes], [f"Export {i}" for i in range(5)])
+        self.assertEqual(notes[0]["body"], "<p>0</p>")
+
+        compressed = self.client.get("/api/private/export", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(self.read_lines(compressed), notes)
+
+    def test_since(self):
+        since = (timezone.now() - datetime.timedelta(days=2, hours=1)).isoformat()
+        notes = self.read_lines(self.client.get("/api/private/export", {"since": since}))
+        self.assertEqual([note["name"] for note in notes], ["Export 0", "Export 1", "Export 2"])
+        since = (timezone.localdate() + datetime.timedelta(days=1)).isoformat()
+        self.assertEqual(self.read_lines(self.client.get("/api/private/export", {"since": since})), [])
+        self.assertEqual(self.client.get("/api/private/export", {"since": "2021-13-01"}).status_code, 400)
+
+    def test_batches(self):
+        batches = list(export.iter_batches(Note.objects.filter(user=self.user), batch_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+
+
+class SparseFieldsTest(TestCase):
+    """
+    Checks the "fields" and "summary" url params of note API endpoints
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="reader")
+        self.note = Note.objects.create(user=self.user, name="Note", body="<p>" + "long body " * 100 + "</p>",
+                                        public=True)
+        self.client.force_login(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if '"note_note"."body"' in query["sql"]])
+        return response.json()
+
+    def test_fields(self):
+        self.assertEqual(self.get("/api/private?fields=id,name")["results"], [{"id": self.note.pk, "name": "Note"}])
+        self.assertEqual(self.get("/api/public?fields=name,user")["results"], [{"user": "reader", "name": "Note"}])
+        self.assertEqual(self.client.get(f"/api/public/{self.note.pk}?fields=likes").json(), {"likes": 0})
+        self.assertEqual(self.get("/api/search?q=note&fields=name")["results"], [{"name": "Note"}])
+        response = self.client.get("/api/private?fields=name,secret")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("secret", response.json()["fields"])
+
+    def test_summary(self):
+        note = self.get(f"/api/private/{self.note.pk}?summary=1")
+        self.assertNotIn("body", note)
+        self.assertEqual(note["excerpt"], self.note.excerpt)
+        self.assertEqual(self.get("/api/public?summary=true&fields=id,excerpt")["results"],
+                         [{"id": self.note.pk, "excerpt": self.note.excerpt}])
+
+    def test_etag_per_representation(self):
+        url = f"/api/private/{self.note.pk}"
+        etag = self.client.get(url)["ETag"]
+        self.assertNotEqual(self.client.get(f"{url}?fields=name")["ETag"], etag)
+        self.assertEqual(self.client.get(f"{url}?fields=name", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(NOTES_SHARED_CACHE=True)
+class TokenCacheTest(TestCase):
+    """
+    Checks cached token authentication of the private api
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="client")
+        self.token = Token.objects.create(user=self.user)
+
+    def get(self, token):
+        return self.client.get("/api/private", HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_cached(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(self.token).status_code, 200)
+        self.assertTrue([query for query in queries if "authtoken_token" in query["sql"]])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(self.token).status_code, 200)
+        self.assertFalse([query for query in queries if "authtoken_token" in query["sql"]])
+        self.assertEqual(self.client.get("/api/private", HTTP_AUTHORIZATION="Token wrong").status_code, 401)
+
+    def test_rotation(self):
+        self.get(self.token)
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get("/profile/generate-token")
+        self.client.logout()
+        self.assertEqual(self.get(self.token).status_code, 401)
+        self.assertEqual(self.get(Token.objects.get(user=self.user)).status_code, 200)
+
+    @override_settings(NOTES_SHARED_CACHE=False)
+    def test_requires_shared_cache(self):
+        self.get(self.token)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(self.token).status_code, 200)
+        self.assertTrue([query for query in queries if "authtoken_token" in query["sql"]])
+
+    def test_deactivation(self):
+        self.get(self.token)
+        # logins don't drop cached tokens
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.last_login = timezone.now()
+            self.user.save(update_fields=["last_login"])
+        with self.assertNumQueries(2):
+            self.get(self.token)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.get(self.token).status_code, 401)
+
+
+@override_settings(NOTES_API_THROTTLE_RATES={"user_read": "2/min", "user_write": "1/min",
+                                               "ip_read": "3/min", "ip_write": None})
+class ThrottleTest(TestCase):
+    """
+    Checks sliding window rate limits of the api
+    """
+
+    def setUp(self):
+        cache.clear()
+        throttling.clear()
+        self.user = User.objects.create(username="client")
+        self.token = Token.objects.create(user=self.user)
+        self.headers = {"HTTP_AUTHORIZATION": f"Token {self.token.key}"}
+
+    def test_user_limits(self):
+        self.assertEqual(self.client.get("/api/private", **self.headers).status_code, 200)
+        self.assertEqual(self.client.get("/api/private", **self.headers).status_code, 200)
+        response = self.client.get("/api/private", **self.headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response["Retry-After"]) <= 120)
+
+        # writes have their own budget
+        self.assertEqual(self.client.post("/api/create", {}, **self.headers).status_code, 400)
+        self.assertEqual(self.client.post("/api/create", {}, **self.headers).status_code, 429)
+
+        other = Token.objects.create(user=User.objects.create(username="other"))
+        self.assertEqual(self.client.get("/api/private", HTTP_AUTHORIZATION=f"Token {other.key}").status_code, 200)
+
+    def test_ip_limits(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get("/api/search?q=note").status_code, 200)
+        self.assertEqual(self.client.get("/api/search?q=note").status_code, 429)
+        self.assertEqual(self.client.get("/api/search?q=note", REMOTE_ADDR="10.0.0.1").status_code, 200)
+        # public read endpoints are not limited
+        for _ in range(5):
+            self.assertEqual(self.client.get("/api/public").status_code, 200)
+
+    def test_wait(self):
+        # the previous window alone is over the limit until its weight drops
+        self.assertAlmostEqual(throttling.get_wait(10, 0, 5, 0, 60), 30)
+        # the current window is over the limit once it becomes the previous one
+        self.assertAlmostEqual(throttling.get_wait(0, 10, 5, 30, 60), 60)
+        self.assertEqual(throttling.parse_rate("100/min"), (100, 60))
+        self.assertIsNone(throttling.parse_rate(None))
@@ -0,0 +1,161 @@
+"""
+API rate limits of the private, write and search endpoints
+Authenticated requests are limited per token (or logged user), anonymous ones per client IP address,
+reads (GET, HEAD, OPTIONS) and writes have separate budgets, see NOTES_API_THROTTLE_RATES
+Public read endpoints are not limited
+Limits use a sliding window estimated from the counters of the current and the previous fixed window:
+    requests = previous * (1 - elapsed share of the current window) + current
+no list of request times is stored like the DRF throttles do
+Counters live in the Django cache, the database is never touched
+A check costs a single counter increment, counts of finished windows don't change anymore
+so every process reads them from the cache once and keeps them in a bounded in-process LRU
+Rejected requests are not counted, they are answered with 429 Too Many Requests and a Retry-After header
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+KEY_PREFIX = "throttle:"
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+# amount of finished window counts kept in the memory of a process
+LRU_SIZE = 4096
+
+_previous = OrderedDict()
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    Parses a rate such as "100/min"
+    :param rate: str or None
+    :return: (amount of requests, window in seconds) or None
+    """
+    if rate is None:
+        return None
+    amount, period = rate.split("/")
+    return int(amount), PERIODS[period[0]]
+
+
+def get_previous(key):
+    """
+    Returns the count of a finished window
+    :param key: cache key of the counter
+    :return: int
+    """
+    with _lock:
+        count = _previous.get(key)
+        if count is not None:
+            _previous.move_to_end(key)
+            return count
+    count = cache.get(key, 0)
+    with _lock:
+        _previous[key] = count
+        while len(_previous) > LRU_SIZE:
+            _previous.popitem(last=False)
+    return count
+
+
+def clear():
+    """
+    Empties the in-process counts of finished windows
+    :return: None
+    """
+    with _lock:
+        _previous.clear()
+
+
+def increment(key, timeout):
+    """
+    Counts a request in the window
+    :param key: cache key of the counter
+    :param timeout: seconds the counter is kept for
+    :return: count including the request
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # the first request of the window, the counter is kept for the next window too
+        if cache.add(key, 1, timeout=timeout):
+            return 1
+        return cache.incr(key)
+
+
+def get_wait(previous, current, limit, elapsed, duration):
+    """
+    Returns seconds until the estimated amount of requests drops below the limit
+    Rejected requests are not counted, so the counters stay as they are meanwhile
+    :param previous: requests of the previous window
+    :param current: requests of the current window
+    :param limit: allowed requests per window
+    :param elapsed: seconds elapsed in the current window
+    :param duration: window length in seconds
+    :return: float
+    """
+    remaining = duration - elapsed
+    if previous:
+        # the weight of the previous window shrinks until the current one ends
+        wait = duration * (previous * (1 - elapsed / duration) + current - limit) / previous
+        if wait < remaining:
+            return max(wait, 0.0)
+    # then the current window becomes the previous one
+    return remaining + max(duration * (1 - limit / current), 0.0) if current else remaining
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Limits requests per token (or logged user) or per client IP address of anonymous requests
+    Authenticated clients are identified by the user as every user has a single token
+    Scopes of NOTES_API_THROTTLE_RATES: user_read, user_write, ip_read, ip_write
+    """
+
+    def __init__(self):
+        self.wait_time = None
+
+    def get_limit(self, request):
+        """
+        Returns the limit that applies to the request
+        :param request:
+        :return: (counter key prefix, amount of requests, window in seconds) or None
+        """
+        kind = "read" if request.method in SAFE_METHODS else "write"
+        if request.user.is_authenticated:
+            scope, ident = "user", request.user.pk
+        else:
+            scope, ident = "ip", self.get_ident(request)
+        rate = parse_rate(settings.NOTES_API_THROTTLE_RATES.get(f"{scope}_{kind}"))
+        if rate is None:
+            return None
+        return f"{KEY_PREFIX}{scope}_{kind}:{ident}:", *rate
+
+    def allow_request(self, request, view):
+        limit = self.get_limit(request)
+        if limit is None:
+            return True
+        prefix, limit, duration = limit
+        now = time.time()
+        window = int(now // duration)
+        key = f"{prefix}{window}"
+        current = increment(key, 2 * duration)
+        previous = get_previous(f"{prefix}{window - 1}")
+        elapsed = now - window * duration
+        if previous * (1 - elapsed / duration) + current <= limit:
+            return True
+        # takes the rejected request back
+        try:
+            cache.decr(key)
+        except ValueError:
+            pass
+        self.wait_time = get_wait(previous, current - 1, limit, elapsed, duration)
+        return False
+
+    def wait(self):
+        return self.wait_time
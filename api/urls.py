@@ -2,23 +2,35 @@ from django.urls import path
 from api.views import (
                        PublicNotesListAPIView, PrivateNotesListAPIView, PrivateNoteRetrieveAPIView, NoteCreateAPIView,
                        UserDetailAPIView, DescriptionAPIView, PrivateNoteUpdateAPIView, PrivateNoteDestroyAPIView,
-                       PublicNotesRetrieveAPIView
+                       PublicNotesRetrieveAPIView, NoteSearchAPIView, NoteBulkCreateAPIView,
+                       PrivateNoteBulkUpdateAPIView, PrivateNoteBulkDestroyAPIView, PrivateNotesExportAPIView,
+                       HomepageAPIView
                        )
+from note.offload import async_view
 
 
 urlpatterns = [
     # to note create api view
     path("create", NoteCreateAPIView.as_view()),
 
-    # to public list api view
-    path("public", PublicNotesListAPIView.as_view()),
+    # to public list api view, public read views are async under ASGI
+    path("public", async_view(PublicNotesListAPIView.as_view())),
 
     # to public api retrieve view
-    path("public/<int:pk>", PublicNotesRetrieveAPIView.as_view()),
+    path("public/<int:pk>", async_view(PublicNotesRetrieveAPIView.as_view())),
+
+    # to homepage api view, public notes of the homepage with site-wide counters
+    path("homepage", async_view(HomepageAPIView.as_view())),
+
+    # to search api view, authentication adds private notes to results
+    path("search", NoteSearchAPIView.as_view()),
 
     # to private api view requires authentication
     path("private", PrivateNotesListAPIView.as_view()),
 
+    # to private export api, streams all notes as json lines
+    path("private/export", PrivateNotesExportAPIView.as_view()),
+
     # to private retrieve api
     path("private/<int:pk>", PrivateNoteRetrieveAPIView.as_view()),
 
@@ -28,6 +40,11 @@ urlpatterns = [
     # to private destroy api
     path("private/<int:pk>/delete", PrivateNoteDestroyAPIView.as_view()),
 
+    # to bulk create, update and destroy apis, accept json lists
+    path("private/bulk/create", NoteBulkCreateAPIView.as_view()),
+    path("private/bulk/edit", PrivateNoteBulkUpdateAPIView.as_view()),
+    path("private/bulk/delete", PrivateNoteBulkDestroyAPIView.as_view()),
+
     # to profile api view requires authentication
     path("profile", UserDetailAPIView.as_view()),
 
@@ -2,15 +2,30 @@ from rest_framework.generics import ListAPIView, RetrieveAPIView, CreateAPIView,
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.views.generic import TemplateView
-from rest_framework.authentication import TokenAuthentication, SessionAuthentication
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
-from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.utils.urls import replace_query_param
+from collections import OrderedDict
 import datetime
-import bleach
-
-from api.serializers import PublicNoteSerializer, PrivateNoteSerializer, NoteEditSerializer, UserSerializer
-from note.models import Note
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+
+from api import export
+from api.authentication import CachedTokenAuthentication
+from api.mixins import ConditionalListMixin, ConditionalRetrieveMixin, ConditionalUpdateMixin, SparseFieldsMixin
+from api.throttling import SlidingWindowThrottle
+from api.serializers import (PublicNoteSerializer, HomepageNoteSerializer, PrivateNoteSerializer,
+                             NoteEditSerializer, UserSerializer)
+from note import activity, bulk, counters, note_cache, sanitizer
+from note.models import Note, NoteStats
+from note.pagination import KeysetPaginator, InvalidCursor
+from note.search import SearchResults
 from django.contrib.auth.models import User
 
 
@@ -22,30 +37,186 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size = 100
 
 
-class PublicNotesListAPIView(ListAPIView):
+class KeysetResultsSetPagination(BasePagination):
+    """
+    Keyset pagination class
+    sets the page size of json response to 100
+    Pages are selected by an opaque cursor instead of a page number
+    so deep pages are as fast as the first one
+    Requires a queryset ordered by fields of the same direction ending with a unique one
+    """
+    page_size = 100
+    cursor_query_param = "cursor"
+
+    def __init__(self):
+        self.request = None
+        self.page = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Returns a page of objects following the cursor from the request
+        :param queryset:
+        :param request:
+        :param view:
+        :return:
+        """
+        self.request = request
+        try:
+            self.page = KeysetPaginator(queryset, self.page_size).get_page(
+                request.query_params.get(self.cursor_query_param)
+            )
+        except InvalidCursor:
+            raise NotFound("Invalid cursor")
+        return self.page.object_list
+
+    def get_link(self, cursor):
+        """
+        Returns url of the current request with the cursor replaced
+        :param cursor:
+        :return:
+        """
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_link(self.page.next_cursor)),
+            ("previous", self.get_link(self.page.previous_cursor)),
+            ("results", data),
+        ]))
+
+
+class PublicNotesListAPIView(SparseFieldsMixin, ListAPIView):
     """
     Public notes list json view class
     Does not require authentication
     Uses the public Note Serializer
     Sorts notes by the last edit date
+    or by the amount of likes if "sort=likes" url param is provided
+    or by the time-decayed hot score if "sort=hot" url param is provided
+    Uses keyset pagination
+    Supports sparse fieldsets and the summary mode
     """
-    queryset = Note.objects.filter(public=True).order_by("-date_edited")
     serializer_class = PublicNoteSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetResultsSetPagination
+
+    def get_queryset(self):
+        """
+        Gets public notes in the requested order
+        id ends the ordering to make it unique for keyset pagination
+        Authors are joined as their names are serialized
+        :return:
+        """
+        query_set = Note.objects.filter(public=True).select_related("user")
+        if self.request.query_params.get("sort") == "likes":
+            return query_set.order_by("-likes", "-date_edited", "-id")
+        if self.request.query_params.get("sort") == "hot":
+            return query_set.order_by("-hot_score", "-date_edited", "-id")
+        return query_set.order_by("-date_edited", "-id")
 
 
-class PublicNotesRetrieveAPIView(RetrieveAPIView):
+class PublicNotesRetrieveAPIView(SparseFieldsMixin, ConditionalRetrieveMixin, RetrieveAPIView):
     """
     Public note retrieve json view class
     Does not require authentication
     Uses the pubic Note Serializer
     Note selected by id
+    Supports conditional requests, likes are a part of the ETag
+    Supports sparse fieldsets and the summary mode
+    The note is read from the note cache, validators are built from the cached note
+    Without the note cache the view reads only the fields it needs from the database
+    """
+    etag_fields = ("date_edited", "likes")
+    serializer_class = PublicNoteSerializer
+    queryset = Note.objects.filter(public=True).select_related("user")
+
+    def get_object(self):
+        """
+        Gets the public note from the note cache once per request
+        :return: Note
+        """
+        if not note_cache.is_enabled():
+            return super().get_object()
+        if not hasattr(self, "_object"):
+            note = note_cache.get(self.kwargs["pk"])
+            if note is None or not note.public:
+                raise NotFound()
+            self.check_object_permissions(self.request, note)
+            self._object = note
+        return self._object
+
+    def get_object_validators(self):
+        """
+        Returns ETag and Last-Modified of the cached note
+        :return: (etag, last_modified)
+        """
+        if not note_cache.is_enabled():
+            return super().get_object_validators()
+        return self.get_instance_validators(self.get_object())
+
+
+class HomepageAPIView(ListAPIView):
+    """
+    Homepage json view class
+    Does not require authentication
+    Returns the public notes of the homepage with site-wide counters
+    Sorts notes by the amount of likes
+    or by the last edit date if "sort=date" url param is provided
+    or by the time-decayed hot score if "sort=hot" url param is provided
+    Uses keyset pagination, notes are serialized with excerpts instead of bodies
     """
+    serializer_class = HomepageNoteSerializer
+    pagination_class = KeysetResultsSetPagination
+
+    def get_queryset(self):
+        """
+        Gets public notes in the requested order without bodies
+        :return:
+        """
+        query_set = Note.objects.filter(public=True).select_related("user").defer("body")
+        if self.request.query_params.get("sort") == "date":
+            return query_set.order_by("-date_edited", "-id")
+        if self.request.query_params.get("sort") == "hot":
+            return query_set.order_by("-hot_score", "-date_edited", "-id")
+        return query_set.order_by("-likes", "-date_edited", "-id")
+
+    def get_paginated_response(self, data):
+        """
+        Adds total_notes, total_pub and total_users counters from the cache
+        :param data:
+        :return:
+        """
+        response = super().get_paginated_response(data)
+        response.data.update(counters.get_counters())
+        return response
+
+
+class NoteSearchAPIView(SparseFieldsMixin, ListAPIView):
+    """
+    Note search json view class
+    Does not require authentication
+    Searches public notes and private notes of an authenticated user
+    by the "q" url param in note titles and bodies
+    Results are ranked by relevance and paginated by page numbers
+    Uses the public Note Serializer
+    Supports sparse fieldsets and the summary mode
+    """
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    throttle_classes = [SlidingWindowThrottle]
     serializer_class = PublicNoteSerializer
-    queryset = Note.objects.filter(public=True)
+    pagination_class = StandardResultsSetPagination
 
+    def get_queryset(self):
+        """
+        Gets lazy search results
+        :return:
+        """
+        return SearchResults(self.request.query_params.get("q", ""), user=self.request.user, include_public=True,
+                             queryset=Note.objects.select_related("user"))
 
-class PrivateNotesListAPIView(ListAPIView):
+
+class PrivateNotesListAPIView(SparseFieldsMixin, ConditionalListMixin, ListAPIView):
     """
     Private notes list json view class
     Requires authentication:
@@ -53,8 +224,11 @@ class PrivateNotesListAPIView(ListAPIView):
     Uses the private Note Serializer
     Returns only a private notes created by an authorised user
     Note selected by id
+    Supports conditional requests
+    Supports sparse fieldsets and the summary mode
     """
-    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    throttle_classes = [SlidingWindowThrottle]
     permission_classes = [IsAuthenticated]
     serializer_class = PrivateNoteSerializer
     pagination_class = StandardResultsSetPagination
@@ -68,15 +242,63 @@ class PrivateNotesListAPIView(ListAPIView):
         return Note.objects.filter(user=user).order_by("-date_edited")
 
 
-class PrivateNoteRetrieveAPIView(RetrieveAPIView):
+class PrivateNotesExportAPIView(APIView):
+    """
+    Private notes export json class
+    Requires authentication:
+    by Token or Session
+    Streams all notes of an authorised user as NDJSON, one note per line
+    in the format of the private Note Serializer
+    Notes edited before the "since" url param (ISO date or datetime) are skipped
+    The stream is gzip compressed if the client accepts it
+    """
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    throttle_classes = [SlidingWindowThrottle]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """
+        Gets notes of requested user edited since the requested date
+        :return:
+        """
+        query_set = Note.objects.filter(user=self.request.user)
+        since = self.request.query_params.get("since")
+        if since:
+            try:
+                date = parse_datetime(since)
+                if date is None:
+                    date = datetime.datetime.combine(parse_date(since), datetime.time())
+            except (TypeError, ValueError):
+                raise ValidationError({"since": "Expected an ISO date or datetime."})
+            if timezone.is_naive(date):
+                date = timezone.make_aware(date)
+            query_set = query_set.filter(date_edited__gte=date)
+        return query_set
+
+    def get(self, request, *args, **kwargs):
+        chunks = export.iter_ndjson(self.get_queryset())
+        compress = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+        response = StreamingHttpResponse(export.iter_gzip(chunks) if compress else chunks,
+                                         content_type="application/x-ndjson")
+        if compress:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ["Accept-Encoding"])
+        response["Content-Disposition"] = f'attachment; filename="notes-{request.user}.ndjson"'
+        return response
+
+
+class PrivateNoteRetrieveAPIView(SparseFieldsMixin, ConditionalRetrieveMixin, RetrieveAPIView):
     """
     Private note retrieve json class
     Requires authentication:
     by Token or Session
     Uses private Note Serializer
     Returns only private note created by a requested user
+    Supports conditional requests
+    Supports sparse fieldsets and the summary mode
     """
-    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    throttle_classes = [SlidingWindowThrottle]
     permission_classes = [IsAuthenticated]
     serializer_class = PrivateNoteSerializer
 
@@ -93,55 +315,51 @@ class NoteCreateAPIView(CreateAPIView):
     Private note create json class
     Requires authentication:
     by Token or Session
-    Uses bleach library to sanitize html data
+    Sanitizes html data with the note sanitizer
 
     """
-    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    throttle_classes = [SlidingWindowThrottle]
     permission_classes = [IsAuthenticated]
     serializer_class = NoteEditSerializer
 
     def perform_create(self, serializer):
         """
-        Adds author name as an author to a note user field
+        Sets the current user as the note author
         Sanitizes html data in a process
         :param serializer:
         :return:
         """
-        serializer.validated_data["user"] = str(self.request.user)
-
-        # sanitizes using bleach default tags, attributes, styles
-        allowed_tags = bleach.ALLOWED_TAGS + ["p"]
-        serializer.validated_data["body"] = bleach.clean(
-            serializer.validated_data["body"],
-            tags=allowed_tags,
-            attributes=bleach.ALLOWED_ATTRIBUTES,
-            styles=bleach.ALLOWED_STYLES,
-            strip=False,
-            strip_comments=False
-        )
+        if "body" in serializer.validated_data:
+            serializer.validated_data["body"] = sanitizer.sanitize(serializer.validated_data["body"])
 
-        serializer.save()
+        serializer.save(user=self.request.user)
 
 
-class PrivateNoteUpdateAPIView(UpdateAPIView):
+class PrivateNoteUpdateAPIView(ConditionalUpdateMixin, UpdateAPIView):
     """
     Private note update json class
     Requires authentication:
     by Token or Session
     Uses stripped down Note Serializer
     Allows change to only a private note created by a requested user
+    Rejects the change if the If-Match header doesn't match the current note version
     """
-    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    throttle_classes = [SlidingWindowThrottle]
     permission_classes = [IsAuthenticated]
     serializer_class = NoteEditSerializer
 
     def perform_update(self, serializer):
         """
         Automatically updates date_edited field to current time
+        Sanitizes html data in a process
         :param serializer:
         :return:
         """
         serializer.validated_data["date_edited"] = timezone.now()
+        if "body" in serializer.validated_data:
+            serializer.validated_data["body"] = sanitizer.sanitize(serializer.validated_data["body"])
         serializer.save()
 
     def get_queryset(self):
@@ -156,13 +374,130 @@ class PrivateNoteDestroyAPIView(DestroyAPIView):
     Deletes only a private note created by a requested user
     """
 
-    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    throttle_classes = [SlidingWindowThrottle]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         return Note.objects.filter(user=self.request.user)
 
 
+def is_note_id(value):
+    """
+    Returns whether a json value is a note id
+    json true and false are parsed as bool, a subclass of int, they are not ids
+    :param value:
+    :return: bool
+    """
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class BulkNotesAPIView(APIView):
+    """
+    Base class of bulk json views
+    Requires authentication:
+    by Token or Session
+    Accepts a json list of up to NOTES_BULK_MAX_ITEMS items
+    Processes the whole batch in a single transaction
+    and returns a result with a status code for every item in the same order
+    """
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    throttle_classes = [SlidingWindowThrottle]
+    permission_classes = [IsAuthenticated]
+
+    def get_items(self):
+        """
+        Returns list of items sent in the request body
+        :return: list
+        """
+        items = self.request.data
+        if not isinstance(items, list):
+            raise ValidationError({"detail": "Expected a list of items."})
+        if len(items) > settings.NOTES_BULK_MAX_ITEMS:
+            raise ValidationError({"detail": f"At most {settings.NOTES_BULK_MAX_ITEMS} items per request."})
+        return items
+
+
+class NoteBulkCreateAPIView(BulkNotesAPIView):
+    """
+    Private notes bulk create json class
+    Accepts a list of notes with the fields of the note create api
+    Invalid notes are reported and skipped, the rest are created
+    """
+
+    def post(self, request, *args, **kwargs):
+        results = []
+        valid = []
+        for item in self.get_items():
+            serializer = NoteEditSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((len(results), serializer.validated_data))
+                results.append(None)
+            else:
+                results.append({"status": 400, "errors": serializer.errors})
+
+        notes = bulk.create_notes(request.user, [values for _, values in valid])
+        for (index, _), note in zip(valid, notes):
+            results[index] = {"status": 201, "note": PrivateNoteSerializer(note).data}
+        return Response({"results": results})
+
+
+class PrivateNoteBulkUpdateAPIView(BulkNotesAPIView):
+    """
+    Private notes bulk update json class
+    Accepts a list of partial notes, every note has to contain its id
+    Allows change to only private notes created by a requested user,
+    other notes are reported as not found
+    """
+
+    def patch(self, request, *args, **kwargs):
+        items = self.get_items()
+        ids = [item.get("id") for item in items if isinstance(item, dict)]
+        results = []
+        updates = []
+        with transaction.atomic():
+            notes = Note.objects.select_for_update().filter(
+                user=request.user, pk__in=[pk for pk in ids if is_note_id(pk)]
+            ).in_bulk()
+            seen = set()
+            for item in items:
+                pk = item.get("id") if isinstance(item, dict) else None
+                if not is_note_id(pk) or pk not in notes:
+                    results.append({"id": pk, "status": 404, "errors": {"detail": "Not found."}})
+                    continue
+                if pk in seen:
+                    results.append({"id": pk, "status": 400, "errors": {"id": ["Duplicate note id."]}})
+                    continue
+                seen.add(pk)
+                serializer = NoteEditSerializer(notes[pk], data=item, partial=True)
+                if serializer.is_valid():
+                    updates.append((notes[pk], serializer.validated_data))
+                    results.append({"id": pk, "status": 200})
+                else:
+                    results.append({"id": pk, "status": 400, "errors": serializer.errors})
+            bulk.update_notes(updates)
+
+        for result in results:
+            if result["status"] == 200:
+                result["note"] = PrivateNoteSerializer(notes[result["id"]]).data
+        return Response({"results": results})
+
+
+class PrivateNoteBulkDestroyAPIView(BulkNotesAPIView):
+    """
+    Private notes bulk destroy json class
+    Accepts a list of note ids
+    Deletes only private notes created by a requested user,
+    other notes are reported as not found
+    """
+
+    def post(self, request, *args, **kwargs):
+        items = self.get_items()
+        deleted = bulk.delete_notes(request.user, [pk for pk in items if is_note_id(pk)])
+        return Response({"results": [{"id": pk, "status": 204 if is_note_id(pk) and pk in deleted else 404}
+                                     for pk in items]})
+
+
 class UserDetailAPIView(APIView):
     """
     Profile json view class
@@ -172,7 +507,8 @@ class UserDetailAPIView(APIView):
     Besides information provided by the serializer
     gets some stats about user's activity
     """
-    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    throttle_classes = [SlidingWindowThrottle]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -190,20 +526,13 @@ class UserDetailAPIView(APIView):
         """
         user_data = self.get_user_data()
 
-        # Generate label and data set consisting of last 6 months
-        now = datetime.datetime.now()
-        user_data["time_data"] = {}
-
-        # Gets previous 6 month and amount of notes user created
-        for _ in range(0, 6):
-            user_data["time_data"][now.strftime("%B")] = \
-                Note.objects.filter(user=self.request.user, date_created__month=now.strftime("%m")).count()
-
-            # Gets previous month
-            now = now.replace(day=1) - datetime.timedelta(days=1)
+        # Gets amount of notes user created in the last 6, 12 or 24 months
+        months = self.request.query_params.get("months")
+        user_data["time_data"] = dict(activity.get_activity(self.request.user, months))
 
-        user_data["total_notes"] = Note.objects.filter(user=self.request.user).count()
-        user_data["public_notes"] = Note.objects.filter(user=self.request.user, public=True).count()
+        stats = NoteStats.for_user(self.request.user)
+        user_data["total_notes"] = stats.total_notes
+        user_data["public_notes"] = stats.public_notes
         return user_data
 
     def get_user_data(self):
@@ -1,16 +1,22 @@
 from django.views.generic import ListView
+from django.http.response import Http404
+from django.utils.http import urlencode
 
+from note import counters, page_cache
 from note.models import Note
-from django.contrib.auth.models import User
+from note.pagination import KeysetPaginator, InvalidCursor
+from note.search import SearchResults
 
 
 class NoteHomePageView(ListView):
     """
     Note list view for the public notes page
-    Uses pagination
-    Notes can be sorted by likes and creation time
+    Uses keyset pagination
+    Notes can be sorted by likes, creation time and the time-decayed hot score
+    or searched by the "q" url param, search results are ranked and paginated by page numbers
     For proper pagination stores page url params for the template
     Paginated by 25
+    Rendered pages are cached for anonymous visitors
     """
     model = Note
     template_name = "homepage.html"
@@ -20,21 +26,72 @@ class NoteHomePageView(ListView):
         super().__init__(**kwargs)
         self.user = None
         self.page_url = ""
+        self.search_query = ""
+
+    def get(self, request, *args, **kwargs):
+        """
+        Override of get
+        Serves anonymous visitors the first page of every sort order from the homepage cache
+        Search results, pages following a cursor and pages of logged users are always rendered,
+        so crafted cursors can't fill the cache
+        :param request:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        if (not page_cache.is_enabled() or request.user.is_authenticated or request.GET.get("q", "").strip()
+                or request.GET.get("cursor")):
+            return super().get(request, *args, **kwargs)
+
+        sort = request.GET.get("sort") if request.GET.get("sort") in ("date", "hot") else "likes"
+        key = page_cache.get_key(sort)
+        response = page_cache.get(key)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            response.add_post_render_callback(lambda rendered: page_cache.store(key, rendered))
+        return response
 
     def get_queryset(self):
         """
         For different sorting uses url params and sets corresponding query_set
         :return:
         """
-        query_set = Note.objects.filter(public=True)
+        # cards show precalculated excerpts so bodies are not loaded, authors are joined
+        self.search_query = self.request.GET.get("q", "").strip()
+        if self.search_query:
+            self.page_url = "&" + urlencode({"q": self.search_query})
+            return SearchResults(self.search_query, include_public=True, queryset=Note.objects.select_related("user").defer("body"))
+
+        # id ends the ordering to make it unique for keyset pagination
+        query_set = Note.objects.filter(public=True).select_related("user").defer("body")
         if self.request.GET.get("sort") == "date":
-            query_set = query_set.order_by("-date_edited")
+            query_set = query_set.order_by("-date_edited", "-id")
             self.page_url = "&sort=date"
+        elif self.request.GET.get("sort") == "hot":
+            query_set = query_set.order_by("-hot_score", "-date_edited", "-id")
+            self.page_url = "&sort=hot"
         else:
-            query_set = query_set.order_by("-likes", "-date_edited")
+            query_set = query_set.order_by("-likes", "-date_edited", "-id")
 
         return query_set
 
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Override of paginate_queryset
+        Uses keyset pagination by the cursor url param instead of OFFSET page numbers
+        Ranked search results keep page numbers
+        :param queryset:
+        :param page_size:
+        :return: paginator, page, object_list, is_paginated
+        """
+        if self.search_query:
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            page = KeysetPaginator(queryset, page_size).get_page(self.request.GET.get("cursor"))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        return None, page, page.object_list, page.has_other_pages()
+
     def get_context_data(self, *, object_list=None, **kwargs):
         """
         Override of get_context_data
@@ -55,23 +112,21 @@ class NoteHomePageView(ListView):
         """
         context = super().get_context_data(**kwargs)
 
-        # set page url
+        # set page url and search query
         context["page_url"] = self.page_url
+        context["search_query"] = self.search_query
 
-        # database query to count all created notes
-        context["total_notes"] = Note.objects.all().count()
-
-        # database query to count all created public notes
-        context["total_pub"] = Note.objects.filter(public=True).count()
+        # total_notes, total_pub and total_users counters from the cache
+        context.update(counters.get_counters())
 
-        # database query to count all registered users
-        context["total_users"] = User.objects.all().count()
+        # single database query to find notes on the page liked by the current user
+        liked_ids = Note.get_liked_ids(self.request.user, context["note_list"])
 
         # splits notes list into two halves to populate template
         context["object_list_odd"] = []
         context["object_list_even"] = []
         for i, note in enumerate(context["note_list"]):
-            note.current_user_liked = note.get_user_liked(str(self.request.user))
+            note.current_user_liked = note.pk in liked_ids
             if i % 2 != 0:
                 context["object_list_odd"].append(note)
             else:
@@ -0,0 +1,126 @@
+"""
+User activity service
+Counts notes created by a user per month with a single GROUP BY query
+over a date bounded range of the last 6, 12 or 24 months
+Results are cached per user until the user's next note write
+Invalidations only reach processes sharing the Django cache, so results are not cached unless NOTES_SHARED_CACHE is set
+"""
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from note.models import Note
+
+KEY_PREFIX = "activity:"
+WINDOWS = (6, 12, 24)
+
+
+def is_enabled():
+    """
+    Returns whether activity is cached
+    A process-local cache (NOTES_SHARED_CACHE unset) turns the cache off
+    :return: bool
+    """
+    return settings.NOTES_SHARED_CACHE
+
+
+def get_window(value=None):
+    """
+    Returns amount of months to show
+    Falls back to NOTES_ACTIVITY_MONTHS if the value is not one of the allowed windows
+    :param value: str or int from the request
+    :return: int
+    """
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return settings.NOTES_ACTIVITY_MONTHS
+    return value if value in WINDOWS else settings.NOTES_ACTIVITY_MONTHS
+
+
+def get_key(user, months):
+    """
+    Returns cache key of the user activity
+    :param user: User or user id
+    :param months: int
+    :return: str
+    """
+    return f"{KEY_PREFIX}{getattr(user, 'pk', user)}:{months}"
+
+
+def get_month_starts(months, now=None):
+    """
+    Returns first moments of the last months in the current timezone
+    Newest month goes first, the last item is the start of the next month
+    :param months: int
+    :param now: datetime
+    :return: list of datetime
+    """
+    now = timezone.localtime(now)
+    year, month = now.year, now.month + 1
+    starts = []
+    for _ in range(months + 1):
+        if month == 0:
+            year, month = year - 1, 12
+        if month == 13:
+            year, month = year + 1, 1
+        starts.append(timezone.make_aware(datetime.datetime(year, month, 1)))
+        month -= 1
+    # moves the next month start to the end of the list
+    return starts[1:] + starts[:1]
+
+
+def calculate(user, months):
+    """
+    Counts notes created by the user in each of the last months
+    :param user: User or user id
+    :param months: int
+    :return: list of (month start, amount of notes) tuples, newest month first
+    """
+    starts = get_month_starts(months)
+    rows = (
+        Note.objects.filter(user=user, date_created__gte=starts[-2], date_created__lt=starts[-1])
+        .annotate(month=TruncMonth("date_created"))
+        .values("month")
+        .order_by()
+        .annotate(count=Count("id"))
+    )
+    counts = {(row["month"].year, row["month"].month): row["count"] for row in rows}
+    return [(start, counts.get((start.year, start.month), 0)) for start in starts[:-1]]
+
+
+def get_activity(user, months=None):
+    """
+    Returns cached monthly activity of the user
+    Labels include the year if the window is longer than a year
+    :param user: User or user id
+    :param months: window size, see get_window
+    :return: list of (label, amount of notes) tuples, newest month first
+    """
+    months = get_window(months)
+    label_format = "%B" if months <= 12 else "%B %Y"
+    if not is_enabled():
+        return [(start.strftime(label_format), count) for start, count in calculate(user, months)]
+    key = get_key(user, months)
+    activity = cache.get(key)
+    if activity is None:
+        activity = [(start.strftime(label_format), count) for start, count in calculate(user, months)]
+        # labels shift when a new month begins
+        expires = (get_month_starts(1)[-1] - timezone.now()).total_seconds()
+        cache.set(key, activity, timeout=max(int(expires), 1))
+    return activity
+
+
+def invalidate(user):
+    """
+    Drops cached activity of the user once the current transaction is committed
+    :param user: User or user id
+    :return: None
+    """
+    keys = [get_key(user, months) for months in WINDOWS]
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from note.models import Note
+from note.models import Note, NoteLike
 
 
 # Note model registration for django admin
@@ -8,6 +8,19 @@ class NoteAdmin(admin.ModelAdmin):
     Model admin class to display note's fields in admin page
     """
     list_display = ("id", "public", "name", "user", "date_created")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
 
 
 admin.site.register(Note, NoteAdmin)
+
+
+class NoteLikeAdmin(admin.ModelAdmin):
+    """
+    Model admin class to display note likes in admin page
+    """
+    list_display = ("id", "note", "user", "created")
+    raw_id_fields = ("note", "user")
+
+
+admin.site.register(NoteLike, NoteLikeAdmin)
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class NoteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'note'
+
+    def ready(self):
+        # connects signal handlers and registers system checks
+        from note import checks, signals  # noqa: F401
+
+        # request metrics count queries of every new database connection
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from note.middleware import track_queries
+        if settings.NOTES_METRICS_ENABLED:
+            connection_created.connect(track_queries)
@@ -0,0 +1,189 @@
+"""
+View benchmark suite
+Drives the site and api views through the test client against the current database,
+records p50 and p95 latency and the amount of SQL queries of every scenario
+Scenarios fail when they run more queries than their budget
+or get slower / run more queries than a stored baseline
+Write requests are rolled back so the data stays the same between runs
+API rate limits are turned off while the scenarios run
+Response and object caches are turned off too unless a scenario measures them,
+so budgets of the other scenarios hold the real cost of the views
+"""
+import collections
+import json
+import math
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from note.models import Note, NoteStats
+
+Scenario = collections.namedtuple("Scenario", ["name", "method", "url", "budget", "login", "data", "cached"],
+                                  defaults=[False])
+
+# settings of the homepage and note caches turned off for uncached scenarios
+NO_CACHE_SETTINGS = {"NOTES_HOMEPAGE_CACHE_TIMEOUT": 0, "NOTES_NOTE_CACHE_TIMEOUT": 0}
+# the benchmark runs in a single process so its cache counts as shared
+CACHE_SETTINGS = {"NOTES_SHARED_CACHE": True}
+
+
+def get_scenarios(note, public_note):
+    """
+    Returns benchmark scenarios
+    Budgets include session and user queries of logged requests
+    Cached scenarios are served by the warm homepage, note or activity cache
+    :param note: Note of the benchmark user
+    :param public_note: public Note
+    :return: list of Scenario
+    """
+    bulk_items = [{"name": f"Bulk {i}", "body": "<p>bulk</p>"} for i in range(10)]
+    return [
+        Scenario("homepage", "get", "/", 1, False, None),
+        Scenario("homepage cached", "get", "/", 0, False, None, True),
+        Scenario("homepage by date", "get", "/?sort=date", 1, False, None),
+        Scenario("homepage by hot", "get", "/?sort=hot", 1, False, None),
+        Scenario("homepage logged", "get", "/", 4, True, None),
+        Scenario("homepage search", "get", "/?q=project", 3, False, None),
+        Scenario("note list", "get", "/notes/", 5, True, None),
+        Scenario("note detail", "get", f"/notes/{note.pk}", 4, True, None),
+        Scenario("note detail cached", "get", f"/notes/{note.pk}", 3, True, None, True),
+        Scenario("profile", "get", "/profile/", 7, True, None),
+        Scenario("profile cached", "get", "/profile/", 6, True, None, True),
+        Scenario("api description", "get", "/api/", 0, False, None),
+        Scenario("api public", "get", "/api/public", 1, False, None),
+        Scenario("api public by likes", "get", "/api/public?sort=likes", 1, False, None),
+        Scenario("api public by hot", "get", "/api/public?sort=hot", 1, False, None),
+        Scenario("api public note", "get", f"/api/public/{public_note.pk}", 2, False, None),
+        Scenario("api public note cached", "get", f"/api/public/{public_note.pk}", 0, False, None, True),
+        Scenario("api homepage", "get", "/api/homepage", 1, False, None),
+        Scenario("api search", "get", "/api/search?q=project", 5, True, None),
+        Scenario("api private", "get", "/api/private", 5, True, None),
+        Scenario("api private note", "get", f"/api/private/{note.pk}", 4, True, None),
+        Scenario("api export", "get", "/api/private/export", 5, True, None),
+        Scenario("api profile", "get", "/api/profile", 5, True, None),
+        Scenario("api create", "post", "/api/create", 8, True, {"name": "Created", "body": "<p>created</p>"}),
+        Scenario("api edit", "patch", f"/api/private/{note.pk}/edit", 8, True, {"name": "Edited"}),
+        Scenario("api delete", "delete", f"/api/private/{note.pk}/delete", 7, True, None),
+        Scenario("api bulk create", "post", "/api/private/bulk/create", 9, True, bulk_items),
+        Scenario("api bulk edit", "patch", "/api/private/bulk/edit", 10, True,
+                 [{"id": note.pk, "name": "Bulk edited"}]),
+        Scenario("api bulk delete", "post", "/api/private/bulk/delete", 10, True, [note.pk]),
+    ]
+
+
+def percentile(values, share):
+    """
+    Returns the nearest-rank percentile
+    :param values: list of numbers
+    :param share: 0.5 for p50, 0.95 for p95
+    :return: number
+    """
+    values = sorted(values)
+    return values[max(0, math.ceil(share * len(values)) - 1)]
+
+
+def measure(client, scenario, requests):
+    """
+    Runs the scenario several times after a warm-up request
+    Write requests are rolled back
+    :param client: Client
+    :param scenario: Scenario
+    :param requests: amount of measured requests
+    :return: dict of p50 and p95 latency in milliseconds and the most queries of a single request
+    """
+    timings = []
+    queries = 0
+    for i in range(requests + 1):
+        with transaction.atomic(), CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            if scenario.data is None:
+                response = getattr(client, scenario.method)(scenario.url)
+            else:
+                response = getattr(client, scenario.method)(scenario.url, json.dumps(scenario.data),
+                                                            content_type="application/json")
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+            transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{scenario.name}: {scenario.method.upper()} {scenario.url} "
+                               f"returned {response.status_code}")
+        if i:
+            timings.append(elapsed)
+            queries = max(queries, len(captured))
+    return {"p50": percentile(timings, 0.5), "p95": percentile(timings, 0.95), "queries": queries}
+
+
+def get_fixtures(username=None):
+    """
+    Returns the benchmark user with a note of the user and a public note
+    The user with the most notes is taken by default
+    :param username: str
+    :return: (User, Note, Note)
+    """
+    if username is None:
+        stats = NoteStats.objects.filter(total_notes__gt=0).select_related("user").order_by("-total_notes").first()
+        if stats is None:
+            raise ValueError("There are no notes, generate them with the seed_notes command")
+        user = stats.user
+    else:
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            raise ValueError(f"User \"{username}\" does not exist")
+    note = Note.objects.filter(user=user).order_by("-date_edited").first()
+    public_note = Note.objects.filter(public=True).order_by("-likes", "-date_edited", "-id").first()
+    if note is None or public_note is None:
+        raise ValueError("The benchmark needs a note of the user and a public note")
+    return user, note, public_note
+
+
+def run(requests=20, username=None, scenarios=None):
+    """
+    Runs all scenarios
+    :param requests: amount of measured requests of every scenario
+    :param username: benchmark user, the user with the most notes by default
+    :param scenarios: names of scenarios to run, all by default
+    :return: dict of scenario name to results
+    """
+    user, note, public_note = get_fixtures(username)
+    anonymous = Client(HTTP_HOST="127.0.0.1")
+    logged = Client(HTTP_HOST="127.0.0.1")
+    logged.force_login(user)
+
+    results = {}
+    for scenario in get_scenarios(note, public_note):
+        if scenarios and scenario.name not in scenarios:
+            continue
+        cache_settings = CACHE_SETTINGS if scenario.cached else NO_CACHE_SETTINGS
+        with override_settings(NOTES_API_THROTTLE_RATES={}, **cache_settings):
+            result = measure(logged if scenario.login else anonymous, scenario, requests)
+        result["budget"] = scenario.budget
+        results[scenario.name] = result
+    return results
+
+
+def check(results, baseline=None, tolerance=0.5, slack=2.0):
+    """
+    Compares results with query budgets and the baseline
+    :param results: results of run
+    :param baseline: results of a previous run
+    :param tolerance: allowed p95 slowdown relative to the baseline, 0.5 is 50%
+    :param slack: allowed p95 slowdown in milliseconds on top of the tolerance, hides noise of fast views
+    :return: list of failure messages
+    """
+    failures = []
+    for name, result in results.items():
+        if result["queries"] > result["budget"]:
+            failures.append(f"{name}: {result['queries']} queries, the budget is {result['budget']}")
+        previous = (baseline or {}).get(name)
+        if previous is None:
+            continue
+        if result["queries"] > previous["queries"]:
+            failures.append(f"{name}: {result['queries']} queries, the baseline is {previous['queries']}")
+        limit = previous["p95"] * (1 + tolerance) + slack
+        if result["p95"] > limit:
+            failures.append(f"{name}: p95 {result['p95']:.1f} ms, the baseline is {previous['p95']:.1f} ms")
+    return failures
@@ -0,0 +1,175 @@
+"""
+Bulk note operations
+Create, update and delete batches of notes of a single user in one transaction
+with bulk queries instead of a save per note
+Statistics, counters, activity, the search index and the homepage cache
+are updated once per batch, note signal handlers are skipped
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from note import activity, counters, note_cache, page_cache, sanitizer, search
+from note.models import Note, NoteStats
+from note.signals import muted
+from note.text import make_excerpt, get_plain_text
+
+# fields kept in sync with the body
+BODY_FIELDS = ("body", "excerpt", "text_length")
+
+
+def sanitize_bodies(notes):
+    """
+    Sanitizes bodies of the notes and recalculates their excerpts
+    Every distinct body is processed once
+    :param notes: iterable of Note
+    :return: None
+    """
+    cleaned = {}
+    for note in notes:
+        if note.body not in cleaned:
+            body = sanitizer.sanitize(note.body)
+            cleaned[note.body] = (body, make_excerpt(body), len(get_plain_text(body)))
+        note.body, note.excerpt, note.text_length = cleaned[note.body]
+
+
+def sum_note_values(notes):
+    """
+    Returns what the notes add to the author's statistics
+    :param notes: iterable of (public, completed)
+    :return: dict of deltas
+    """
+    totals = {}
+    for public, completed in notes:
+        for name, value in NoteStats.get_note_values(public, completed).items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def assign_ids(notes):
+    """
+    Sets primary keys of notes inserted by bulk_create
+    for databases that can't return them from a bulk insert
+    (Django 3.2 never uses RETURNING for bulk inserts on SQLite)
+    Relies on SQLite having a single writer: the insert holds the database write lock until the transaction ends
+    and AUTOINCREMENT ids are always above the existing ones,
+    so the latest notes are the inserted ones in the insertion order
+    The rows read back are checked against the notes, a mismatch raises and rolls the transaction back
+    :param notes: list of Note
+    :return: None
+    """
+    rows = list(Note.objects.order_by("-pk").values_list("pk", "user_id", "date_created")[:len(notes)])
+    rows.reverse()
+    pks = [pk for pk, _, _ in rows]
+    if (len(rows) != len(notes) or pks != list(range(pks[0], pks[0] + len(notes)))
+            or any((user_id, date) != (note.user_id, note.date_created)
+                   for note, (_, user_id, date) in zip(notes, rows))):
+        raise RuntimeError("Inserted notes can't be told apart from notes of other writers")
+    for note, pk in zip(notes, pks):
+        note.pk = pk
+        note._state.adding = False
+        note._state.db = Note.objects.db
+
+
+def create_notes(user, items):
+    """
+    Creates notes of the user
+    :param user: User
+    :param items: list of validated field values
+    :return: list of created Note
+    """
+    if not items:
+        return []
+    now = timezone.now()
+    notes = [Note(**{"date_created": now, "date_edited": now, **item, "user": user}) for item in items]
+    sanitize_bodies(notes)
+
+    with transaction.atomic():
+        Note.objects.bulk_create(notes, batch_size=settings.NOTES_BULK_MAX_ITEMS)
+        if notes[0].pk is None:
+            assign_ids(notes)
+
+        public = sum(note.public for note in notes)
+        NoteStats.apply(user.pk, **sum_note_values((note.public, note.completed) for note in notes))
+        counters.change("total_notes", len(notes))
+        counters.change("total_pub", public)
+        activity.invalidate(user)
+        search.index_notes(notes)
+        if public:
+            page_cache.invalidate()
+    return notes
+
+
+def update_notes(updates):
+    """
+    Updates notes with a single bulk UPDATE
+    Notes have to be loaded from the database in the current transaction
+    and belong to the same user
+    :param updates: list of (Note, validated field values)
+    :return: list of updated Note
+    """
+    if not updates:
+        return []
+    now = timezone.now()
+    fields = {"date_edited"}
+    notes = []
+    for note, values in updates:
+        for name, value in values.items():
+            setattr(note, name, value)
+        note.date_edited = now
+        fields.update(values)
+        notes.append(note)
+    # only the sent bodies are sanitized, the rest are written back unchanged
+    body_notes = [note for note, values in updates if "body" in values]
+    if body_notes:
+        sanitize_bodies(body_notes)
+        fields.update(BODY_FIELDS)
+
+    with transaction.atomic():
+        Note.objects.bulk_update(notes, list(fields), batch_size=settings.NOTES_BULK_MAX_ITEMS)
+
+        old_values = sum_note_values(
+            (note.get_loaded_value("public"), note.get_loaded_value("completed")) for note in notes
+        )
+        new_values = sum_note_values((note.public, note.completed) for note in notes)
+        NoteStats.apply(notes[0].user_id, **{name: new_values[name] - old_values[name] for name in new_values})
+        counters.change("total_pub", new_values["public_notes"] - old_values["public_notes"])
+        search.index_notes([note for note in notes
+                            if note.name != note.get_loaded_value("name") or note.body_changed()])
+        note_cache.invalidate([note.pk for note in notes])
+        if new_values["public_notes"] or old_values["public_notes"]:
+            page_cache.invalidate()
+
+    for note in notes:
+        note._loaded_values = {field.attname: note.__dict__[field.attname] for field in note._meta.concrete_fields
+                               if field.attname in note.__dict__}
+    return notes
+
+
+def delete_notes(user, ids):
+    """
+    Deletes notes of the user
+    Ids of other users' notes are ignored
+    :param user: User
+    :param ids: iterable of note ids
+    :return: set of deleted ids
+    """
+    with transaction.atomic():
+        notes = list(Note.objects.filter(user=user, pk__in=ids).values_list("pk", "public", "completed"))
+        if not notes:
+            return set()
+        deleted = {pk for pk, _, _ in notes}
+        # likes are deleted by the cascade, the notes are loaded without bodies
+        with muted():
+            Note.objects.filter(pk__in=deleted).only("id", "user", "public", "completed").delete()
+
+        values = sum_note_values((public, completed) for _, public, completed in notes)
+        NoteStats.apply(user.pk, sign=-1, **values)
+        counters.change("total_notes", -len(notes))
+        counters.change("total_pub", -values["public_notes"])
+        activity.invalidate(user)
+        search.unindex_notes(deleted)
+        note_cache.invalidate(deleted)
+        if values["public_notes"]:
+            page_cache.invalidate()
+    return deleted
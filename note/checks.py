@@ -0,0 +1,24 @@
+"""
+System checks of the note app
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warns when NOTES_SHARED_CACHE is set for a cache local to every process
+    Invalidations of the homepage, note, token and activity caches only reach the process that made a change then
+    :param app_configs:
+    :param kwargs:
+    :return: list of CheckMessage
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.NOTES_SHARED_CACHE and backend == "django.core.cache.backends.locmem.LocMemCache":
+        return [Warning(
+            "NOTES_SHARED_CACHE is set but the default cache is local to every process.",
+            hint="Run a single server process or set NOTES_CACHE_LOCATION to a memcached server.",
+            id="note.W001",
+        )]
+    return []
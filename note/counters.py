@@ -0,0 +1,107 @@
+"""
+Site-wide counters service
+Counters shown on the homepage are kept in the cache so pages don't count the tables
+Signal handlers adjust them after every committed note or user change
+Cached values expire after NOTES_COUNTERS_TIMEOUT seconds and are recalculated
+from the database, the reconcile_counters command does the same on demand
+Adjustments only reach processes sharing the Django cache, with a process-local cache
+(NOTES_SHARED_CACHE unset) the counters of every process drift apart by the changes made in other processes
+until they expire, counting the tables on every homepage request would cost more than that
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+from note.models import Note
+
+KEY_PREFIX = "counters:"
+COUNTERS = ("total_notes", "total_pub", "total_users")
+
+
+def get_key(name):
+    """
+    Returns cache key of the counter
+    :param name: counter name
+    :return: str
+    """
+    return f"{KEY_PREFIX}{name}"
+
+
+def calculate():
+    """
+    Counts notes, public notes and users in the database
+    :return: dict
+    """
+    return {
+        "total_notes": Note.objects.count(),
+        "total_pub": Note.objects.filter(public=True).count(),
+        "total_users": User.objects.count(),
+    }
+
+
+def reconcile():
+    """
+    Recalculates counters from the database and stores them in the cache
+    :return: dict
+    """
+    values = calculate()
+    cache.set_many({get_key(name): value for name, value in values.items()},
+                   timeout=settings.NOTES_COUNTERS_TIMEOUT)
+    return values
+
+
+def get_counters():
+    """
+    Returns all counters
+    Doesn't touch the database unless a counter is missing in the cache
+    :return: dict
+    """
+    values = cache.get_many([get_key(name) for name in COUNTERS])
+    if len(values) != len(COUNTERS):
+        return reconcile()
+    return {name: values[get_key(name)] for name in COUNTERS}
+
+
+def change(name, delta):
+    """
+    Adds delta to the counter once the current transaction is committed
+    Missing counters are left alone as the next read recalculates them
+    :param name: counter name
+    :param delta: int
+    :return: None
+    """
+    if not delta:
+        return
+
+    def apply():
+        try:
+            cache.incr(get_key(name), delta)
+        except ValueError:
+            pass
+
+    transaction.on_commit(apply)
+
+
+def note_saved(note, created):
+    """
+    Adjusts counters after a note was saved
+    :param note: Note
+    :param created: bool
+    :return: None
+    """
+    if created:
+        change("total_notes", 1)
+        change("total_pub", int(note.public))
+    else:
+        change("total_pub", int(note.public) - int(note.get_loaded_value("public", note.public)))
+
+
+def note_deleted(note):
+    """
+    Adjusts counters after a note was deleted
+    :param note: Note
+    :return: None
+    """
+    change("total_notes", -1)
+    change("total_pub", -int(note.public))
@@ -0,0 +1,141 @@
+"""
+Compressed storage of large html bodies
+Bodies of at least COMPRESS_THRESHOLD bytes are stored zlib compressed as BLOBs,
+smaller ones stay plain text, SQLite keeps both in the same text column
+Stored values are decompressed lazily on the first access of the model attribute,
+so loaded but unused bodies and bodies saved back unchanged are never decompressed or compressed again
+Other databases store all bodies as plain text so containment search keeps working
+"""
+import zlib
+
+from django.db.models.query_utils import DeferredAttribute
+from tinymce.models import HTMLField
+
+# smaller bodies don't compress well enough to be worth it
+COMPRESS_THRESHOLD = 1024
+COMPRESS_LEVEL = 6
+
+
+def decompress(data):
+    """
+    Returns text of the compressed data
+    :param data: bytes
+    :return: str
+    """
+    return zlib.decompress(data).decode()
+
+
+class CompressedText:
+    """
+    Compressed value loaded from the database
+    The text is decompressed on the first access and kept
+    Compares equal to its text so loaded values can be compared to edited ones
+    """
+    __slots__ = ("data", "_text")
+
+    def __init__(self, data):
+        """
+        :param data: compressed bytes
+        """
+        self.data = bytes(data)
+        self._text = None
+
+    @property
+    def text(self):
+        """
+        Returns the decompressed text
+        :return: str
+        """
+        if self._text is None:
+            self._text = decompress(self.data)
+        return self._text
+
+    def __str__(self):
+        return self.text
+
+    # only the compressed data is pickled, e.g. by the cache
+    def __reduce__(self):
+        return CompressedText, (self.data,)
+
+    def __eq__(self, other):
+        if isinstance(other, CompressedText):
+            return self.data == other.data
+        return self.text == other
+
+    def __hash__(self):
+        return hash(self.text)
+
+
+class CompressedAttribute(DeferredAttribute):
+    """
+    Model attribute returning the text of compressed values
+    The loaded CompressedText stays in the instance dict until the attribute is set
+    so an unchanged body is saved with its already compressed data
+    """
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            return value.text
+        return value
+
+    # a data descriptor, otherwise the instance dict value would be returned without calling __get__
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedHTMLField(HTMLField):
+    """
+    TinyMCE html model field storing large values compressed
+    Works like HTMLField in forms, serializers and templates
+    """
+    descriptor_class = CompressedAttribute
+
+    def __init__(self, *args, threshold=COMPRESS_THRESHOLD, **kwargs):
+        """
+        :param threshold: size in bytes from which values are compressed
+        """
+        self.threshold = threshold
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.threshold != COMPRESS_THRESHOLD:
+            kwargs["threshold"] = self.threshold
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        """
+        Wraps compressed values, plain text is returned as it is
+        """
+        if isinstance(value, (bytes, memoryview)):
+            return CompressedText(value)
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, CompressedText):
+            return value.text
+        return super().to_python(value)
+
+    def pre_save(self, model_instance, add):
+        """
+        Returns the raw instance value to keep an unchanged CompressedText
+        """
+        return model_instance.__dict__.get(self.attname)
+
+    def get_db_prep_save(self, value, connection):
+        """
+        Compresses large values on SQLite
+        """
+        if isinstance(value, CompressedText):
+            return value.data if connection.vendor == "sqlite" else value.text
+        value = self.get_prep_value(value)
+        if connection.vendor != "sqlite" or not value:
+            return value
+        encoded = value.encode()
+        if len(encoded) >= self.threshold:
+            data = zlib.compress(encoded, COMPRESS_LEVEL)
+            # incompressible values are not worth decompressing on every read
+            if len(data) < len(encoded):
+                return data
+        return value
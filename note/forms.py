@@ -1,6 +1,7 @@
 from django import forms
 from tinymce.widgets import TinyMCE
 
+from note import sanitizer
 from note.models import Note
 
 
@@ -10,6 +11,7 @@ class NoteEditForm(forms.ModelForm):
     The form can be used both for creating and editing
     User field is not provided as it should be done automatically
     Sets html class attributes and tags
+    Sanitizes html body sent by the editor
     fields:
         :name:
         :body:
@@ -33,3 +35,10 @@ class NoteEditForm(forms.ModelForm):
             "label": "Body"
         }
     ))
+
+    def clean_body(self):
+        """
+        Sanitizes html body
+        :return: str
+        """
+        return sanitizer.sanitize(self.cleaned_data["body"])
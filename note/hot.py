@@ -0,0 +1,64 @@
+"""
+Time-decayed "hot" ranking of public notes
+A like weighs 1 when it is given and loses half of its weight every NOTES_HOT_HALF_LIFE seconds,
+the hot score of a note is the sum of the current weights of its likes
+Scores are stored in the indexed Note.hot_score column with the time they were decayed to in Note.hot_date
+A like or unlike decays the score of its note to the current time before changing it,
+the decay_hot_scores command periodically decays the scores of all notes
+Feeds sorted by hot read the stored scores, nothing is calculated per request
+Between runs of the command scores of notes that were not liked lag behind by the time since the last run
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Power
+
+# smaller scores are dropped to 0 so the command stops decaying them
+MIN_SCORE = 0.01
+
+
+def get_factor(since, now):
+    """
+    Returns the share of a weight left after the time between the dates
+    :param since: datetime
+    :param now: datetime
+    :return: float
+    """
+    seconds = max((now - since).total_seconds(), 0)
+    return 0.5 ** (seconds / settings.NOTES_HOT_HALF_LIFE)
+
+
+def get_factor_expression(now):
+    """
+    Returns get_factor of the hot_date column as an SQL expression for updates of all notes at once
+    Seconds are counted by the SQLite julianday function, POWER is registered by Django on SQLite connections
+    :param now: datetime
+    :return: Expression
+    """
+    seconds = RawSQL("MAX((julianday(%s) - julianday(hot_date)) * 86400, 0)",
+                     [connection.ops.adapt_datetimefield_value(now)], output_field=FloatField())
+    return Power(Value(0.5), seconds / Value(float(settings.NOTES_HOT_HALF_LIFE)))
+
+
+def decay(score, since, now):
+    """
+    Returns the score decayed from one date to another
+    :param score: float
+    :param since: datetime the score was decayed to
+    :param now: datetime
+    :return: float
+    """
+    score *= get_factor(since, now)
+    return score if score >= MIN_SCORE else 0.0
+
+
+def get_score(like_dates, now):
+    """
+    Returns the score of likes given at the dates
+    :param like_dates: iterable of datetime
+    :param now: datetime
+    :return: float
+    """
+    score = sum(get_factor(date, now) for date in like_dates)
+    return score if score >= MIN_SCORE else 0.0
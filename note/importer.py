@@ -0,0 +1,115 @@
+"""
+Note import helpers for the import_notes command
+Input is NDJSON (a note per line, the format of api/private/export) or a json list of notes
+Lines are parsed and bodies are sanitized by prepare_batch,
+which can run in worker processes while the main process writes to the database
+"""
+import gzip
+import io
+import json
+import sys
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from note import sanitizer
+from note.text import make_excerpt, get_plain_text
+
+NAME_LENGTH = 120
+
+
+def open_input(path):
+    """
+    Opens the input file as text, "-" reads stdin
+    Files ending with .gz are decompressed
+    :param path: str
+    :return: text stream
+    """
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def read_records(stream):
+    """
+    Yields input records
+    NDJSON lines are yielded as they are and parsed later by prepare_batch,
+    a json list is loaded at once and yields dicts
+    :param stream: text stream
+    :return: generator of str or dict
+    """
+    first = stream.read(1)
+    while first.isspace():
+        first = stream.read(1)
+    if first == "[":
+        yield from json.loads(first + stream.read())
+        return
+    line = first + stream.readline()
+    while line:
+        if line.strip():
+            yield line
+        line = stream.readline()
+
+
+def parse_date(value):
+    """
+    Returns aware datetime from an ISO string or None
+    :param value:
+    :return: datetime or None
+    """
+    try:
+        date = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        return None
+    if date is not None and timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def prepare(record):
+    """
+    Turns an input record into note field values
+    Sanitizes the body and calculates the excerpt and plain text
+    :param record: json line or dict
+    :return: (field values, plain text of the body) or None if the record is invalid
+    """
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except ValueError:
+            return None
+    if not isinstance(record, dict):
+        return None
+    name = record.get("name")
+    body = record.get("body")
+    if not isinstance(name, str) or not name.strip() or not isinstance(body, (str, type(None))):
+        return None
+
+    body = sanitizer.sanitize(body)
+    text = get_plain_text(body)
+    values = {
+        "user": record.get("user") if isinstance(record.get("user"), str) else None,
+        "name": name[:NAME_LENGTH],
+        "body": body,
+        "excerpt": make_excerpt(body),
+        "text_length": len(text),
+        "public": bool(record.get("public", False)),
+        "favorite": bool(record.get("favorite", False)),
+        "completed": bool(record.get("completed", False)),
+    }
+    for field in ("date_created", "date_edited"):
+        date = parse_date(record.get(field))
+        if date is not None:
+            values[field] = date
+    return values, text
+
+
+def prepare_batch(records):
+    """
+    Prepares a batch of input records
+    :param records: list of json lines or dicts
+    :return: list of prepare results, None for invalid records
+    """
+    return [prepare(record) for record in records]
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from note.models import Note
+from note.text import make_excerpt, get_plain_text
+
+
+class Command(BaseCommand):
+    """
+    Recalculates note excerpts and text lengths from the bodies
+    Processes notes in primary key order in batches, each batch in its own transaction
+    Usage:
+        python manage.py backfill_excerpts
+        python manage.py backfill_excerpts --batch-size 1000 --empty-only
+    """
+    help = "Recalculates note excerpts and text lengths"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="amount of notes updated in a single query")
+        parser.add_argument("--empty-only", action="store_true",
+                            help="only process notes without an excerpt")
+
+    def handle(self, *args, **options):
+        notes = Note.objects.order_by("pk").only("id", "body")
+        if options["empty_only"]:
+            notes = notes.filter(excerpt="")
+
+        last_pk = 0
+        updated = 0
+        while True:
+            batch = list(notes.filter(pk__gt=last_pk)[:options["batch_size"]])
+            if not batch:
+                break
+            for note in batch:
+                note.excerpt = make_excerpt(note.body)
+                note.text_length = len(get_plain_text(note.body))
+            with transaction.atomic():
+                Note.objects.bulk_update(batch, ["excerpt", "text_length"])
+            last_pk = batch[-1].pk
+            updated += len(batch)
+            self.stdout.write(f"{updated} notes processed")
+
+        self.stdout.write(self.style.SUCCESS(f"Updated excerpts of {updated} notes"))
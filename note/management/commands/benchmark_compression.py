@@ -0,0 +1,82 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from tinymce.models import HTMLField
+
+from note.fields import CompressedHTMLField, CompressedText
+from note.seed import make_body, make_body_size
+
+TABLE = "benchmark_compression"
+
+
+class Command(BaseCommand):
+    """
+    Compares storage size and latency of note bodies stored by HTMLField and CompressedHTMLField
+    Generated bodies are written to and read back from a temporary table one by one
+    the same way the fields convert model values, read latency includes decompression
+    Usage:
+        python manage.py benchmark_compression
+        python manage.py benchmark_compression --bodies 2000 --body-size 4000
+    """
+    help = "Measures size savings and latency of compressed note bodies"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bodies", type=int, default=1000,
+                            help="amount of generated bodies")
+        parser.add_argument("--body-size", type=int, default=2000,
+                            help="median body size in characters")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Bodies are only compressed on SQLite")
+        rng = random.Random(options["seed"])
+        bodies = [make_body(rng, make_body_size(rng, options["body_size"])) for _ in range(options["bodies"])]
+
+        fields = (("HTMLField", HTMLField()), ("CompressedHTMLField", CompressedHTMLField()))
+        results = {name: self.run(field, bodies) for name, field in fields}
+        self.stdout.write(f"{'field':<20}{'stored KiB':>12}{'write ms':>10}{'read ms':>9}")
+        for name, (size, write, read) in results.items():
+            self.stdout.write(f"{name:<20}{size / 1024:12.0f}{write:10.3f}{read:9.3f}")
+
+        plain, compressed = results["HTMLField"][0], results["CompressedHTMLField"][0]
+        size = sum(map(len, bodies)) / len(bodies) / 1024
+        self.stdout.write(self.style.SUCCESS(f"{len(bodies)} bodies of {size:.1f} KiB on average "
+                                             f"take {compressed / plain:.0%} of the plain size"))
+
+    @staticmethod
+    def run(field, bodies):
+        """
+        Writes the bodies to a temporary table and reads them back by id
+        :param field: model field converting the values
+        :param bodies: list of str
+        :return: (stored bytes, write ms per body, read ms per body)
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"CREATE TEMP TABLE {TABLE} (id integer PRIMARY KEY, body text NULL)")
+            try:
+                start = time.perf_counter()
+                for pk, body in enumerate(bodies):
+                    cursor.execute(f"INSERT INTO {TABLE} (id, body) VALUES (%s, %s)",
+                                   [pk, field.get_db_prep_save(body, connection)])
+                write = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for pk in range(len(bodies)):
+                    cursor.execute(f"SELECT body FROM {TABLE} WHERE id = %s", [pk])
+                    value = cursor.fetchone()[0]
+                    if hasattr(field, "from_db_value"):
+                        value = field.from_db_value(value, None, connection)
+                    if isinstance(value, CompressedText):
+                        value = value.text
+                    if value != bodies[pk]:
+                        raise CommandError(f"Body {pk} was not read back unchanged")
+                read = time.perf_counter() - start
+
+                cursor.execute(f"SELECT SUM(LENGTH(CAST(body AS BLOB))) FROM {TABLE}")
+                size = cursor.fetchone()[0]
+            finally:
+                cursor.execute(f"DROP TABLE {TABLE}")
+        return size, write * 1000 / len(bodies), read * 1000 / len(bodies)
@@ -0,0 +1,234 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+from note.benchmarks import percentile
+from note.models import Note
+
+SERVERS = ("wsgi", "asgi")
+
+
+class Command(BaseCommand):
+    """
+    Load test comparing throughput of public read endpoints under WSGI and ASGI
+    with many concurrent connections
+    Every connection sends requests one after another until the total amount is reached
+    WSGI requests are served by a thread per connection like a threaded WSGI server,
+    ASGI requests by a single event loop with async views and the bounded database thread pool
+    Requests are passed to the Django applications in-process, no sockets are involved
+    Each server runs in its own process against the current database with API rate limits turned off
+    Generate data with the seed_notes command first
+    Usage:
+        python manage.py benchmark_concurrency
+        python manage.py benchmark_concurrency --connections 10 100 500 --requests 5000
+        python manage.py benchmark_concurrency --url /api/public?sort=likes
+    """
+    help = "Compares concurrent request throughput under WSGI and ASGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, nargs="+", default=[10, 100],
+                            help="amounts of concurrent connections to test")
+        parser.add_argument("--requests", type=int, default=2000,
+                            help="amount of requests in every run")
+        parser.add_argument("--url", action="append", dest="urls",
+                            help="requested url, can be repeated (public list, note and homepage api by default)")
+        parser.add_argument("--server", choices=SERVERS,
+                            help="run a single server in the current process and print json results")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or min(options["connections"]) < 1:
+            raise CommandError("--requests and --connections have to be positive")
+        urls = options["urls"] or self.get_default_urls()
+
+        if options["server"]:
+            with override_settings(NOTES_API_THROTTLE_RATES={}):
+                for connections in options["connections"]:
+                    result = self.run(options["server"], urls, connections, options["requests"])
+                    self.stdout.write(json.dumps(result))
+            return
+
+        results = {server: self.run_process(server, urls, options) for server in SERVERS}
+        self.stdout.write(f"{'server':<8}{'connections':>12}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+                          f"{'threads':>9}{'errors':>8}")
+        for index, connections in enumerate(options["connections"]):
+            for server in SERVERS:
+                result = results[server][index]
+                self.stdout.write(f"{server:<8}{connections:>12}{result['rate']:10.1f}{result['p50']:9.2f}"
+                                  f"{result['p95']:9.2f}{result['threads']:9}{result['errors']:8}")
+            ratio = results["asgi"][index]["rate"] / results["wsgi"][index]["rate"]
+            self.stdout.write(self.style.SUCCESS(f"ASGI serves {ratio:.2f}x the WSGI throughput "
+                                                 f"with {connections} connections"))
+
+    @staticmethod
+    def get_default_urls():
+        """
+        Returns urls of the public read endpoints
+        :return: list of str
+        """
+        public_note = Note.objects.filter(public=True).order_by("-likes", "-date_edited", "-id").first()
+        if public_note is None:
+            raise CommandError("There are no public notes, generate them with the seed_notes command")
+        return ["/api/public", f"/api/public/{public_note.pk}", "/api/homepage"]
+
+    def run_process(self, server, urls, options):
+        """
+        Runs the benchmark of the server in a new process
+        Async views are only routed in processes started with NOTES_ASYNC_VIEWS
+        :param server: "wsgi" or "asgi"
+        :param urls: list of str
+        :param options: command options
+        :return: list of results, one for each amount of connections
+        """
+        command = [sys.executable, str(settings.BASE_DIR / "manage.py"), "benchmark_concurrency",
+                   "--server", server, "--requests", str(options["requests"]),
+                   "--connections", *[str(connections) for connections in options["connections"]]]
+        for url in urls:
+            command += ["--url", url]
+        env = {**os.environ, "NOTES_ASYNC_VIEWS": "1" if server == "asgi" else "0"}
+        self.stdout.write(f"Running {server}...")
+        process = subprocess.run(command, env=env, capture_output=True, text=True)
+        if process.returncode:
+            raise CommandError(f"{server} benchmark failed:\n{process.stderr}")
+        return [json.loads(line) for line in process.stdout.splitlines() if line.startswith("{")]
+
+    def run(self, server, urls, connections, requests):
+        """
+        Sends the requests through the server application
+        The first request of every url is a warm-up and is not measured
+        :param server: "wsgi" or "asgi"
+        :param urls: list of str
+        :param connections: amount of concurrent connections
+        :param requests: amount of measured requests
+        :return: dict of requests per second, p50 and p95 latency in milliseconds,
+                 amount of threads and failed requests
+        """
+        if server == "asgi":
+            application = get_asgi_application()
+            statuses = [asyncio.run(self.send_asgi(application, url)) for url in urls]
+            serve = self.serve_asgi
+        else:
+            application = get_wsgi_application()
+            statuses = [self.send_wsgi(application, url) for url in urls]
+            serve = self.serve_wsgi
+        for url, status in zip(urls, statuses):
+            if status != 200:
+                raise CommandError(f"{url} returned {status}")
+
+        start = time.perf_counter()
+        timings, errors, threads = serve(application, urls, connections, requests)
+        elapsed = time.perf_counter() - start
+        return {"rate": requests / elapsed, "p50": percentile(timings, 0.5), "p95": percentile(timings, 0.95),
+                "threads": threads, "errors": errors}
+
+    @staticmethod
+    def send_wsgi(application, url):
+        """
+        Sends a GET request to the WSGI application
+        :param application: WSGIHandler
+        :param url: str
+        :return: response status code
+        """
+        parts = urlsplit(url)
+        environ = {
+            "REQUEST_METHOD": "GET", "PATH_INFO": parts.path, "QUERY_STRING": parts.query,
+            "SERVER_NAME": "127.0.0.1", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": "127.0.0.1", "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr,
+            "wsgi.url_scheme": "http", "wsgi.multithread": True, "wsgi.multiprocess": False,
+            "wsgi.run_once": False, "wsgi.version": (1, 0),
+        }
+        statuses = []
+        response = application(environ, lambda status, headers: statuses.append(status))
+        try:
+            b"".join(response)
+        finally:
+            response.close()
+        return int(statuses[0].split()[0])
+
+    def serve_wsgi(self, application, urls, connections, requests):
+        """
+        Serves every connection by its own thread
+        :return: (timings, errors, threads)
+        """
+        counter = iter(range(requests))
+        lock = threading.Lock()
+        timings, errors = [], []
+
+        def connection():
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                start = time.perf_counter()
+                status = self.send_wsgi(application, urls[index % len(urls)])
+                timings.append((time.perf_counter() - start) * 1000)
+                if status != 200:
+                    errors.append(status)
+
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            for _ in range(connections):
+                executor.submit(connection)
+            threads = threading.active_count()
+        return timings, len(errors), threads
+
+    @staticmethod
+    async def send_asgi(application, url):
+        """
+        Sends a GET request to the ASGI application
+        :param application: ASGIHandler
+        :param url: str
+        :return: response status code
+        """
+        parts = urlsplit(url)
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": parts.path, "raw_path": parts.path.encode(),
+            "query_string": parts.query.encode(), "root_path": "",
+            "headers": [(b"host", b"127.0.0.1")], "server": ("127.0.0.1", 80), "client": ("127.0.0.1", 50000),
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await application(scope, receive, send)
+        return messages[0]["status"]
+
+    def serve_asgi(self, application, urls, connections, requests):
+        """
+        Serves all connections by a single event loop
+        :return: (timings, errors, threads)
+        """
+        counter = iter(range(requests))
+        timings, errors = [], []
+
+        async def connection():
+            for index in counter:
+                start = time.perf_counter()
+                status = await self.send_asgi(application, urls[index % len(urls)])
+                timings.append((time.perf_counter() - start) * 1000)
+                if status != 200:
+                    errors.append(status)
+
+        async def main():
+            await asyncio.gather(*[connection() for _ in range(connections)])
+            return threading.active_count()
+
+        threads = asyncio.run(main())
+        return timings, len(errors), threads
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from note import page_cache
+
+
+class Command(BaseCommand):
+    """
+    Compares homepage throughput of anonymous visitors with and without the response cache
+    Requests go through the whole middleware stack of the current database
+    The command runs in a single process so its cache counts as shared for the cached run
+    Usage:
+        python manage.py benchmark_homepage
+        python manage.py benchmark_homepage --requests 500 --sort date
+    """
+    help = "Measures cached and uncached homepage throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200,
+                            help="amount of requests in every run")
+        parser.add_argument("--sort", choices=["likes", "date", "hot"], default="likes",
+                            help="sort order of the requested page")
+
+    def handle(self, *args, **options):
+        url = "/" if options["sort"] == "likes" else f"/?sort={options['sort']}"
+        client = Client(HTTP_HOST="127.0.0.1")
+
+        with override_settings(NOTES_HOMEPAGE_CACHE_TIMEOUT=0):
+            uncached = self.run(client, url, options["requests"])
+
+        with override_settings(NOTES_SHARED_CACHE=True):
+            # the first request fills the cache
+            page_cache.invalidate()
+            client.get(url)
+            cached = self.run(client, url, options["requests"])
+
+        for name, (rate, latency, queries) in (("uncached", uncached), ("cached", cached)):
+            self.stdout.write(f"{name:>8}: {rate:8.1f} req/s  {latency:7.2f} ms/req  {queries:5.1f} queries/req")
+        self.stdout.write(self.style.SUCCESS(f"Cached pages are served {cached[0] / uncached[0]:.1f}x faster"))
+
+    @staticmethod
+    def run(client, url, requests):
+        """
+        Requests the url several times
+        :param client: Client
+        :param url: str
+        :param requests: int
+        :return: requests per second, milliseconds per request, queries per request
+        """
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(requests):
+                response = client.get(url)
+                assert response.status_code == 200, response.status_code
+            elapsed = time.perf_counter() - start
+        return requests / elapsed, elapsed * 1000 / requests, len(queries) / requests
@@ -0,0 +1,60 @@
+import random
+import time
+
+import bleach
+from django.core.management.base import BaseCommand
+
+from note import sanitizer
+from note.seed import make_body
+
+
+class Command(BaseCommand):
+    """
+    Measures sanitizing of large TinyMCE bodies
+    Compares cleaning with allow-lists rebuilt on every call,
+    the prebuilt cleaner and the memoized sanitizer on unchanged bodies
+    Usage:
+        python manage.py benchmark_sanitizer
+        python manage.py benchmark_sanitizer --bodies 50 --size 100000
+    """
+    help = "Measures html sanitizing of note bodies"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bodies", type=int, default=20,
+                            help="amount of generated bodies")
+        parser.add_argument("--size", type=int, default=50000,
+                            help="approximate size of a body in characters")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        bodies = [make_body(rng, options["size"]) for _ in range(options["bodies"])]
+        sanitizer.clear()
+
+        def rebuilt(body):
+            return bleach.clean(
+                body,
+                tags=list(sanitizer.TAGS),
+                attributes=dict(sanitizer.ATTRIBUTES),
+                styles=list(sanitizer.STYLES),
+                strip=False,
+                strip_comments=True
+            )
+
+        runs = (
+            ("rebuilt cleaner", rebuilt),
+            ("prebuilt cleaner", sanitizer.get_cleaner().clean),
+            ("memoized, first save", sanitizer.sanitize),
+            ("memoized, unchanged", sanitizer.sanitize),
+        )
+        results = {}
+        for name, clean in runs:
+            start = time.perf_counter()
+            results[name] = [clean(body) for body in bodies]
+            elapsed = (time.perf_counter() - start) * 1000 / len(bodies)
+            self.stdout.write(f"{name:>22}: {elapsed:9.3f} ms/body")
+
+        if len({tuple(cleaned) for cleaned in results.values()}) != 1:
+            self.stderr.write("Sanitized bodies differ between runs")
+        size = sum(map(len, bodies)) / len(bodies) / 1024
+        self.stdout.write(self.style.SUCCESS(f"{len(bodies)} bodies of {size:.0f} KiB on average"))
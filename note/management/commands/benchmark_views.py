@@ -0,0 +1,64 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from note import benchmarks
+
+
+class Command(BaseCommand):
+    """
+    Runs the view benchmark suite against the current database
+    Fails if a view runs more queries than its budget
+    or gets slower or runs more queries than the stored baseline
+    Generate data with the seed_notes command first
+    Usage:
+        python manage.py benchmark_views --update-baseline
+        python manage.py benchmark_views --requests 50 --tolerance 0.3
+        python manage.py benchmark_views --scenario "note list" --scenario "api private"
+    """
+    help = "Measures latency and query counts of views"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20,
+                            help="amount of measured requests of every scenario")
+        parser.add_argument("--user", help="benchmark user, the user with the most notes by default")
+        parser.add_argument("--scenario", action="append", dest="scenarios",
+                            help="scenario to run, can be repeated (all by default)")
+        parser.add_argument("--baseline", default=settings.NOTES_BENCHMARK_BASELINE,
+                            help="baseline json file")
+        parser.add_argument("--update-baseline", action="store_true",
+                            help="store the results as the new baseline instead of comparing")
+        parser.add_argument("--tolerance", type=float, default=0.5,
+                            help="allowed p95 slowdown relative to the baseline, 0.5 is 50%%")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1:
+            raise CommandError("--requests has to be positive")
+        try:
+            results = benchmarks.run(options["requests"], options["user"], options["scenarios"])
+        except (ValueError, RuntimeError) as error:
+            raise CommandError(error)
+
+        self.stdout.write(f"{'scenario':<22}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}{'budget':>8}")
+        for name, result in results.items():
+            self.stdout.write(f"{name:<22}{result['p50']:9.2f}{result['p95']:9.2f}"
+                              f"{result['queries']:9}{result['budget']:8}")
+
+        if options["update_baseline"]:
+            with open(options["baseline"], "w") as file:
+                json.dump(results, file, indent=4)
+            self.stdout.write(self.style.SUCCESS(f"Baseline stored in {options['baseline']}"))
+            baseline = None
+        else:
+            try:
+                with open(options["baseline"]) as file:
+                    baseline = json.load(file)
+            except FileNotFoundError:
+                self.stdout.write(self.style.WARNING("No baseline found, only query budgets are checked"))
+                baseline = None
+
+        failures = benchmarks.check(results, baseline, options["tolerance"])
+        if failures:
+            raise CommandError("Benchmark failed:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("All views are within their budgets"))
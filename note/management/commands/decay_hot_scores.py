@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from note.models import Note
+
+
+class Command(BaseCommand):
+    """
+    Decays hot scores of notes to the current time
+    Run it periodically, e.g. every 15 minutes from cron,
+    the hot ranking of notes that were not liked lags behind by the time since the last run
+    Usage:
+        python manage.py decay_hot_scores
+        python manage.py decay_hot_scores --rebuild
+    """
+    help = "Decays hot scores of notes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true",
+                            help="recalculate the scores from the dates of likes instead")
+        parser.add_argument("--batch-size", type=int, default=1000, help="amount of notes rebuilt at once")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            rebuilt = Note.rebuild_hot_scores(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt hot scores of {rebuilt} note(s)"))
+            return
+        decayed = Note.decay_hot_scores()
+        self.stdout.write(self.style.SUCCESS(f"Decayed hot scores of {decayed} note(s)"))
@@ -0,0 +1,205 @@
+import collections
+import itertools
+import multiprocessing
+import os
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from note import activity, counters, importer, page_cache, search
+from note.bulk import assign_ids, sum_note_values
+from note.models import Note, NoteImport, NoteStats
+
+
+class Command(BaseCommand):
+    """
+    Imports notes from an NDJSON file (the format of api/private/export) or a json list
+    Bodies are sanitized in worker processes, notes are inserted with bulk_create,
+    every batch is inserted in its own transaction together with the import checkpoint
+    so an interrupted import continues after the last imported batch with --resume
+    Authors are taken from the "user" field of the notes or set with --user
+    Usage:
+        python manage.py import_notes notes.ndjson --user admin
+        python manage.py import_notes notes.ndjson.gz --create-users --batch-size 5000
+        cat notes.ndjson | python manage.py import_notes - --name nightly --resume
+    """
+    help = "Imports notes from an NDJSON or json file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="input file, .gz files are decompressed, - reads stdin")
+        parser.add_argument("--user", help="author of all imported notes")
+        parser.add_argument("--create-users", action="store_true",
+                            help="create missing authors instead of skipping their notes")
+        parser.add_argument("--batch-size", type=int, default=2000,
+                            help="amount of notes inserted in a single transaction")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="amount of processes sanitizing bodies")
+        parser.add_argument("--name", help="checkpoint name, the file name by default")
+        parser.add_argument("--resume", action="store_true",
+                            help="skip records imported by a previous run with the same name")
+
+    def handle(self, *args, **options):
+        name = options["name"] or os.path.basename(options["path"])
+        if not name or name == "-":
+            raise CommandError("--name is required to import from stdin")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size has to be positive")
+
+        checkpoint, _ = NoteImport.objects.get_or_create(name=name)
+        if checkpoint.position and not options["resume"]:
+            raise CommandError(f"Import \"{name}\" already processed {checkpoint.position} records, "
+                               f"add --resume to continue it or pick another --name")
+        if checkpoint.position:
+            self.stdout.write(f"Resuming after {checkpoint.position} records")
+
+        self.users = {}
+        self.skipped = collections.Counter()
+        self.default_user = options["user"]
+        self.create_users = options["create_users"]
+        if self.default_user and not self.resolve_users([self.default_user]):
+            raise CommandError(f"User \"{self.default_user}\" does not exist")
+
+        with importer.open_input(options["path"]) as stream:
+            records = itertools.islice(importer.read_records(stream), checkpoint.position, None)
+            batches = iter(lambda: list(itertools.islice(records, options["batch_size"])), [])
+            self.run(checkpoint, batches, options["workers"])
+
+    def run(self, checkpoint, batches, workers):
+        """
+        Prepares batches in worker processes and imports them in the input order
+        At most two batches per worker are prepared ahead so memory stays bounded
+        :param checkpoint: NoteImport
+        :param batches: iterator of lists of records
+        :param workers: int
+        :return: None
+        """
+        start = time.perf_counter()
+        reported = start
+        imported = 0
+        if workers > 1:
+            # workers never use the database, connections are not shared with them
+            connections.close_all()
+            pool = multiprocessing.Pool(workers)
+            pending = collections.deque()
+            prepared = self.iter_prepared(pool, pending, batches, workers * 2)
+        else:
+            pool = None
+            prepared = ((len(batch), importer.prepare_batch(batch)) for batch in batches)
+        try:
+            for size, results in prepared:
+                imported += self.import_batch(checkpoint, size, results)
+                now = time.perf_counter()
+                if now - reported >= 2:
+                    reported = now
+                    self.stdout.write(f"{checkpoint.position} records processed, {imported} notes imported, "
+                                      f"{imported / (now - start):.0f} notes/s")
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        elapsed = time.perf_counter() - start
+        for reason, count in self.skipped.items():
+            if count:
+                self.stdout.write(self.style.WARNING(f"Skipped {count} records: {reason}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} notes in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} notes/s), "
+            f"{checkpoint.imported} in total"
+        ))
+
+    @staticmethod
+    def iter_prepared(pool, pending, batches, ahead):
+        """
+        Yields prepared batches in the input order keeping up to "ahead" batches in work
+        :param pool: Pool
+        :param pending: deque of (size, AsyncResult)
+        :param batches: iterator of lists of records
+        :param ahead: int
+        :return: generator of (size, results)
+        """
+        for batch in batches:
+            pending.append((len(batch), pool.apply_async(importer.prepare_batch, (batch,))))
+            if len(pending) >= ahead:
+                size, result = pending.popleft()
+                yield size, result.get()
+        while pending:
+            size, result = pending.popleft()
+            yield size, result.get()
+
+    def resolve_users(self, names):
+        """
+        Looks up authors by username, creates missing ones if asked to
+        Results are remembered for the whole run
+        :param names: iterable of usernames
+        :return: dict of existing usernames among the names to user ids
+        """
+        unknown = {name for name in names if name not in self.users}
+        if unknown:
+            existing = dict(User.objects.filter(username__in=unknown).values_list("username", "id"))
+            missing = unknown - set(existing)
+            if missing and self.create_users:
+                User.objects.bulk_create([User(username=name, password=make_password(None)) for name in missing])
+                counters.change("total_users", len(missing))
+                existing.update(User.objects.filter(username__in=missing).values_list("username", "id"))
+            self.users.update({name: existing.get(name) for name in unknown})
+        return {name: self.users[name] for name in names if self.users[name]}
+
+    def import_batch(self, checkpoint, size, results):
+        """
+        Inserts prepared notes of a batch with the checkpoint in a single transaction
+        Keeps statistics, counters, activity, the search index and the homepage cache up to date
+        :param checkpoint: NoteImport
+        :param size: amount of input records in the batch
+        :param results: prepared records
+        :return: amount of imported notes
+        """
+        now = timezone.now()
+        rows = []
+        for result in results:
+            if result is None:
+                self.skipped["invalid note"] += 1
+                continue
+            values, text = result
+            values["user"] = self.default_user or values["user"]
+            if not values["user"]:
+                self.skipped["no author"] += 1
+                continue
+            values.setdefault("date_created", now)
+            values.setdefault("date_edited", values["date_created"])
+            rows.append((values, text))
+
+        with transaction.atomic():
+            authors = self.resolve_users({values["user"] for values, _ in rows})
+            self.skipped["unknown author"] += sum(values["user"] not in authors for values, _ in rows)
+            rows = [(values, text) for values, text in rows if values["user"] in authors]
+            for values, _ in rows:
+                values["user_id"] = authors[values.pop("user")]
+            notes = [Note(**values) for values, _ in rows]
+
+            if notes:
+                Note.objects.bulk_create(notes)
+                if notes[0].pk is None:
+                    assign_ids(notes)
+                search.index_rows([(note.pk, note.name, text) for note, (_, text) in zip(notes, rows)],
+                                  replace=False)
+
+                by_user = collections.defaultdict(list)
+                for note in notes:
+                    by_user[note.user_id].append((note.public, note.completed))
+                for user, values in by_user.items():
+                    NoteStats.apply(user, **sum_note_values(values))
+                    activity.invalidate(user)
+                public = sum(note.public for note in notes)
+                counters.change("total_notes", len(notes))
+                counters.change("total_pub", public)
+                if public:
+                    page_cache.invalidate()
+
+            checkpoint.position += size
+            checkpoint.imported += len(notes)
+            checkpoint.date_updated = now
+            checkpoint.save(update_fields=["position", "imported", "date_updated"])
+        return len(notes)
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from note.models import NoteStats
+
+
+class Command(BaseCommand):
+    """
+    Recalculates per user note statistics from the notes table
+    Usage:
+        python manage.py rebuild_note_stats
+        python manage.py rebuild_note_stats --user admin --user guest
+    """
+    help = "Recalculates per user note statistics"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", dest="users",
+                            help="username to rebuild, can be repeated (all users by default)")
+
+    def handle(self, *args, **options):
+        users = options["users"]
+        if users is not None:
+            users = list(User.objects.filter(username__in=users).values_list("id", flat=True))
+        rebuilt = NoteStats.rebuild(users)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics of {rebuilt} user(s)"))
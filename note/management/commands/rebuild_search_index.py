@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from note import search
+
+
+class Command(BaseCommand):
+    """
+    Recreates the full-text search index from the notes table
+    Usage:
+        python manage.py rebuild_search_index
+    """
+    help = "Recreates the full-text search index of notes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="amount of notes loaded at once")
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING("Full-text index is only available on SQLite"))
+            return
+        indexed = search.rebuild(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} notes"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from note import counters
+
+
+class Command(BaseCommand):
+    """
+    Recalculates cached site-wide counters from the database
+    Meant to be run periodically, e.g. by cron
+    Usage:
+        python manage.py reconcile_counters
+    """
+    help = "Recalculates cached site-wide counters"
+
+    def handle(self, *args, **options):
+        values = counters.reconcile()
+        for name, value in values.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS("Counters reconciled"))
@@ -0,0 +1,112 @@
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from note import counters, page_cache, search
+from note.bulk import assign_ids
+from note.models import Note, NoteLike, NoteStats
+from note.seed import make_body, make_body_size, make_likes, make_weights, make_words
+from note.signals import muted
+from note.text import make_excerpt, get_plain_text
+
+
+class Command(BaseCommand):
+    """
+    Fills the database with generated users, notes and likes for benchmarks
+    Authors, likes and body sizes follow long-tailed distributions,
+    the same seed always generates the same data
+    Statistics, counters and the search index are rebuilt at the end
+    Usage:
+        python manage.py seed_notes
+        python manage.py seed_notes --users 1000 --notes 100000 --body-size 4000 --clear
+    """
+    help = "Generates users, notes and likes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100, help="amount of generated users")
+        parser.add_argument("--notes", type=int, default=10000, help="amount of generated notes")
+        parser.add_argument("--public", type=float, default=0.3, help="share of public notes")
+        parser.add_argument("--likes-alpha", type=float, default=1.2,
+                            help="shape of the likes distribution, smaller values give more likes")
+        parser.add_argument("--body-size", type=int, default=2000, help="median body size in characters")
+        parser.add_argument("--months", type=int, default=24, help="notes are created over this many months")
+        parser.add_argument("--prefix", default="seed", help="prefix of generated usernames")
+        parser.add_argument("--password", default="seed-password", help="password of generated users")
+        parser.add_argument("--seed", type=int, default=1, help="random seed")
+        parser.add_argument("--batch-size", type=int, default=1000, help="amount of notes inserted at once")
+        parser.add_argument("--clear", action="store_true", help="delete previously generated data first")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        usernames = [f"{prefix}{i}" for i in range(options["users"])]
+        if not usernames:
+            raise CommandError("--users has to be positive")
+
+        existing = User.objects.filter(username__in=usernames)
+        if existing.exists():
+            if not options["clear"]:
+                raise CommandError(f"Users with the \"{prefix}\" prefix already exist, add --clear to replace them")
+            with transaction.atomic(), muted():
+                Note.objects.filter(user__in=existing).delete()
+                existing.delete()
+
+        # hashing is slow, every user gets the same password hash
+        password = make_password(options["password"])
+        users = User.objects.bulk_create([User(username=name, password=password) for name in usernames])
+        if users[0].pk is None:
+            users = list(User.objects.filter(username__in=usernames).order_by("pk"))
+        self.stdout.write(f"Created {len(users)} users")
+
+        weights = make_weights(len(users))
+        now = timezone.now()
+        span = datetime.timedelta(days=30 * options["months"]).total_seconds()
+        created = 0
+        liked = 0
+        while created < options["notes"]:
+            size = min(options["batch_size"], options["notes"] - created)
+            notes = []
+            for author in rng.choices(users, weights=weights, k=size):
+                body = make_body(rng, make_body_size(rng, options["body_size"]))
+                date_created = now - datetime.timedelta(seconds=rng.uniform(0, span))
+                notes.append(Note(
+                    user=author,
+                    name=make_words(rng, rng.randint(2, 6)).capitalize(),
+                    body=body,
+                    excerpt=make_excerpt(body),
+                    text_length=len(get_plain_text(body)),
+                    date_created=date_created,
+                    date_edited=date_created + (now - date_created) * rng.random() ** 4,
+                    public=rng.random() < options["public"],
+                    favorite=rng.random() < 0.1,
+                    completed=rng.random() < 0.5,
+                ))
+
+            with transaction.atomic():
+                Note.objects.bulk_create(notes)
+                if notes[0].pk is None:
+                    assign_ids(notes)
+                likes = []
+                for note in notes:
+                    if note.public:
+                        likers = rng.sample(users, make_likes(rng, options["likes_alpha"], len(users)))
+                        likes.extend(NoteLike(note=note, user=user, created=note.date_created) for user in likers)
+                        note.likes = len(likers)
+                NoteLike.objects.bulk_create(likes, batch_size=options["batch_size"])
+                Note.objects.bulk_update([note for note in notes if note.likes], ["likes"],
+                                         batch_size=options["batch_size"])
+            created += len(notes)
+            liked += len(likes)
+            self.stdout.write(f"{created} notes created")
+
+        NoteStats.rebuild()
+        Note.rebuild_hot_scores()
+        search.rebuild()
+        counters.reconcile()
+        page_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"Created {created} notes with {liked} likes"))
@@ -0,0 +1,141 @@
+"""
+In-process request metrics
+Histograms of request duration, SQL time, SQL query count and response size per url route,
+filled by the RequestMetricsMiddleware and rendered in the Prometheus text format
+Every process keeps its own metrics, Prometheus sums them up per instance
+"""
+import bisect
+import threading
+
+# upper bounds of histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """
+    Prometheus histogram with labels
+    Observations only increment counters under a lock, buckets are made cumulative when rendered
+    """
+
+    def __init__(self, name, documentation, buckets, labels):
+        """
+        :param name: metric name
+        :param documentation: help text
+        :param buckets: sorted upper bounds of buckets
+        :param labels: label names
+        """
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """
+        Records a single value
+        :param value: number
+        :param label_values: values of the labels in the same order
+        :return: None
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                # counts of every bucket and +Inf, then the sum of values
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        """
+        Returns the histogram in the Prometheus text format
+        :return: list of lines
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = ",".join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, label_values))
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                total += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {total}')
+            lines.append(f"{self.name}_sum{{{labels}}} {values[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {total}")
+        return lines
+
+    def clear(self):
+        """
+        Drops all observations
+        :return: None
+        """
+        with self.lock:
+            self.series.clear()
+
+
+def escape(value):
+    """
+    Escapes a label value
+    :param value: str
+    :return: str
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+LABELS = ("route", "method")
+
+# methods recorded under their own label, any other method sent by a client is recorded as "other"
+METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE", "CONNECT"))
+
+request_duration = Histogram("notes_request_duration_seconds",
+                             "Time spent processing requests", DURATION_BUCKETS, LABELS)
+sql_duration = Histogram("notes_request_sql_duration_seconds",
+                         "Time spent in SQL queries per request", DURATION_BUCKETS, LABELS)
+sql_queries = Histogram("notes_request_sql_queries",
+                        "Amount of SQL queries per request", QUERY_BUCKETS, LABELS)
+response_size = Histogram("notes_response_size_bytes",
+                          "Size of response bodies, streaming responses are not measured", SIZE_BUCKETS, LABELS)
+
+HISTOGRAMS = (request_duration, sql_duration, sql_queries, response_size)
+
+
+def observe(route, method, duration, sql_time, queries, size=None):
+    """
+    Records metrics of a single request
+    :param route: url route
+    :param method: http method
+    :param duration: seconds
+    :param sql_time: seconds
+    :param queries: int
+    :param size: response size in bytes, None if unknown
+    :return: None
+    """
+    method = method if method in METHODS else "other"
+    request_duration.observe(duration, route, method)
+    sql_duration.observe(sql_time, route, method)
+    sql_queries.observe(queries, route, method)
+    if size is not None:
+        response_size.observe(size, route, method)
+
+
+def render():
+    """
+    Returns all metrics in the Prometheus text format
+    :return: str
+    """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+def clear():
+    """
+    Drops all observations
+    :return: None
+    """
+    for histogram in HISTOGRAMS:
+        histogram.clear()
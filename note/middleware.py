@@ -0,0 +1,131 @@
+import asyncio
+import contextvars
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+from note import metrics
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting queries and their time
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.queries += 1
+
+
+# counter of the request being served
+# context variables follow the request to the threads sync code of async requests runs in
+current_counter = contextvars.ContextVar("current_counter", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper passing queries to the counter of the current request
+    :return: result of the query
+    """
+    counter = current_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    return counter(execute, sql, params, many, context)
+
+
+def track_queries(connection, **kwargs):
+    """
+    Adds the query recorder to the connection once
+    Connected to connection_created in NoteConfig.ready so connections of every thread are tracked
+    :param connection: DatabaseWrapper
+    :return: None
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records SQL query count, SQL time, total time and response size of every request
+    Adds them to the response as a Server-Timing header
+    and to the histograms of the url route served at /metrics
+    Turned off by NOTES_METRICS_ENABLED = False
+    Installed by request_metrics_middleware which picks the sync or async entry point
+    """
+
+    def __init__(self, get_response):
+        if not settings.NOTES_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # connections opened before the app was ready
+        for connection in connections.all():
+            track_queries(connection)
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        token = current_counter.set(counter)
+        try:
+            start = time.perf_counter()
+            response = self.get_response(request)
+            duration = time.perf_counter() - start
+        finally:
+            current_counter.reset(token)
+        return self.process_response(request, response, counter, duration)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = current_counter.set(counter)
+        try:
+            start = time.perf_counter()
+            response = await self.get_response(request)
+            duration = time.perf_counter() - start
+        finally:
+            current_counter.reset(token)
+        return self.process_response(request, response, counter, duration)
+
+    @staticmethod
+    def process_response(request, response, counter, duration):
+        """
+        Records metrics of the served request and adds the Server-Timing header
+        :param request: HttpRequest
+        :param response: HttpResponse
+        :param counter: QueryCounter of the request
+        :param duration: seconds the request took
+        :return: HttpResponse
+        """
+        match = request.resolver_match
+        route = f"/{match.route}" if match is not None else "unmatched"
+        size = None if response.streaming else len(response.content)
+        metrics.observe(route, request.method, duration, counter.duration, counter.queries, size)
+
+        response["Server-Timing"] = (
+            f'sql;dur={counter.duration * 1000:.1f};desc="{counter.queries} queries", '
+            f"app;dur={(duration - counter.duration) * 1000:.1f}, "
+            f"total;dur={duration * 1000:.1f}"
+        )
+        return response
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """
+    Middleware factory of RequestMetricsMiddleware
+    Returns a coroutine function in async middleware stacks so the handler awaits it
+    :param get_response: next middleware or view
+    :return: sync or async callable
+    """
+    middleware = RequestMetricsMiddleware(get_response)
+    if asyncio.iscoroutinefunction(get_response):
+        return middleware.__acall__
+    return middleware
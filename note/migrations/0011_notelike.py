@@ -0,0 +1,90 @@
+# Generated by Django 3.2.7 on 2026-10-17 18:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_likes(apps, schema_editor):
+    """
+    Moves space separated liked_users strings into the NoteLike table
+    Usernames that no longer exist are dropped
+    and the likes counter is recalculated from the created rows
+    """
+    Note = apps.get_model("note", "Note")
+    NoteLike = apps.get_model("note", "NoteLike")
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+
+    notes = Note.objects.exclude(liked_users__isnull=True).exclude(liked_users="").only("id", "liked_users")
+    batch = []
+    for note in notes.iterator(chunk_size=BATCH_SIZE):
+        batch.append(note)
+        if len(batch) >= BATCH_SIZE:
+            _backfill_batch(batch, Note, NoteLike, User)
+            batch = []
+    if batch:
+        _backfill_batch(batch, Note, NoteLike, User)
+
+
+def _backfill_batch(notes, Note, NoteLike, User):
+    usernames = set()
+    for note in notes:
+        usernames.update(name for name in note.liked_users.split(" ") if name)
+    user_ids = dict(User.objects.filter(username__in=usernames).values_list("username", "id"))
+
+    likes = []
+    for note in notes:
+        for name in set(note.liked_users.split(" ")):
+            if name in user_ids:
+                likes.append(NoteLike(note_id=note.id, user_id=user_ids[name]))
+    NoteLike.objects.bulk_create(likes, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+    for note in notes:
+        Note.objects.filter(id=note.id).update(likes=NoteLike.objects.filter(note_id=note.id).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('note', '0010_alter_note_date_edited'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='note',
+            name='views',
+        ),
+        migrations.AlterField(
+            model_name='note',
+            name='date_created',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='note',
+            name='likes',
+            field=models.IntegerField(blank=True, default=0),
+        ),
+        migrations.CreateModel(
+            name='NoteLike',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='like_set', to='note.note')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='note_likes', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='notelike',
+            constraint=models.UniqueConstraint(fields=('note', 'user'), name='note_like_unique_note_user'),
+        ),
+        migrations.RunPython(backfill_likes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='note',
+            name='liked_users',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.7 on 2026-10-17 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0011_notelike'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('public', True)), fields=['-likes', '-date_edited'], name='note_public_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('public', True)), fields=['-date_edited'], name='note_public_edited_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', '-favorite', '-date_edited'], name='note_user_favorite_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', '-date_edited'], name='note_user_edited_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', 'date_created'], name='note_user_created_idx'),
+        ),
+    ]
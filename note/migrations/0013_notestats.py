@@ -0,0 +1,43 @@
+# Generated by Django 3.2.7 on 2026-10-17 18:52
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def build_stats(apps, schema_editor):
+    """
+    Fills statistics of users that already have notes
+    """
+    Note = apps.get_model("note", "Note")
+    NoteStats = apps.get_model("note", "NoteStats")
+    rows = Note.objects.values("user").order_by().annotate(
+        total=Count("id"),
+        public=Count("id", filter=Q(public=True)),
+        incomplete=Count("id", filter=Q(completed=False)),
+    )
+    NoteStats.objects.bulk_create(
+        [NoteStats(user=row["user"], total_notes=row["total"],
+                   public_notes=row["public"], incomplete_notes=row["incomplete"]) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0012_note_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user', models.CharField(max_length=191, unique=True)),
+                ('total_notes', models.IntegerField(default=0)),
+                ('public_notes', models.IntegerField(default=0)),
+                ('incomplete_notes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.7 on 2026-10-17 18:56
+
+from django.db import migrations, models
+
+from note.text import make_excerpt, get_plain_text
+
+BATCH_SIZE = 500
+
+
+def fill_excerpts(apps, schema_editor):
+    """
+    Calculates excerpts of existing notes in batches
+    """
+    Note = apps.get_model("note", "Note")
+    last_pk = 0
+    while True:
+        notes = list(Note.objects.filter(pk__gt=last_pk).order_by("pk").only("id", "body")[:BATCH_SIZE])
+        if not notes:
+            break
+        for note in notes:
+            note.excerpt = make_excerpt(note.body)
+            note.text_length = len(get_plain_text(note.body))
+        Note.objects.bulk_update(notes, ["excerpt", "text_length"])
+        last_pk = notes[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0013_notestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='excerpt',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='text_length',
+            field=models.IntegerField(blank=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.7 on 2026-10-17 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0014_note_excerpt'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='note',
+            name='note_public_likes_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='note',
+            name='note_public_edited_idx',
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('public', True)), fields=['-likes', '-date_edited', '-id'], name='note_public_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('public', True)), fields=['-date_edited', '-id'], name='note_public_edited_idx'),
+        ),
+    ]
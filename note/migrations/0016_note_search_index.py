@@ -0,0 +1,49 @@
+# Generated by Django 3.2.7 on 2026-10-17 19:02
+
+from django.db import migrations
+
+from note.text import get_plain_text
+
+BATCH_SIZE = 1000
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Creates FTS5 index of note titles and bodies and fills it
+    Only SQLite databases get the index
+    """
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE note_note_fts USING fts5(name, body, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+    Note = apps.get_model("note", "Note")
+    last_pk = 0
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            notes = list(Note.objects.filter(pk__gt=last_pk).order_by("pk").only("id", "name", "body")[:BATCH_SIZE])
+            if not notes:
+                break
+            cursor.executemany(
+                "INSERT INTO note_note_fts (rowid, name, body) VALUES (%s, %s, %s)",
+                [(note.pk, note.name, get_plain_text(note.body)) for note in notes]
+            )
+            last_pk = notes[-1].pk
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS note_note_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0015_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.7 on 2026-10-17 19:13
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0016_note_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=191, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('imported', models.BigIntegerField(default=0)),
+                ('date_updated', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
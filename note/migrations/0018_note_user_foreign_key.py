@@ -0,0 +1,148 @@
+# Generated by Django 3.2.7 on 2026-10-17 20:05
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def fill_authors(apps, schema_editor):
+    """
+    Links existing notes to their authors by username in batches
+    Notes of already deleted users get an inactive account so no note is lost
+    """
+    Note = apps.get_model("note", "Note")
+    User = apps.get_model("auth", "User")
+
+    orphaned = (Note.objects.exclude(user__in=User.objects.values("username"))
+                .values_list("user", flat=True).order_by().distinct())
+    User.objects.bulk_create(
+        [User(username=username, password=make_password(None), is_active=False) for username in orphaned],
+        batch_size=BATCH_SIZE,
+    )
+
+    author = User.objects.filter(username=OuterRef("user")).values("pk")[:1]
+    last_pk = 0
+    while True:
+        pks = list(Note.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:BATCH_SIZE])
+        if not pks:
+            break
+        Note.objects.filter(pk__gt=last_pk, pk__lte=pks[-1]).update(author=Subquery(author))
+        last_pk = pks[-1]
+
+
+def fill_usernames(apps, schema_editor):
+    """
+    Copies author usernames back to the notes in batches
+    """
+    Note = apps.get_model("note", "Note")
+    User = apps.get_model("auth", "User")
+
+    username = User.objects.filter(pk=OuterRef("author")).values("username")[:1]
+    last_pk = 0
+    while True:
+        pks = list(Note.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:BATCH_SIZE])
+        if not pks:
+            break
+        Note.objects.filter(pk__gt=last_pk, pk__lte=pks[-1]).update(user=Subquery(username))
+        last_pk = pks[-1]
+
+
+def fill_stats(apps, schema_editor):
+    """
+    Fills statistics of users that already have notes
+    """
+    Note = apps.get_model("note", "Note")
+    NoteStats = apps.get_model("note", "NoteStats")
+    rows = Note.objects.values("user").order_by().annotate(
+        total=Count("id"),
+        public=Count("id", filter=Q(public=True)),
+        incomplete=Count("id", filter=Q(completed=False)),
+    )
+    NoteStats.objects.bulk_create(
+        [NoteStats(user_id=row["user"], total_notes=row["total"],
+                   public_notes=row["public"], incomplete_notes=row["incomplete"]) for row in rows],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('note', '0017_noteimport'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='note',
+            name='note_user_favorite_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='note',
+            name='note_user_edited_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='note',
+            name='note_user_created_idx',
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='author',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_authors, fill_usernames),
+        # lets the username column be added back with an empty value on rollback
+        migrations.AlterField(
+            model_name='note',
+            name='user',
+            field=models.CharField(default='', max_length=191),
+        ),
+        migrations.RemoveField(
+            model_name='note',
+            name='user',
+        ),
+        migrations.RenameField(
+            model_name='note',
+            old_name='author',
+            new_name='user',
+        ),
+        migrations.AlterField(
+            model_name='note',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='notes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', '-favorite', '-date_edited'], name='note_user_favorite_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', '-date_edited'], name='note_user_edited_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', 'date_created'], name='note_user_created_idx'),
+        ),
+        # statistics are derived data, recreated keyed by the user id
+        migrations.DeleteModel(
+            name='NoteStats',
+        ),
+        migrations.CreateModel(
+            name='NoteStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE,
+                                              related_name='note_stats', to=settings.AUTH_USER_MODEL)),
+                ('total_notes', models.IntegerField(default=0)),
+                ('public_notes', models.IntegerField(default=0)),
+                ('incomplete_notes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.7 on 2026-10-17 21:10
+
+from django.db import migrations
+
+import note.fields
+from note.fields import CompressedText
+
+BATCH_SIZE = 500
+
+
+def compress_bodies(apps, schema_editor):
+    """
+    Compresses large bodies of existing notes in batches
+    Values are compressed by the field when they are saved
+    """
+    Note = apps.get_model("note", "Note")
+    field = Note._meta.get_field("body")
+    last_pk = 0
+    while True:
+        notes = list(Note.objects.filter(pk__gt=last_pk).order_by("pk").only("id", "body")[:BATCH_SIZE])
+        if not notes:
+            break
+        large = [note for note in notes
+                 if isinstance(note.__dict__["body"], str) and len(note.body.encode()) >= field.threshold]
+        Note.objects.bulk_update(large, ["body"])
+        last_pk = notes[-1].pk
+
+
+def decompress_bodies(apps, schema_editor):
+    """
+    Writes compressed bodies back as plain text in batches
+    """
+    Note = apps.get_model("note", "Note")
+    last_pk = 0
+    while True:
+        notes = list(Note.objects.filter(pk__gt=last_pk).order_by("pk").only("id", "body")[:BATCH_SIZE])
+        if not notes:
+            break
+        rows = [(note.body, note.pk) for note in notes if isinstance(note.__dict__["body"], CompressedText)]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany("UPDATE note_note SET body = %s WHERE id = %s", rows)
+        last_pk = notes[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0018_note_user_foreign_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='note',
+            name='body',
+            field=note.fields.CompressedHTMLField(blank=True, null=True),
+        ),
+        migrations.RunPython(compress_bodies, decompress_bodies),
+    ]
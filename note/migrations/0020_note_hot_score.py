@@ -0,0 +1,50 @@
+# Generated by Django 3.2.7 on 2026-10-17 22:30
+
+import itertools
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.utils.timezone
+
+from note.hot import get_score
+
+BATCH_SIZE = 1000
+
+
+def fill_hot_scores(apps, schema_editor):
+    """
+    Calculates hot scores of liked notes from the dates of their likes
+    """
+    Note = apps.get_model("note", "Note")
+    NoteLike = apps.get_model("note", "NoteLike")
+    now = timezone.now()
+    likes = NoteLike.objects.order_by("note_id").values_list("note_id", "created").iterator()
+    notes = [Note(pk=pk, hot_score=get_score((created for _, created in rows), now), hot_date=now)
+             for pk, rows in itertools.groupby(likes, key=lambda like: like[0])]
+    Note.objects.bulk_update([note for note in notes if note.hot_score], ["hot_score", "hot_date"],
+                             batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0019_note_compressed_body'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='hot_date',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='hot_score',
+            field=models.FloatField(blank=True, default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('public', True)), fields=['-hot_score', '-date_edited', '-id'], name='note_public_hot_idx'),
+        ),
+        migrations.RunPython(fill_hot_scores, migrations.RunPython.noop),
+    ]
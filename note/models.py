@@ -1,38 +1,148 @@
-from django.db import models
+import itertools
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q, Count
 from django.utils import timezone
 from django.urls import reverse
-from tinymce.models import HTMLField
+from django.contrib.auth.models import User
+
+from note import hot, note_cache, page_cache
+from note.fields import CompressedHTMLField
+from note.text import make_excerpt, get_plain_text
 
 
 class Note(models.Model):
     """
     Note model class
     Uses tinyMCE HTML model field to enable rich text editor
+    Large bodies are stored compressed, see note.fields
     fields:
         :user: author
         :name: title
         :body: html note body for TinyMCE editor
+        :excerpt: sanitized beginning of the body shown on note cards
+        :text_length: amount of characters in the body without html
         :date_created: note creation date
         :date_edited: last time the note was edited
         :public: is a note was shared for everyone to see
         :favorite: is a note was pinned by a user
         :completed: is a note as a task was completed
-        :liked_users: string list of users that liked the note
         :likes: int to store the amount of likes
+        :hot_score: time-decayed likes for the hot ranking, see note.hot
+        :hot_date: time the hot score was decayed to
+    Users that liked the note are stored in the NoteLike table
     """
-    user = models.CharField(max_length=191)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notes")
     name = models.CharField(max_length=120)
 
     # TinyMCE field
-    body = HTMLField(null=True, blank=True)
+    body = CompressedHTMLField(null=True, blank=True)
+    # calculated on save so list pages don't have to load and truncate bodies
+    excerpt = models.TextField(default="", blank=True, editable=False)
+    text_length = models.IntegerField(default=0, blank=True, editable=False)
 
     date_edited = models.DateTimeField(blank=True, default=timezone.now)
     date_created = models.DateTimeField(blank=True, default=timezone.now)
     public = models.BooleanField(default=False, blank=True)
     favorite = models.BooleanField(default=False, blank=True)
     completed = models.BooleanField(default=False, blank=True)
-    liked_users = models.TextField(default="", blank=True, null=True)
     likes = models.IntegerField(default=0, blank=True)
+    hot_score = models.FloatField(default=0, blank=True, editable=False)
+    hot_date = models.DateTimeField(default=timezone.now, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # homepage and public notes api sorted by likes
+            # partial indexes as public=True is compiled to a bare "WHERE public" condition
+            # id ends both indexes to match the keyset pagination ordering
+            models.Index(fields=["-likes", "-date_edited", "-id"], name="note_public_likes_idx",
+                         condition=Q(public=True)),
+            # homepage and public notes api sorted by date
+            models.Index(fields=["-date_edited", "-id"], name="note_public_edited_idx", condition=Q(public=True)),
+            # homepage and public notes api sorted by hot score
+            models.Index(fields=["-hot_score", "-date_edited", "-id"], name="note_public_hot_idx",
+                         condition=Q(public=True)),
+            # personal notes list
+            models.Index(fields=["user", "-favorite", "-date_edited"], name="note_user_favorite_idx"),
+            # private notes api
+            models.Index(fields=["user", "-date_edited"], name="note_user_edited_idx"),
+            # profile activity stats
+            models.Index(fields=["user", "date_created"], name="note_user_created_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers values loaded from the database
+        so signal handlers can tell what was changed on save
+        :param db:
+        :param field_names:
+        :param values:
+        :return:
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Save Override method
+        Saves the note in a transaction so the data updated by post_save handlers
+        (such as the author's NoteStats) is committed together with the note
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        self.update_excerpt(kwargs.get("update_fields"))
+        if kwargs.get("update_fields") is not None and "body" in kwargs["update_fields"]:
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"excerpt", "text_length"}
+
+        with transaction.atomic():
+            if self.pk is not None and not hasattr(self, "_loaded_values"):
+                # the note was not loaded from the database, previous values are unknown
+                self._loaded_values = Note.objects.filter(pk=self.pk).values(
+                    "user_id", "public", "completed"
+                ).first()
+            super().save(*args, **kwargs)
+            self._loaded_values = {field.attname: self.__dict__[field.attname]
+                                   for field in self._meta.concrete_fields
+                                   if field.attname in self.__dict__}
+
+    def update_excerpt(self, update_fields=None):
+        """
+        Recalculates excerpt and text length from the body
+        Skipped if the body is not loaded, not saved or not changed
+        :param update_fields: fields passed to save
+        :return: None
+        """
+        if "body" in self.get_deferred_fields():
+            return
+        if update_fields is not None and "body" not in update_fields:
+            return
+        if not self.body_changed() and (self.excerpt or not self.body):
+            return
+        self.excerpt = make_excerpt(self.body)
+        self.text_length = len(get_plain_text(self.body))
+
+    def body_changed(self):
+        """
+        Returns whether the body was changed since it was loaded
+        A compressed body that was not set again is not decompressed
+        :return: bool
+        """
+        if "body" in self.get_deferred_fields():
+            return False
+        loaded = self.get_loaded_value("body")
+        return self.__dict__["body"] is not loaded and loaded != self.body
+
+    def get_loaded_value(self, name, default=None):
+        """
+        Returns value of the field as it was loaded from the database
+        :param name: field name
+        :param default: returned if the note was not saved yet
+        :return:
+        """
+        return (getattr(self, "_loaded_values", None) or {}).get(name, default)
 
     @property
     def get_absolute_url(self):
@@ -52,43 +162,283 @@ class Note(models.Model):
 
     def change_like_user(self, user):
         """
-        Changes list of users liked a note
-        Not all sql databases support array storage so stores as a string of users
-        :param user: str
-        :return: None
+        Toggles a like of the note by the user
+        If user already liked the note, removes the like
+        and vise-versa
+        Runs in a single transaction and touches only the like columns
+        so concurrent likes never overwrite each other or the note body
+        The hot score is decayed to the current time and gets or loses the weight of the like
+        :param user: User
+        :return: bool whether the note is liked after the toggle
         """
-        # gets list of users by splitting a string by a space
-        # no spaces allowed in username so it's fine
-        liked_users_list = self.liked_users.split(" ")
-        # if user already liked the note, removes the like
-        if user in liked_users_list:
-            liked_users_list.remove(user)
-        # and vise-versa
-        else:
-            liked_users_list.append(user)
-        # joins the string
-        self.liked_users = " ".join(liked_users_list).strip()
-        # saves the record
-        self.likes = self.count_likes()
+        with transaction.atomic():
+            # the note row is written first so concurrent toggles of the note wait for this transaction
+            # before reading the like, select_for_update doesn't lock anything on SQLite
+            Note.objects.filter(pk=self.pk).update(likes=F("likes"))
+            # weight of a removed like depends on when it was given
+            like_date = NoteLike.objects.filter(note_id=self.pk, user=user).values_list("created", flat=True).first()
+            if like_date is not None:
+                NoteLike.objects.filter(note_id=self.pk, user=user).delete()
+                delta = -1
+            else:
+                NoteLike.objects.create(note_id=self.pk, user=user)
+                delta = 1
+            now = timezone.now()
+            score, hot_date = Note.objects.filter(pk=self.pk).values_list("hot_score", "hot_date").get()
+            score = hot.decay(score, hot_date, now)
+            if delta > 0:
+                score += 1
+            else:
+                score = max(score - hot.get_factor(like_date, now), 0.0)
+            Note.objects.filter(pk=self.pk).update(likes=F("likes") + delta, hot_score=score, hot_date=now)
+            note_cache.invalidate([self.pk])
+            # like counts are shown on cached homepage pages
+            if self.public:
+                page_cache.invalidate()
+        self.likes += delta
+        return delta >= 0
 
     def get_user_liked(self, user):
         """
         Returns whether the user liked the note
-        :param user: string
+        :param user: User
         :return: bool
         """
-        liked_users_list = self.liked_users.split(" ")
-        if user in liked_users_list:
-            return True
-        else:
+        if not user.is_authenticated:
             return False
+        return NoteLike.objects.filter(note=self, user=user).exists()
 
     def count_likes(self):
         """
-        Counts how many likes the note has
+        Returns how many likes the note has
         :return:
         """
-        if self.liked_users:
-            return self.liked_users.count(" ") + 1
-        else:
+        return self.likes
+
+    @classmethod
+    def decay_hot_scores(cls, now=None):
+        """
+        Decays hot scores of all notes to the current time
+        A single UPDATE multiplies every score by the factor of its own hot_date,
+        a second one drops scores below MIN_SCORE
+        :param now: datetime to decay the scores to, the current time by default
+        :return: amount of decayed notes
+        """
+        now = now or timezone.now()
+        with transaction.atomic():
+            decayed = cls.objects.filter(hot_score__gt=0, hot_date__lt=now).update(
+                hot_score=F("hot_score") * hot.get_factor_expression(now), hot_date=now
+            )
+            cls.objects.filter(hot_score__gt=0, hot_score__lt=hot.MIN_SCORE).update(hot_score=0)
+            # the hot ordering of cached homepage pages changed
+            if decayed:
+                page_cache.invalidate()
+        return decayed
+
+    @classmethod
+    def rebuild_hot_scores(cls, now=None, batch_size=1000):
+        """
+        Recalculates hot scores from the dates of likes
+        :param now: datetime to calculate the scores for, the current time by default
+        :param batch_size: amount of notes updated at once
+        :return: amount of notes with a hot score
+        """
+        now = now or timezone.now()
+        likes = NoteLike.objects.order_by("note_id").values_list("note_id", "created").iterator()
+        notes = [cls(pk=pk, hot_score=hot.get_score((created for _, created in rows), now), hot_date=now)
+                 for pk, rows in itertools.groupby(likes, key=lambda like: like[0])]
+        notes = [note for note in notes if note.hot_score]
+        with transaction.atomic():
+            cls.objects.filter(hot_score__gt=0).update(hot_score=0, hot_date=now)
+            cls.objects.bulk_update(notes, ["hot_score", "hot_date"], batch_size=batch_size)
+            page_cache.invalidate()
+        return len(notes)
+
+    @staticmethod
+    def get_liked_ids(user, notes):
+        """
+        Returns ids of the notes liked by the user
+        Uses a single query for the whole list of notes
+        :param user: User
+        :param notes: iterable of Note
+        :return: set
+        """
+        if not user.is_authenticated:
+            return set()
+        return set(
+            NoteLike.objects.filter(user=user, note__in=[note.pk for note in notes])
+            .values_list("note_id", flat=True)
+        )
+
+
+class NoteLike(models.Model):
+    """
+    Like model class
+    Stores a single like of a note by a user
+    A user can like a note only once
+    fields:
+        :note: liked note
+        :user: user that liked the note
+        :created: when the note was liked
+    """
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name="like_set")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="note_likes")
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["note", "user"], name="note_like_unique_note_user"),
+        ]
+
+
+class NoteStats(models.Model):
+    """
+    Note statistics model class
+    Stores per user note counters so pages don't have to count the notes
+    Updated in the same transaction as note create, update and delete
+    Can be recalculated with the rebuild_note_stats command
+    fields:
+        :user: author
+        :total_notes: amount of notes created by the user
+        :public_notes: amount of shared notes
+        :incomplete_notes: amount of not completed notes
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="note_stats")
+    total_notes = models.IntegerField(default=0)
+    public_notes = models.IntegerField(default=0)
+    incomplete_notes = models.IntegerField(default=0)
+
+    @property
+    def task_completion(self):
+        """
+        Returns notes completion percentage
+        :return: int
+        """
+        if not self.total_notes:
             return 0
+        return 100 - int((self.incomplete_notes / self.total_notes) * 100)
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Returns statistics of the user
+        Users without notes get an unsaved empty record
+        :param user: User
+        :return: NoteStats
+        """
+        stats = cls.objects.filter(user=user).first()
+        return stats or cls(user=user)
+
+    @staticmethod
+    def get_note_values(public, completed):
+        """
+        Returns what a single note adds to the statistics
+        :param public:
+        :param completed:
+        :return: dict of deltas
+        """
+        return {"total_notes": 1, "public_notes": int(bool(public)), "incomplete_notes": int(not completed)}
+
+    @classmethod
+    def apply(cls, user_id, sign=1, **deltas):
+        """
+        Adds deltas to the user statistics with a single UPDATE
+        Creates the record if the user has none yet
+        :param user_id: id of the author
+        :param sign: 1 to add, -1 to subtract
+        :param deltas: field name to delta mapping
+        :return: None
+        """
+        deltas = {name: sign * value for name, value in deltas.items() if value}
+        if not deltas:
+            return
+        updates = {name: F(name) + value for name, value in deltas.items()}
+        if cls.objects.filter(user_id=user_id).update(**updates):
+            return
+        if sign < 0:
+            # notes of a deleted user, the record is deleted together with the user
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=user_id, **deltas)
+        except IntegrityError:
+            # created by a concurrent transaction in the meantime
+            cls.objects.filter(user_id=user_id).update(**updates)
+
+    @classmethod
+    def note_saved(cls, note, created):
+        """
+        Updates statistics after a note was saved
+        Only the difference between the loaded and the saved note is applied
+        :param note: Note
+        :param created: bool
+        :return: None
+        """
+        new_values = cls.get_note_values(note.public, note.completed)
+        if created:
+            cls.apply(note.user_id, **new_values)
+            return
+
+        old_user = note.get_loaded_value("user_id", note.user_id)
+        old_values = cls.get_note_values(
+            note.get_loaded_value("public", note.public),
+            note.get_loaded_value("completed", note.completed),
+        )
+        if old_user != note.user_id:
+            cls.apply(old_user, sign=-1, **old_values)
+            cls.apply(note.user_id, **new_values)
+        else:
+            cls.apply(old_user, **{name: new_values[name] - old_values[name] for name in new_values})
+
+    @classmethod
+    def note_deleted(cls, note):
+        """
+        Updates statistics after a note was deleted
+        :param note: Note
+        :return: None
+        """
+        cls.apply(note.user_id, sign=-1, **cls.get_note_values(note.public, note.completed))
+
+    @classmethod
+    def rebuild(cls, users=None):
+        """
+        Recalculates statistics from the notes table
+        :param users: list of users or user ids, all users if not provided
+        :return: amount of rebuilt records
+        """
+        notes = Note.objects.all()
+        records = cls.objects.all()
+        if users is not None:
+            notes = notes.filter(user__in=users)
+            records = records.filter(user__in=users)
+
+        rows = notes.values("user").order_by().annotate(
+            total=Count("id"),
+            public=Count("id", filter=Q(public=True)),
+            incomplete=Count("id", filter=Q(completed=False)),
+        )
+        with transaction.atomic():
+            records.delete()
+            cls.objects.bulk_create(
+                [cls(user_id=row["user"], total_notes=row["total"],
+                     public_notes=row["public"], incomplete_notes=row["incomplete"]) for row in rows],
+                batch_size=1000,
+            )
+        return len(rows)
+
+
+class NoteImport(models.Model):
+    """
+    Note import checkpoint model class
+    Stores how far an import_notes run got so an interrupted import can be resumed
+    Updated in the same transaction as every imported batch
+    fields:
+        :name: import name, the source file name by default
+        :position: amount of processed input records
+        :imported: amount of created notes
+        :date_updated: when the last batch was imported
+    """
+    name = models.CharField(max_length=191, unique=True)
+    position = models.BigIntegerField(default=0)
+    imported = models.BigIntegerField(default=0)
+    date_updated = models.DateTimeField(default=timezone.now)
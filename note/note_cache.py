@@ -0,0 +1,136 @@
+"""
+Note object cache for single note reads
+Notes are loaded with their authors and cached by id and version in two tiers:
+a bounded in-process LRU in front of the shared Django cache
+The version of a note is kept in the Django cache, it is replaced once a transaction that saves,
+deletes or likes the note is committed
+Every read looks the version up in the Django cache first, in-process entries are keyed by it,
+so they are only trusted while their version is current, the LRU saves unpickling the note
+Entries of all processes are dropped at once only if they share the Django cache,
+so the cache is turned off unless NOTES_SHARED_CACHE is set
+Access checks are up to the callers, private notes are cached too
+Author names may lag behind by up to NOTES_NOTE_CACHE_TIMEOUT seconds
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = "note:"
+
+# amount of notes kept in the memory of a process
+LRU_SIZE = 256
+
+_notes = OrderedDict()
+_lock = threading.Lock()
+
+
+def is_enabled():
+    """
+    Returns whether notes are cached
+    Setting NOTES_NOTE_CACHE_TIMEOUT to 0 or a process-local cache (NOTES_SHARED_CACHE unset) turns the cache off
+    :return: bool
+    """
+    return bool(settings.NOTES_NOTE_CACHE_TIMEOUT) and settings.NOTES_SHARED_CACHE
+
+
+def get_version_key(pk):
+    """
+    Returns cache key of the note version
+    :param pk: note id
+    :return: str
+    """
+    return f"{KEY_PREFIX}{pk}:version"
+
+
+def get_version(pk):
+    """
+    Returns the current version of the cached note
+    A missing version starts from the current time so it never repeats an evicted one
+    :param pk: note id
+    :return: int
+    """
+    key = get_version_key(pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=settings.NOTES_NOTE_CACHE_TIMEOUT)
+        version = cache.get(key, time.time_ns())
+    return version
+
+
+def load(pk):
+    """
+    Loads the note with its author from the database
+    The model is looked up as Note.change_like_user invalidates this cache
+    :param pk: note id
+    :return: Note or None
+    """
+    return apps.get_model("note", "Note").objects.select_related("user").filter(pk=pk).first()
+
+
+def remember(key, note):
+    """
+    Keeps the note in the process memory, drops the least recently used ones
+    :param key: cache key
+    :param note: Note
+    :return: None
+    """
+    with _lock:
+        _notes[key] = note
+        _notes.move_to_end(key)
+        while len(_notes) > LRU_SIZE:
+            _notes.popitem(last=False)
+
+
+def get(pk):
+    """
+    Returns the note with its author
+    Callers get their own copy of the cached note
+    :param pk: note id
+    :return: Note or None if it doesn't exist
+    """
+    if not is_enabled():
+        return load(pk)
+    key = f"{KEY_PREFIX}{pk}:{get_version(pk)}"
+    with _lock:
+        note = _notes.get(key)
+        if note is not None:
+            _notes.move_to_end(key)
+    if note is None:
+        note = cache.get(key)
+        if note is None:
+            note = load(pk)
+            if note is None:
+                return None
+            cache.set(key, note, timeout=settings.NOTES_NOTE_CACHE_TIMEOUT)
+        remember(key, note)
+    return copy.copy(note)
+
+
+def clear():
+    """
+    Empties the in-process tier
+    :return: None
+    """
+    with _lock:
+        _notes.clear()
+
+
+def invalidate(pks):
+    """
+    Drops cached notes once the current transaction is committed
+    :param pks: iterable of note ids
+    :return: None
+    """
+    keys = [get_version_key(pk) for pk in pks]
+
+    def apply():
+        version = time.time_ns()
+        cache.set_many({key: version for key in keys}, timeout=settings.NOTES_NOTE_CACHE_TIMEOUT)
+
+    transaction.on_commit(apply)
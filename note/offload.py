@@ -0,0 +1,79 @@
+"""
+Bounded thread pool for database work of async views
+Async views await synchronous code run in a pool of NOTES_ASYNC_DB_THREADS threads
+instead of blocking the event loop, so the amount of threads and database connections
+of a process stays fixed however many client connections are open
+Synchronous views are only turned into async ones under ASGI, see NOTES_ASYNC_VIEWS
+"""
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the thread pool, creates it on the first call
+    :return: ThreadPoolExecutor
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.NOTES_ASYNC_DB_THREADS,
+                                           thread_name_prefix="notes-db")
+    return _executor
+
+
+def call(func, *args, **kwargs):
+    """
+    Calls the function in a pool thread
+    Connections of the thread are closed or kept around the call
+    the same way Django does it around a request, following CONN_MAX_AGE
+    :param func: callable
+    :return: result of the function
+    """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run(func, *args, **kwargs):
+    """
+    Runs the synchronous function in the pool and waits for the result
+    :param func: callable
+    :return: result of the function
+    """
+    return await sync_to_async(call, thread_sensitive=False, executor=get_executor())(func, *args, **kwargs)
+
+
+def async_view(view):
+    """
+    Returns an async version of a synchronous view
+    The view is called and its response is rendered in the pool
+    Returns the view itself unless NOTES_ASYNC_VIEWS is on
+    :param view: view function, e.g. APIView.as_view()
+    :return: view function
+    """
+    if not settings.NOTES_ASYNC_VIEWS:
+        return view
+
+    def render(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, "render", None)):
+            response.render()
+        return response
+
+    # keeps attributes such as csrf_exempt
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(render, request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,103 @@
+"""
+Homepage response cache
+Rendered first homepage pages are cached for anonymous visitors per sort order,
+pages following a cursor are not cached as any crafted cursor would get an entry of its own
+Every cache key contains a version number, any committed change visible on the homepage
+(a public note created, edited, deleted, liked or made private) bumps the version
+so all cached pages are dropped at once
+Pages also show site-wide counters, they may lag behind by up to NOTES_HOMEPAGE_CACHE_TIMEOUT seconds
+Version bumps only reach processes sharing the Django cache, so pages are not cached unless NOTES_SHARED_CACHE is set
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = "homepage:"
+VERSION_KEY = f"{KEY_PREFIX}version"
+
+
+def is_enabled():
+    """
+    Returns whether pages are cached
+    Setting NOTES_HOMEPAGE_CACHE_TIMEOUT to 0 or a process-local cache (NOTES_SHARED_CACHE unset) turns the cache off
+    :return: bool
+    """
+    return bool(settings.NOTES_HOMEPAGE_CACHE_TIMEOUT) and settings.NOTES_SHARED_CACHE
+
+
+def get_version():
+    """
+    Returns the current version of cached pages
+    A missing version starts from the current time so it never repeats an evicted one
+    :return: int
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_key(sort):
+    """
+    Returns cache key of the first homepage page
+    :param sort: sort order name
+    :return: str
+    """
+    return f"{KEY_PREFIX}{get_version()}:{sort}"
+
+
+def get(key):
+    """
+    Returns the cached response or None
+    :param key: str
+    :return: HttpResponse or None
+    """
+    return cache.get(key)
+
+
+def store(key, response):
+    """
+    Caches the rendered response
+    :param key: str
+    :param response: rendered HttpResponse
+    :return: None
+    """
+    cache.set(key, response, timeout=settings.NOTES_HOMEPAGE_CACHE_TIMEOUT)
+
+
+def invalidate():
+    """
+    Drops all cached pages once the current transaction is committed
+    :return: None
+    """
+    def apply():
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            pass
+
+    transaction.on_commit(apply)
+
+
+def note_saved(note, created):
+    """
+    Drops cached pages if the note is or was public
+    :param note: Note
+    :param created: bool
+    :return: None
+    """
+    if note.public or (not created and note.get_loaded_value("public", False)):
+        invalidate()
+
+
+def note_deleted(note):
+    """
+    Drops cached pages if the deleted note was public
+    :param note: Note
+    :return: None
+    """
+    if note.public:
+        invalidate()
@@ -0,0 +1,155 @@
+"""
+Keyset (cursor) pagination
+Pages are selected by comparing sort keys with the position of the last shown row
+instead of OFFSET, so deep pages cost the same as the first one
+and entries don't shift between pages when likes change
+Positions are passed around as opaque url safe cursors
+"""
+import base64
+import json
+
+from django.db.models import BooleanField, F, Func, Value
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor can't be decoded or doesn't match the ordering
+    """
+
+
+class RowValueCompare(Func):
+    """
+    Compares a tuple of columns with a tuple of values:
+        ("likes", "date_edited", "id") < (%s, %s, %s)
+    Unlike nested OR conditions the row value comparison lets the database
+    seek straight to the position in an index matching the ordering
+    """
+    output_field = BooleanField()
+
+    def __init__(self, fields, values, operator):
+        self.operator = operator
+        self.size = len(fields)
+        super().__init__(*[F(field) for field in fields], *[Value(value) for value in values])
+
+    def as_sql(self, compiler, connection, **extra_context):
+        parts, params = [], []
+        for expression in self.source_expressions:
+            sql, expression_params = compiler.compile(expression)
+            parts.append(sql)
+            params.extend(expression_params)
+        lhs = ", ".join(parts[:self.size])
+        rhs = ", ".join(parts[self.size:])
+        return f"({lhs}) {self.operator} ({rhs})", params
+
+
+class KeysetPage:
+    """
+    Single page of keyset paginated results
+    Provides next and previous cursors instead of page numbers
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginates an ordered queryset by its ordering fields
+    All ordering fields must have the same direction and end with a unique field
+    e.g. ("-likes", "-date_edited", "-id")
+    Ordering has to be backed by a matching index to make the pagination cheap
+    """
+
+    def __init__(self, queryset, page_size):
+        self.queryset = queryset
+        self.page_size = page_size
+        ordering = [str(field) for field in queryset.query.order_by]
+        if not ordering or len({field.startswith("-") for field in ordering}) != 1:
+            raise ValueError("Keyset pagination requires ordering fields of the same direction")
+        self.descending = ordering[0].startswith("-")
+        self.fields = [field.lstrip("-") for field in ordering]
+
+    def encode_cursor(self, obj, reverse=False):
+        """
+        Returns cursor pointing at the position of the object
+        :param obj: model instance
+        :param reverse: whether the cursor selects rows before the position
+        :return: str
+        """
+        position = []
+        for name in self.fields:
+            value = getattr(obj, name)
+            position.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        data = json.dumps({"p": position, "r": int(reverse)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """
+        Returns position and direction stored in the cursor
+        :param cursor: str
+        :return: (list of values, bool reverse)
+        """
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            position, reverse = data["p"], bool(data["r"])
+            if len(position) != len(self.fields):
+                raise InvalidCursor("Cursor doesn't match the ordering")
+            model = self.queryset.model
+            return [model._meta.get_field(name).to_python(value)
+                    for name, value in zip(self.fields, position)], reverse
+        except InvalidCursor:
+            raise
+        except Exception:
+            raise InvalidCursor("Invalid cursor")
+
+    def get_page(self, cursor=None):
+        """
+        Returns the page following (or preceding) the cursor position
+        Fetches a single extra row to find out if there are more pages
+        :param cursor: str or None for the first page
+        :return: KeysetPage
+        """
+        queryset = self.queryset
+        reverse = False
+        if cursor:
+            position, reverse = self.decode_cursor(cursor)
+            # rows after the position in the ordering direction (or before if reversed)
+            operator = "<" if self.descending != reverse else ">"
+            queryset = queryset.filter(RowValueCompare(self.fields, position, operator))
+        if reverse:
+            queryset = queryset.reverse()
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows)
+
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else bool(cursor)
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], reverse=True) if has_previous else None,
+        )
@@ -0,0 +1,116 @@
+"""
+Html sanitizer for note bodies
+All write paths (api create and update, bulk api, note edit form) clean bodies here
+The allow-lists cover what the TinyMCE editor produces, other tags are escaped
+Cleaners are built once per thread as bleach cleaners are not thread-safe
+Recently cleaned bodies are remembered by their content hash,
+so an unchanged body (or an already cleaned one) is not parsed again
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from bleach.sanitizer import Cleaner, ALLOWED_PROTOCOLS, ALLOWED_TAGS
+
+TAGS = ALLOWED_TAGS + [
+    "p", "br", "hr", "span", "div", "pre", "u", "s", "sub", "sup",
+    "h1", "h2", "h3", "h4", "h5", "h6",
+    "img", "table", "caption", "thead", "tbody", "tfoot", "tr", "th", "td",
+]
+
+ATTRIBUTES = {
+    "*": ["style"],
+    "a": ["href", "title", "target", "rel"],
+    "abbr": ["title"],
+    "acronym": ["title"],
+    "img": ["src", "alt", "title", "width", "height"],
+    "table": ["border", "cellpadding", "cellspacing"],
+    "td": ["colspan", "rowspan"],
+    "th": ["colspan", "rowspan", "scope"],
+}
+
+STYLES = [
+    "text-align", "text-decoration", "padding-left", "color", "background-color",
+    "width", "height", "border", "border-collapse", "border-width", "border-style", "border-color",
+    "float", "margin-left", "margin-right", "vertical-align",
+]
+
+# amount of remembered bodies
+MEMO_SIZE = 128
+
+_local = threading.local()
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def get_cleaner():
+    """
+    Returns the cleaner of the current thread
+    :return: Cleaner
+    """
+    cleaner = getattr(_local, "cleaner", None)
+    if cleaner is None:
+        cleaner = _local.cleaner = Cleaner(
+            tags=TAGS,
+            attributes=ATTRIBUTES,
+            styles=STYLES,
+            protocols=ALLOWED_PROTOCOLS,
+            strip=False,
+            strip_comments=True,
+        )
+    return cleaner
+
+
+def get_hash(body):
+    """
+    Returns content hash of the body
+    :param body: str
+    :return: bytes
+    """
+    return hashlib.blake2b(body.encode(), digest_size=16).digest()
+
+
+def remember(key, cleaned):
+    """
+    Stores the cleaned body for the content hash, drops the least recently used ones
+    :param key: content hash
+    :param cleaned: str
+    :return: None
+    """
+    with _memo_lock:
+        _memo[key] = cleaned
+        _memo.move_to_end(key)
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
+def sanitize(body):
+    """
+    Returns the sanitized html body
+    :param body: html
+    :return: str
+    """
+    if not body:
+        return body
+    key = get_hash(body)
+    with _memo_lock:
+        cleaned = _memo.get(key)
+        if cleaned is not None:
+            _memo.move_to_end(key)
+            return cleaned
+
+    cleaned = get_cleaner().clean(body)
+    remember(key, cleaned)
+    if cleaned != body:
+        # cleaned bodies come back on later edits of the note
+        remember(get_hash(cleaned), cleaned)
+    return cleaned
+
+
+def clear():
+    """
+    Forgets remembered bodies
+    :return: None
+    """
+    with _memo_lock:
+        _memo.clear()
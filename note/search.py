@@ -0,0 +1,233 @@
+"""
+Full-text search over notes
+Titles and plain text of note bodies are indexed in the note_note_fts SQLite FTS5 table,
+rowid of an index row is the note id
+Rows are kept in sync by signal handlers in the same transaction as note save and delete
+Results are ranked by bm25 with titles weighted above bodies
+Other databases fall back to a simple containment search
+"""
+import copy
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from note.models import Note
+from note.text import get_plain_text
+
+FTS_TABLE = "note_note_fts"
+
+# bm25 weights of the name and body columns
+NAME_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+WORD = re.compile(r"\w+")
+
+
+def is_supported():
+    """
+    Returns whether the database has the FTS5 index
+    :return: bool
+    """
+    return connection.vendor == "sqlite"
+
+
+def build_match_query(text):
+    """
+    Turns user input into an FTS5 query
+    Every word is quoted so the input can't use FTS5 syntax
+    The last word is matched as a prefix to support incomplete input
+    :param text: str
+    :return: str or None if there is nothing to search for
+    """
+    words = WORD.findall(text or "")
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def index_notes(notes):
+    """
+    Adds or replaces index rows of the notes
+    :param notes: iterable of Note
+    :return: None
+    """
+    if not is_supported():
+        return
+    index_rows([(note.pk, note.name, get_plain_text(note.body)) for note in notes])
+
+
+def index_rows(rows, replace=True):
+    """
+    Adds index rows
+    :param rows: list of (note id, name, plain text of the body)
+    :param replace: remove existing rows of the notes first, not needed for new notes
+    :return: None
+    """
+    if not is_supported() or not rows:
+        return
+    with connection.cursor() as cursor:
+        if replace:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, name, body) VALUES (%s, %s, %s)", rows)
+
+
+def unindex_notes(ids):
+    """
+    Removes index rows of the notes
+    :param ids: iterable of note ids
+    :return: None
+    """
+    ids = [(pk,) for pk in ids]
+    if not is_supported() or not ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", ids)
+
+
+def note_saved(note, created):
+    """
+    Reindexes a saved note if its title or body was changed
+    :param note: Note
+    :param created: bool
+    :return: None
+    """
+    if not created:
+        name_changed = note.get_loaded_value("name") != note.name
+        if not name_changed and not note.body_changed():
+            return
+    index_notes([note])
+
+
+def rebuild(batch_size=1000):
+    """
+    Recreates the whole index from the notes table
+    :param batch_size: amount of notes loaded at once
+    :return: amount of indexed notes
+    """
+    if not is_supported():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    indexed = 0
+    last_pk = 0
+    while True:
+        notes = list(Note.objects.filter(pk__gt=last_pk).order_by("pk").only("id", "name", "body")[:batch_size])
+        if not notes:
+            break
+        index_notes(notes)
+        indexed += len(notes)
+        last_pk = notes[-1].pk
+    return indexed
+
+
+class SearchResults:
+    """
+    Lazy ranked search results
+    Works with Django and DRF paginators:
+    count() and slicing run a query each, only a single page of notes is loaded
+    """
+    model = Note
+    ordered = True
+
+    def __init__(self, text, user=None, include_public=True, queryset=None):
+        """
+        :param text: user input
+        :param user: also search private notes of this user
+        :param include_public: search public notes of all users
+        :param queryset: base queryset to load found notes, e.g. with deferred fields
+        """
+        self.match = build_match_query(text)
+        self.user = user if user is not None and user.is_authenticated else None
+        self.include_public = include_public
+        self.queryset = queryset if queryset is not None else Note.objects.all()
+        self._count = None
+
+    def clone(self, queryset):
+        """
+        Returns the same search loading found notes with another queryset
+        :param queryset: QuerySet
+        :return: SearchResults
+        """
+        results = copy.copy(self)
+        results.queryset = queryset
+        return results
+
+    def only(self, *fields):
+        return self.clone(self.queryset.only(*fields))
+
+    def select_related(self, *fields):
+        return self.clone(self.queryset.select_related(*fields))
+
+    def get_visibility(self, alias):
+        """
+        Returns sql condition and params limiting results to visible notes
+        :param alias: notes table alias
+        :return: (sql, params)
+        """
+        if self.include_public and self.user:
+            return f"({alias}.public OR {alias}.user_id = %s)", [self.user.pk]
+        if self.user:
+            return f"{alias}.user_id = %s", [self.user.pk]
+        if self.include_public:
+            return f"{alias}.public", []
+        return "0", []
+
+    def get_fallback_queryset(self):
+        """
+        Search used by databases without FTS5
+        :return: QuerySet
+        """
+        queryset = self.queryset
+        visibility = Q(pk__in=[])
+        if self.include_public:
+            visibility |= Q(public=True)
+        if self.user:
+            visibility |= Q(user=self.user)
+        for word in WORD.findall(self.match or ""):
+            queryset = queryset.filter(Q(name__icontains=word) | Q(body__icontains=word))
+        return queryset.filter(visibility).order_by("-date_edited", "-id")
+
+    def count(self):
+        if self.match is None:
+            return 0
+        if self._count is None:
+            if not is_supported():
+                self._count = self.get_fallback_queryset().count()
+            else:
+                visibility, params = self.get_visibility("n")
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT COUNT(*) FROM {FTS_TABLE} f JOIN note_note n ON n.id = f.rowid "
+                        f"WHERE {FTS_TABLE} MATCH %s AND {visibility}",
+                        [self.match, *params]
+                    )
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        if self.match is None:
+            return []
+        if not is_supported():
+            return list(self.get_fallback_queryset()[item])
+
+        start = item.start or 0
+        limit = -1 if item.stop is None else max(item.stop - start, 0)
+        visibility, params = self.get_visibility("n")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT f.rowid FROM {FTS_TABLE} f JOIN note_note n ON n.id = f.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s AND {visibility} "
+                f"ORDER BY bm25({FTS_TABLE}, %s, %s), f.rowid DESC LIMIT %s OFFSET %s",
+                [self.match, *params, NAME_WEIGHT, BODY_WEIGHT, limit, start]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        notes = self.queryset.in_bulk(ids)
+        return [notes[pk] for pk in ids if pk in notes]
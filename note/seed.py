@@ -0,0 +1,92 @@
+"""
+Generators of realistic test data
+Bodies look like the html the TinyMCE editor produces,
+likes and note authors follow long-tailed distributions
+"""
+import math
+
+WORDS = ("note", "task", "meeting", "project", "deadline", "review", "draft", "idea", "budget", "report",
+         "client", "release", "bug", "design", "plan", "summary", "agenda", "follow", "update", "list")
+
+
+def make_words(rng, count):
+    """
+    Returns random words
+    :param rng: Random
+    :param count: int
+    :return: str
+    """
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def make_block(rng):
+    """
+    Returns a random block of html the way the TinyMCE editor formats it
+    :param rng: Random
+    :return: str
+    """
+    kind = rng.randrange(6)
+    if kind == 0:
+        level = rng.randint(1, 3)
+        return f"<h{level}>{make_words(rng, 4).title()}</h{level}>"
+    if kind == 1:
+        items = "".join(f"<li>{make_words(rng, 8)}</li>" for _ in range(rng.randint(3, 8)))
+        return f"<ul>{items}</ul>" if rng.random() < 0.5 else f"<ol>{items}</ol>"
+    if kind == 2:
+        cells = "".join(f"<td style=\"width: 25%;\">{make_words(rng, 3)}</td>" for _ in range(4))
+        rows = "".join(f"<tr>{cells}</tr>" for _ in range(rng.randint(2, 6)))
+        return f"<table style=\"border-collapse: collapse; width: 100%;\" border=\"1\"><tbody>{rows}</tbody></table>"
+    if kind == 3:
+        return (f"<p style=\"text-align: center;\"><img src=\"https://example.com/{rng.randrange(1000)}.png\" "
+                f"alt=\"{make_words(rng, 2)}\" width=\"400\" height=\"300\" /></p>")
+    return (f"<p style=\"padding-left: 40px;\">{make_words(rng, 20)} <strong>{make_words(rng, 3)}</strong> "
+            f"<span style=\"background-color: #fbeeb8;\">{make_words(rng, 5)}</span> "
+            f"<a href=\"https://example.com/{rng.randrange(1000)}\" target=\"_blank\" rel=\"noopener\">"
+            f"{make_words(rng, 2)}</a> <em>{make_words(rng, 10)}</em><br />{make_words(rng, 15)}</p>")
+
+
+def make_body(rng, size):
+    """
+    Returns a TinyMCE like html body of at least size characters
+    :param rng: Random
+    :param size: int
+    :return: str
+    """
+    blocks = []
+    length = 0
+    while length < size:
+        blocks.append(make_block(rng))
+        length += len(blocks[-1])
+    return "\n".join(blocks)
+
+
+def make_body_size(rng, median):
+    """
+    Returns a random body size from a log-normal distribution
+    Most bodies are close to the median, a few are much larger
+    :param rng: Random
+    :param median: int
+    :return: int
+    """
+    return max(1, int(rng.lognormvariate(math.log(median), 1.0)))
+
+
+def make_likes(rng, alpha, limit):
+    """
+    Returns a random amount of likes from a Pareto distribution
+    Most notes have no likes, a few popular ones have most of them
+    :param rng: Random
+    :param alpha: shape, smaller values give more popular notes
+    :param limit: maximum amount of likes
+    :return: int
+    """
+    return min(limit, int(rng.paretovariate(alpha)) - 1)
+
+
+def make_weights(count):
+    """
+    Returns Zipf weights so that a few authors write most notes
+    :param count: amount of authors
+    :return: list of float
+    """
+    return [1 / (rank + 1) for rank in range(count)]
@@ -0,0 +1,86 @@
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from note import activity, counters, note_cache, page_cache, search
+from note.models import Note, NoteStats
+
+
+_state = threading.local()
+
+
+@contextmanager
+def muted():
+    """
+    Skips note signal handlers in the current thread
+    Used by bulk operations that update statistics, counters and the search index once per batch
+    """
+    previous = getattr(_state, "muted", False)
+    _state.muted = True
+    try:
+        yield
+    finally:
+        _state.muted = previous
+
+
+def is_muted():
+    """
+    Returns whether note signal handlers are skipped in the current thread
+    :return: bool
+    """
+    return getattr(_state, "muted", False)
+
+
+@receiver(post_save, sender=Note)
+def note_saved(sender, instance, created, **kwargs):
+    """
+    Keeps the author's statistics, activity, site-wide counters,
+    the search index, cached homepage pages and the cached note up to date
+    Runs inside the transaction opened by Note.save
+    """
+    if is_muted():
+        return
+    NoteStats.note_saved(instance, created)
+    counters.note_saved(instance, created)
+    activity.invalidate(instance.user_id)
+    search.note_saved(instance, created)
+    page_cache.note_saved(instance, created)
+    if not created:
+        note_cache.invalidate([instance.pk])
+
+
+@receiver(post_delete, sender=Note)
+def note_deleted(sender, instance, **kwargs):
+    """
+    Keeps the author's statistics, activity, site-wide counters,
+    the search index, cached homepage pages and the cached note up to date
+    Runs inside the deletion transaction
+    """
+    if is_muted():
+        return
+    NoteStats.note_deleted(instance)
+    counters.note_deleted(instance)
+    activity.invalidate(instance.user_id)
+    search.unindex_notes([instance.pk])
+    page_cache.note_deleted(instance)
+    note_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    """
+    Counts registered users
+    """
+    if created:
+        counters.change("total_users", 1)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    """
+    Counts registered users
+    """
+    counters.change("total_users", -1)
@@ -0,0 +1,970 @@
+import asyncio
+import datetime
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import (AsyncClient, AsyncRequestFactory, Client, RequestFactory, TestCase,
+                         TransactionTestCase)
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+
+from api.views import (HomepageAPIView, PublicNotesListAPIView, PublicNotesRetrieveAPIView,
+                       PrivateNotesListAPIView, PrivateNoteRetrieveAPIView)
+from homepage.views import NoteHomePageView
+from note import activity, benchmarks, checks, counters, metrics, note_cache, offload, page_cache, sanitizer
+from note.fields import COMPRESS_THRESHOLD, CompressedText
+from note.models import Note, NoteImport, NoteLike, NoteStats
+from note.pagination import KeysetPaginator, RowValueCompare
+from note.search import SearchResults
+from note.views import NoteListView
+
+
+class NoteLikeConcurrencyTest(TransactionTestCase):
+    """
+    Fires concurrent like requests at a single note
+    and checks that no like update is lost
+    """
+    users_count = 200
+
+    def setUp(self):
+        author = User.objects.create(username="author")
+        self.note = Note.objects.create(user=author, name="Popular", body="<p>body</p>", public=True)
+        self.users = User.objects.bulk_create(
+            [User(username=f"user{i}") for i in range(self.users_count)]
+        )
+        self.clients = []
+        for user in User.objects.filter(username__startswith="user"):
+            client = Client()
+            client.force_login(user)
+            self.clients.append(client)
+
+    def fire(self, clients):
+        """
+        Sends one like request per client, all at the same time
+        :param clients:
+        :return:
+        """
+        barrier = threading.Barrier(len(clients))
+        errors = []
+
+        def like(client):
+            try:
+                barrier.wait()
+                response = client.post(f"/notes/{self.note.pk}/like")
+                if response.status_code != 302:
+                    errors.append(response.status_code)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=like, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_likes(self):
+        self.fire(self.clients)
+        self.note.refresh_from_db()
+        self.assertEqual(NoteLike.objects.filter(note=self.note).count(), self.users_count)
+        self.assertEqual(self.note.likes, self.users_count)
+
+    def test_concurrent_unlikes(self):
+        self.fire(self.clients)
+        self.fire(self.clients[::2])
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.likes, NoteLike.objects.filter(note=self.note).count())
+        self.assertEqual(self.note.likes, self.users_count // 2)
+        # every remaining like weighs about 1, the weights decayed only for the seconds of the test
+        self.assertAlmostEqual(self.note.hot_score, self.note.likes, delta=0.01 * self.note.likes)
+
+    def test_concurrent_toggles_of_a_user(self):
+        user = User.objects.get(username="user0")
+        clients = []
+        for _ in range(11):
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        self.fire(clients)
+        self.note.refresh_from_db()
+        # an odd amount of toggles leaves a single like with a single weight
+        self.assertEqual((self.note.likes, NoteLike.objects.filter(note=self.note).count()), (1, 1))
+        self.assertAlmostEqual(self.note.hot_score, 1, places=2)
+
+    def test_like_keeps_body(self):
+        Note.objects.filter(pk=self.note.pk).update(body="<p>edited elsewhere</p>")
+        self.clients[0].post(f"/notes/{self.note.pk}/like")
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.body, "<p>edited elsewhere</p>")
+        self.assertEqual(self.note.likes, 1)
+
+
+class NoteQueryPlanTest(TestCase):
+    """
+    Runs EXPLAIN on the querysets of every view
+    Fails if a query falls back to a full table scan
+    or sorts rows without an index
+    Walking a (partial) index in order is fine, reading the whole table is not
+    """
+    full_scan = re.compile(r"\bSCAN (TABLE )?note_note\b(?! USING (COVERING )?INDEX)")
+    temp_sort = re.compile(r"USE TEMP B-TREE FOR (ORDER BY|RIGHT PART OF ORDER BY)")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="planner")
+        Note.objects.bulk_create(
+            [Note(user=cls.user, name=f"note {i}", public=i % 2 == 0) for i in range(20)]
+        )
+
+    def get_request(self, path="/", **params):
+        request = RequestFactory().get(path, params)
+        request.user = self.user
+        return request
+
+    def assertIndexed(self, queryset, ordered=True):
+        """
+        Checks query plan of the queryset
+        :param queryset:
+        :param ordered: whether the ordering has to be served by an index
+        :return:
+        """
+        plan = queryset.explain()
+        self.assertIsNone(self.full_scan.search(plan), f"full table scan:\n{queryset.query}\n{plan}")
+        if ordered:
+            self.assertIsNone(self.temp_sort.search(plan), f"unindexed sort:\n{queryset.query}\n{plan}")
+
+    def test_homepage_sorted_by_likes(self):
+        view = NoteHomePageView(request=self.get_request())
+        self.assertIndexed(view.get_queryset())
+
+    def test_homepage_sorted_by_date(self):
+        view = NoteHomePageView(request=self.get_request(sort="date"))
+        self.assertIndexed(view.get_queryset())
+
+    def test_homepage_sorted_by_hot_score(self):
+        view = NoteHomePageView(request=self.get_request(sort="hot"))
+        self.assertIndexed(view.get_queryset())
+
+    def test_homepage_deep_page(self):
+        for sort in ("", "date", "hot"):
+            view = NoteHomePageView(request=self.get_request(sort=sort))
+            queryset = view.get_queryset()
+            paginator = KeysetPaginator(queryset, 5)
+            cursor = paginator.get_page().next_cursor
+            position, _ = paginator.decode_cursor(cursor)
+            self.assertIndexed(queryset.filter(RowValueCompare(paginator.fields, position, "<"))[:5])
+
+    def test_note_list(self):
+        view = NoteListView(request=self.get_request("/notes/"))
+        view.user = self.user
+        self.assertIndexed(view.get_queryset())
+
+    def test_profile_activity(self):
+        starts = activity.get_month_starts(24)
+        self.assertIndexed(
+            Note.objects.filter(user=self.user, date_created__gte=starts[-2], date_created__lt=starts[-1]),
+            ordered=False
+        )
+
+    def test_public_api(self):
+        for sort in ("", "likes", "hot"):
+            view = PublicNotesListAPIView(request=Request(self.get_request("/api/public", sort=sort)))
+            self.assertIndexed(view.get_queryset())
+        view = PublicNotesRetrieveAPIView(request=self.get_request("/api/public/1"))
+        self.assertIndexed(view.get_queryset().filter(pk=1), ordered=False)
+
+    def test_public_api_deep_page(self):
+        for sort in ("", "likes", "hot"):
+            view = PublicNotesListAPIView(request=Request(self.get_request("/api/public", sort=sort)))
+            queryset = view.get_queryset()
+            paginator = KeysetPaginator(queryset, 5)
+            position, _ = paginator.decode_cursor(paginator.get_page().next_cursor)
+            self.assertIndexed(queryset.filter(RowValueCompare(paginator.fields, position, "<"))[:5])
+
+    def test_private_api(self):
+        view = PrivateNotesListAPIView(request=self.get_request("/api/private"))
+        self.assertIndexed(view.get_queryset())
+        view = PrivateNoteRetrieveAPIView(request=self.get_request("/api/private/1"))
+        self.assertIndexed(view.get_queryset().filter(pk=1), ordered=False)
+
+
+class NoteStatsTest(TestCase):
+    """
+    Checks that per user statistics follow note changes
+    """
+
+    def assertStats(self, user, total, public, incomplete):
+        stats = NoteStats.for_user(user)
+        self.assertEqual((stats.total_notes, stats.public_notes, stats.incomplete_notes), (total, public, incomplete))
+
+    def setUp(self):
+        self.user = User.objects.create(username="writer")
+
+    def test_create_update_delete(self):
+        note = Note.objects.create(user=self.user, name="first")
+        Note.objects.create(user=self.user, name="second", public=True, completed=True)
+        self.assertStats(self.user, 2, 1, 1)
+
+        note = Note.objects.get(pk=note.pk)
+        note.public = True
+        note.completed = True
+        note.save()
+        self.assertStats(self.user, 2, 2, 0)
+
+        note.delete()
+        self.assertStats(self.user, 1, 1, 0)
+
+        Note.objects.filter(user=self.user).delete()
+        self.assertStats(self.user, 0, 0, 0)
+
+    def test_save_without_changes(self):
+        note = Note.objects.create(user=self.user, name="first", public=True)
+        note.name = "renamed"
+        note.save()
+        Note(pk=note.pk, user=self.user, name="unloaded", public=False).save()
+        self.assertStats(self.user, 1, 0, 1)
+
+    def test_rebuild(self):
+        Note.objects.bulk_create([Note(user=self.user, name=str(i), public=i % 2 == 0) for i in range(5)])
+        self.assertStats(self.user, 0, 0, 0)
+        NoteStats.rebuild([self.user.pk])
+        self.assertStats(self.user, 5, 3, 5)
+
+    def test_user_delete_cascades(self):
+        Note.objects.create(user=self.user, name="first", public=True)
+        self.user.delete()
+        self.assertFalse(Note.objects.exists())
+        self.assertFalse(NoteStats.objects.exists())
+
+    def test_views_read_stats(self):
+        user = User.objects.create(username="reader")
+        Note.objects.create(user=user, name="note", public=True, completed=True)
+        Note.objects.create(user=user, name="task")
+        self.client.force_login(user)
+
+        response = self.client.get("/notes/")
+        self.assertEqual((response.context["total_notes"], response.context["total_pub"],
+                          response.context["tasks"], response.context["task_completion"]), (2, 1, 1, 50))
+
+        response = self.client.get("/api/profile")
+        self.assertEqual((response.json()["total_notes"], response.json()["public_notes"]), (2, 1))
+
+
+class CountersTest(TestCase):
+    """
+    Checks that cached site-wide counters follow note and user changes
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_follow_changes(self):
+        self.assertEqual(counters.get_counters(), {"total_notes": 0, "total_pub": 0, "total_users": 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create(username="counted")
+            note = Note.objects.create(user=user, name="note")
+            Note.objects.create(user=user, name="shared", public=True)
+        self.assertEqual(counters.get_counters(), {"total_notes": 2, "total_pub": 1, "total_users": 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            note.public = True
+            note.save()
+        self.assertEqual(counters.get_counters()["total_pub"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            note.delete()
+        self.assertEqual(counters.get_counters(), counters.calculate())
+
+    def test_homepage_reads_cache(self):
+        counters.reconcile()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/")
+        self.assertFalse([query for query in queries if 'FROM "auth_user"' in query["sql"]])
+        self.assertFalse([query for query in queries if query["sql"].endswith('FROM "note_note"')])
+
+
+class ActivityTest(TestCase):
+    """
+    Checks monthly activity histogram
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="active")
+
+    def test_month_starts(self):
+        now = timezone.make_aware(datetime.datetime(2021, 2, 15))
+        starts = activity.get_month_starts(3, now)
+        self.assertEqual([(start.year, start.month) for start in starts], [(2021, 2), (2021, 1), (2020, 12), (2021, 3)])
+
+    def test_activity_ignores_previous_years(self):
+        now = timezone.now()
+        Note.objects.create(user=self.user, name="now", date_created=now)
+        Note.objects.create(user=self.user, name="year ago", date_created=now - datetime.timedelta(days=366))
+
+        months = activity.get_activity(self.user, 6)
+        self.assertEqual(len(months), 6)
+        self.assertEqual(months[0], (now.strftime("%B"), 1))
+        self.assertEqual(sum(count for _, count in months), 1)
+        self.assertEqual(sum(count for _, count in activity.get_activity(self.user, 24)), 2)
+
+    @override_settings(NOTES_SHARED_CACHE=True)
+    def test_activity_cached_until_write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Note.objects.create(user=self.user, name="first")
+        activity.get_activity(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(activity.get_activity(self.user)[0][1], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Note.objects.create(user=self.user, name="second")
+        self.assertEqual(activity.get_activity(self.user)[0][1], 2)
+
+    def test_process_local_cache(self):
+        activity.get_activity(self.user)
+        # other processes wouldn't see invalidations of a process-local cache
+        with self.assertNumQueries(1):
+            activity.get_activity(self.user)
+
+    def test_window(self):
+        self.assertEqual(activity.get_window("12"), 12)
+        self.assertEqual(activity.get_window("7"), 6)
+        self.assertEqual(activity.get_window(None), 6)
+
+
+class NoteExcerptTest(TestCase):
+    """
+    Checks excerpts calculated on save
+    """
+
+    def test_excerpt_on_save(self):
+        note = Note.objects.create(user=User.objects.create(username="writer"), name="long", body="<p>" + "word " * 400 + "</p><script>x</script>")
+        self.assertTrue(note.excerpt.startswith("<p>word"))
+        self.assertTrue(note.excerpt.endswith("…</p>"))
+        self.assertNotIn("<script>", note.excerpt)
+        self.assertEqual(note.text_length, 2001)
+
+        note.body = "<p>short &amp; sweet</p>"
+        note.save(update_fields=["body"])
+        note.refresh_from_db()
+        self.assertEqual((note.excerpt, note.text_length), ("<p>short &amp; sweet</p>", 13))
+
+    def test_list_pages_defer_body(self):
+        user = User.objects.create(username="writer")
+        Note.objects.create(user=user, name="note", body="<p>secret body</p>", public=True)
+        self.client.force_login(user)
+        for url in ["/", "/notes/"]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertContains(response, "secret body")
+            self.assertFalse([query for query in queries if '"note_note"."body"' in query["sql"]])
+
+
+class KeysetPaginationTest(TestCase):
+    """
+    Walks public notes page by page in both directions
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        author = User.objects.create(username="author")
+        Note.objects.bulk_create([
+            # plenty of ties on both likes and dates
+            Note(user=author, name=f"note {i}", public=i % 5 != 0, likes=i % 3,
+                 date_edited=now - datetime.timedelta(minutes=i % 7))
+            for i in range(130)
+        ])
+
+    def setUp(self):
+        # pages cached by other tests
+        cache.clear()
+
+    def walk(self, url, get_ids, get_next):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page_ids = get_ids(response)
+            ids.extend(page_ids)
+            pages.append(page_ids)
+            url = get_next(response)
+        return ids, pages
+
+    def test_homepage(self):
+        for sort, ordering in (("", ("-likes", "-date_edited", "-id")), ("&sort=date", ("-date_edited", "-id"))):
+            expected = list(Note.objects.filter(public=True).order_by(*ordering).values_list("id", flat=True))
+            ids, pages = self.walk(
+                f"/?{sort}",
+                lambda response: [note.pk for note in response.context["note_list"]],
+                lambda response: response.context["page_obj"].has_next and
+                f"/?cursor={response.context['page_obj'].next_cursor}{sort}"
+            )
+            self.assertEqual(ids, expected)
+            self.assertEqual(len(pages), 5)
+
+            # and back from the last page
+            page = self.client.get(f"/?cursor={KeysetPaginator(Note.objects.filter(public=True).order_by(*ordering), 25).encode_cursor(Note.objects.get(pk=ids[-1]), reverse=True)}{sort}")
+            self.assertEqual([note.pk for note in page.context["note_list"]], ids[-26:-1])
+
+    def test_api(self):
+        expected = list(Note.objects.filter(public=True).order_by("-likes", "-date_edited", "-id")
+                        .values_list("id", flat=True))
+        ids, pages = self.walk(
+            "/api/public?sort=likes",
+            lambda response: [note["id"] for note in response.json()["results"]],
+            lambda response: response.json()["next"]
+        )
+        self.assertEqual(ids, expected)
+
+        response = self.client.get("/api/public?sort=likes")
+        response = self.client.get(response.json()["next"])
+        previous = self.client.get(response.json()["previous"]).json()
+        self.assertEqual([note["id"] for note in previous["results"]], expected[:100])
+        self.assertIsNone(previous["previous"])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/?cursor=garbage").status_code, 404)
+        self.assertEqual(self.client.get("/api/public?cursor=garbage").status_code, 404)
+
+
+class NoteSearchTest(TestCase):
+    """
+    Checks full-text search over note titles and bodies
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username="searcher")
+        stranger = User.objects.create(username="stranger")
+        Note.objects.create(user=self.user, name="Shopping list", body="<p>Milk &amp; bread</p>", public=True)
+        Note.objects.create(user=self.user, name="Diary", body="<p>bought <b>milk</b> again</p>")
+        Note.objects.create(user=stranger, name="Milk recipes", body="<p>pancakes</p>", public=True)
+        Note.objects.create(user=stranger, name="Secret milk", body="<p>hidden</p>")
+
+    def names(self, results):
+        return [note.name for note in results]
+
+    def test_visibility_and_rank(self):
+        # title matches rank above body matches
+        self.assertEqual(self.names(SearchResults("milk")[:10]), ["Milk recipes", "Shopping list"])
+        results = self.names(SearchResults("milk", user=self.user)[:10])
+        self.assertEqual(results[0], "Milk recipes")
+        self.assertCountEqual(results, ["Milk recipes", "Shopping list", "Diary"])
+        self.assertCountEqual(self.names(SearchResults("milk", user=self.user, include_public=False)[:10]),
+                              ["Shopping list", "Diary"])
+        self.assertEqual(SearchResults("milk", user=self.user).count(), 3)
+        self.assertEqual(self.names(SearchResults("milk", user=self.user)[1:2]), results[1:2])
+
+    def test_index_follows_changes(self):
+        note = Note.objects.get(name="Diary")
+        note.body = "<p>nothing to see</p>"
+        note.save()
+        self.assertEqual(SearchResults("bought", user=self.user).count(), 0)
+        self.assertEqual(SearchResults("nothing", user=self.user).count(), 1)
+        note.delete()
+        self.assertEqual(SearchResults("nothing", user=self.user).count(), 0)
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(SearchResults('"milk" OR NEAR(').count(), 0)
+        self.assertEqual(SearchResults("mil").count(), 2)
+        self.assertEqual(SearchResults("  ").count(), 0)
+
+    def test_endpoints(self):
+        response = self.client.get("/api/search?q=milk")
+        self.assertEqual([note["name"] for note in response.json()["results"]], ["Milk recipes", "Shopping list"])
+        self.assertEqual([note["user"] for note in response.json()["results"]], ["stranger", "searcher"])
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/api/search?q=milk").json()["count"], 3)
+        self.assertEqual(self.names(self.client.get("/?q=milk").context["note_list"]), ["Milk recipes", "Shopping list"])
+        self.assertCountEqual(self.names(self.client.get("/notes/?q=milk").context["note_list"]),
+                              ["Shopping list", "Diary"])
+
+
+@override_settings(NOTES_SHARED_CACHE=True)
+class HomepageCacheTest(TestCase):
+    """
+    Checks the anonymous homepage response cache and its invalidation
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="author")
+        self.note = Note.objects.create(user=self.user, name="Shared", body="<p>body</p>", public=True)
+        self.hidden = Note.objects.create(user=self.user, name="Hidden", body="<p>body</p>")
+
+    def assert_cached(self, url="/"):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(len(queries), 0)
+        return response
+
+    def assert_rendered(self, url="/"):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertGreater(len(queries), 0)
+        return response
+
+    def test_pages_are_cached_per_sort(self):
+        self.assert_rendered()
+        self.assertContains(self.assert_cached(), "Shared")
+        self.assert_rendered("/?sort=date")
+        self.assert_cached("/?sort=date")
+        # search and logged users are never cached
+        self.client.get("/?q=shared")
+        self.assert_rendered("/?q=shared")
+        self.client.force_login(self.user)
+        self.assert_rendered()
+
+    def test_cursor_pages_are_not_cached(self):
+        Note.objects.bulk_create([Note(user=self.user, name=f"Page {i}", public=True) for i in range(30)])
+        cursor = re.search(r'href="\?cursor=([^"&]+)', self.client.get("/").content.decode()).group(1)
+        # any crafted cursor would get an entry of its own
+        self.assert_rendered(f"/?cursor={cursor}")
+        self.assert_rendered(f"/?cursor={cursor}")
+        self.assertEqual(self.client.get("/?cursor=junk").status_code, 404)
+
+    def test_public_changes_invalidate(self):
+        self.client.get("/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.note.set_date_edited()
+            self.note.save()
+        self.assert_rendered()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.note.change_like_user(self.user)
+        self.assertContains(self.assert_rendered(), "> 1</p>")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.note.public = False
+            self.note.save()
+        self.assertNotContains(self.assert_rendered(), "Shared")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hidden.public = True
+            self.hidden.save()
+        self.assertContains(self.assert_rendered(), "Hidden")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hidden.delete()
+        self.assertNotContains(self.assert_rendered(), "Hidden")
+
+    def test_private_changes_keep_cache(self):
+        self.client.get("/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hidden.name = "Still hidden"
+            self.hidden.save()
+            Note.objects.create(user=self.user, name="Another", body="")
+            self.hidden.change_like_user(self.user)
+        self.assert_cached()
+
+
+class SanitizerTest(TestCase):
+    """
+    Checks html sanitizing on every write path
+    """
+
+    def setUp(self):
+        sanitizer.clear()
+        self.user = User.objects.create(username="editor")
+        self.client.force_login(self.user)
+
+    def test_sanitize(self):
+        body = ('<h2 style="text-align: center;">Title</h2><p style="padding-left: 40px;">'
+                '<span style="background-color: #fbeeb8; position: fixed;">text</span><br />'
+                '<a href="javascript:alert(1)" onclick="x()">link</a></p><!-- note --><script>alert(1)</script>')
+        cleaned = sanitizer.sanitize(body)
+        self.assertIn('<h2 style="text-align: center;">Title</h2>', cleaned)
+        self.assertIn('<span style="background-color: #fbeeb8;">text</span><br>', cleaned)
+        self.assertIn("<a>link</a>", cleaned)
+        self.assertIn("&lt;script&gt;", cleaned)
+        self.assertNotIn("note -->", cleaned)
+
+        # unchanged and already cleaned bodies are not parsed again
+        self.assertIs(sanitizer.sanitize(body), cleaned)
+        self.assertIs(sanitizer.sanitize(cleaned), cleaned)
+        self.assertEqual(sanitizer.sanitize(""), "")
+        self.assertIsNone(sanitizer.sanitize(None))
+
+    def test_write_paths(self):
+        self.client.post("/notes/create", {"name": "Form", "body": "<p>form<script>x</script></p>"})
+        note = Note.objects.get(name="Form")
+        self.assertEqual(note.body, "<p>form&lt;script&gt;x&lt;/script&gt;</p>")
+
+        self.client.post(f"/notes/{note.pk}/edit", {"name": "Form", "body": "<p onclick='x()'>edited</p>"})
+        note.refresh_from_db()
+        self.assertEqual(note.body, "<p>edited</p>")
+
+        self.client.post("/api/create", {"name": "Api", "body": "<p>api<script>x</script></p>"})
+        note = Note.objects.get(name="Api")
+        self.assertEqual(note.body, "<p>api&lt;script&gt;x&lt;/script&gt;</p>")
+
+        # the body is optional
+        self.assertEqual(self.client.post("/api/create", {"name": "No body"}).status_code, 201)
+        self.assertIsNone(Note.objects.get(name="No body").body)
+
+        self.client.patch(f"/api/private/{note.pk}/edit", {"body": "<img src=x onerror=alert(1)>"},
+                          content_type="application/json")
+        note.refresh_from_db()
+        self.assertEqual(note.body, '<img src="x">')
+
+
+class ImportNotesTest(TestCase):
+    """
+    Checks the import_notes command
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username="importer")
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "notes.ndjson")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, records, mode="w"):
+        with open(self.path, mode) as file:
+            for record in records:
+                file.write((record if isinstance(record, str) else json.dumps(record)) + "\n")
+
+    def run_import(self, *args, **options):
+        output = io.StringIO()
+        call_command("import_notes", self.path, *args, workers=1, batch_size=2, stdout=output, **options)
+        return output.getvalue()
+
+    def test_import(self):
+        self.write([
+            {"user": "importer", "name": "First", "body": "<p>one<script>x</script></p>", "public": True,
+             "date_created": "2021-01-02T03:04:05+00:00"},
+            "not json",
+            {"user": "ghost", "name": "Lost", "body": ""},
+            {"user": "importer", "name": "", "body": "no name"},
+            {"user": "importer", "name": "Second", "body": None, "completed": True},
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            output = self.run_import()
+        self.assertIn("Imported 2 notes", output)
+        self.assertIn("Skipped 2 records: invalid note", output)
+        self.assertIn("Skipped 1 records: unknown author", output)
+
+        first = Note.objects.get(name="First")
+        self.assertEqual(first.body, "<p>one&lt;script&gt;x&lt;/script&gt;</p>")
+        self.assertEqual(first.excerpt, "<p>one&lt;script&gt;x&lt;/script&gt;</p>")
+        self.assertEqual(first.date_created, datetime.datetime(2021, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc))
+        stats = NoteStats.for_user(self.user)
+        self.assertEqual((stats.total_notes, stats.public_notes, stats.incomplete_notes), (2, 1, 1))
+        self.assertEqual(SearchResults("one").count(), 1)
+        self.assertEqual(NoteImport.objects.get(name="notes.ndjson").position, 5)
+
+    def test_resume(self):
+        self.write([{"name": f"Note {i}", "body": ""} for i in range(3)])
+        self.run_import(user="importer")
+        with self.assertRaises(CommandError):
+            self.run_import(user="importer")
+
+        # only records appended after the previous run are imported
+        self.write([{"name": "Note 3", "body": ""}], mode="a")
+        self.assertIn("Imported 1 notes", self.run_import(user="importer", resume=True))
+        self.assertEqual(sorted(Note.objects.values_list("name", flat=True)), [f"Note {i}" for i in range(4)])
+
+    def test_json_list_and_new_users(self):
+        with open(self.path, "w") as file:
+            json.dump([{"user": "newcomer", "name": "Hello", "body": "<p>hi</p>"}], file)
+        self.run_import(create_users=True)
+        self.assertTrue(User.objects.filter(username="newcomer").exists())
+        self.assertEqual(Note.objects.get(name="Hello").user.username, "newcomer")
+
+
+class BenchmarkTest(TestCase):
+    """
+    Runs the view benchmark suite on generated data to keep views within their query budgets
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("seed_notes", users=5, notes=80, body_size=300, stdout=io.StringIO())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_query_budgets(self):
+        results = benchmarks.run(requests=1)
+        self.assertEqual(len(results), len(benchmarks.get_scenarios(Note(pk=1), Note(pk=2))))
+        self.assertEqual(benchmarks.check(results), [])
+
+    def test_baseline(self):
+        results = {"view": {"p50": 1.0, "p95": 10.0, "queries": 3, "budget": 3}}
+        self.assertEqual(benchmarks.check(results, results), [])
+        slower = {"view": {"p50": 1.0, "p95": 20.0, "queries": 4, "budget": 3}}
+        self.assertEqual(len(benchmarks.check(slower, results)), 3)
+
+
+class MetricsTest(TestCase):
+    """
+    Checks per request metrics and the metrics endpoint
+    """
+
+    def setUp(self):
+        metrics.clear()
+        self.user = User.objects.create(username="watcher")
+        self.note = Note.objects.create(user=self.user, name="Watched", body="<p>body</p>")
+        self.client.force_login(self.user)
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/private/{self.note.pk}")
+        header = response["Server-Timing"]
+        self.assertRegex(header, rf'^sql;dur=[\d.]+;desc="{len(queries)} queries", app;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_metrics_endpoint(self):
+        self.client.get(f"/api/private/{self.note.pk}")
+        self.client.get(f"/api/private/{self.note.pk}")
+        self.client.get("/api/private/export")
+        self.client.generic("BREW", f"/api/private/{self.note.pk}")
+
+        with self.settings(INTERNAL_IPS=["127.0.0.1"]):
+            text = self.client.get("/metrics").content.decode()
+        labels = 'route="/api/private/<int:pk>",method="GET"'
+        self.assertIn(f'notes_request_duration_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'notes_request_sql_queries_bucket{{{labels},le="+Inf"}} 2', text)
+        self.assertIn(f'notes_response_size_bytes_count{{{labels}}} 2', text)
+        # streaming responses have no size
+        self.assertIn('notes_request_sql_queries_count{route="/api/private/export",method="GET"} 1', text)
+        self.assertNotIn('notes_response_size_bytes_count{route="/api/private/export"', text)
+        # unknown methods don't add labels
+        self.assertIn('notes_request_duration_seconds_count{route="/api/private/<int:pk>",method="other"} 1', text)
+
+        # closed without a token to clients outside of INTERNAL_IPS
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with self.settings(NOTES_METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+    def test_histogram(self):
+        histogram = metrics.Histogram("test", "Test", (1, 5), ("route",))
+        for value in (0, 1, 3, 10):
+            histogram.observe(value, "/")
+        self.assertEqual(histogram.render()[2:], [
+            'test_bucket{route="/",le="1"} 2',
+            'test_bucket{route="/",le="5"} 3',
+            'test_bucket{route="/",le="+Inf"} 4',
+            'test_sum{route="/"} 14',
+            'test_count{route="/"} 4',
+        ])
+
+
+@override_settings(NOTES_SHARED_CACHE=True)
+class NoteCacheTest(TestCase):
+    """
+    Checks the note object cache of single note reads
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username="author")
+        self.reader = User.objects.create(username="reader")
+        self.note = Note.objects.create(user=self.author, name="Shared", body="<p>body</p>", public=True)
+        self.private = Note.objects.create(user=self.author, name="Private", body="<p>secret</p>")
+
+    @override_settings(NOTES_SHARED_CACHE=False)
+    def test_requires_shared_cache(self):
+        # invalidations of a process-local cache wouldn't reach other processes
+        self.assertFalse(note_cache.is_enabled())
+        self.assertFalse(page_cache.is_enabled())
+        self.assertEqual(self.client.get(f"/api/public/{self.note.pk}").status_code, 200)
+        self.assertEqual(checks.check_shared_cache(None), [])
+        with self.settings(NOTES_SHARED_CACHE=True):
+            self.assertEqual([message.id for message in checks.check_shared_cache(None)], ["note.W001"])
+
+    def test_cached_reads(self):
+        url = f"/api/public/{self.note.pk}"
+        self.assertEqual(self.client.get(url).json()["name"], "Shared")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()["user"], "author")
+        # the in-process tier doesn't need the shared entry
+        note_cache.get(self.note.pk).name = "Changed copy"
+        cache.delete(f"{note_cache.KEY_PREFIX}{self.note.pk}:{note_cache.get_version(self.note.pk)}")
+        with self.assertNumQueries(0):
+            self.assertEqual(note_cache.get(self.note.pk).name, "Shared")
+
+        self.client.force_login(self.reader)
+        self.client.get(f"/notes/{self.note.pk}")
+        # session, user and like queries
+        with self.assertNumQueries(3):
+            self.assertContains(self.client.get(f"/notes/{self.note.pk}"), "Shared")
+
+    def test_access(self):
+        note_cache.get(self.private.pk)
+        self.assertEqual(self.client.get(f"/api/public/{self.private.pk}").status_code, 404)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(f"/notes/{self.private.pk}").status_code, 404)
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get(f"/notes/{self.private.pk}"), "secret")
+
+    def test_invalidation(self):
+        url = f"/api/public/{self.note.pk}"
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.note.name = "Edited"
+            self.note.save()
+        self.assertEqual(self.client.get(url).json()["name"], "Edited")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.note.change_like_user(self.reader)
+        self.assertEqual(self.client.get(url).json()["likes"], 1)
+
+        self.client.force_login(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch("/api/private/bulk/edit", [{"id": self.note.pk, "public": False}],
+                              content_type="application/json")
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.note.delete()
+        self.assertEqual(self.client.get(f"/notes/{self.note.pk}").status_code, 404)
+
+
+class HotRankingTest(TestCase):
+    """
+    Checks time-decayed hot scores of notes
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username=f"voter{i}") for i in range(3)]
+        self.old = Note.objects.create(user=self.users[0], name="Old", body="", public=True)
+        self.new = Note.objects.create(user=self.users[0], name="New", body="", public=True)
+        self.day = datetime.timedelta(days=1)
+
+    def test_likes(self):
+        self.new.change_like_user(self.users[0])
+        self.new.change_like_user(self.users[1])
+        self.new.refresh_from_db()
+        self.assertAlmostEqual(self.new.hot_score, 2, places=3)
+
+        # an old like removes only its decayed weight
+        NoteLike.objects.filter(note=self.new, user=self.users[0]).update(created=timezone.now() - self.day)
+        self.new.change_like_user(self.users[0])
+        self.new.refresh_from_db()
+        self.assertAlmostEqual(self.new.hot_score, 1.5, places=3)
+
+    def test_decay(self):
+        for user in self.users:
+            self.old.change_like_user(user)
+        self.new.change_like_user(self.users[0])
+        self.assertEqual(Note.decay_hot_scores(now=timezone.now() + self.day), 2)
+        self.old.refresh_from_db()
+        self.assertAlmostEqual(self.old.hot_score, 1.5, places=3)
+
+        # old notes with more likes lose to recently liked ones
+        NoteLike.objects.filter(note=self.old).update(created=timezone.now() - 3 * self.day)
+        self.assertEqual(Note.rebuild_hot_scores(), 2)
+        response = self.client.get("/api/public?sort=hot&fields=name")
+        self.assertEqual([note["name"] for note in response.json()["results"]], ["New", "Old"])
+        self.assertEqual([note.name for note in self.client.get("/?sort=hot").context["note_list"]], ["New", "Old"])
+        self.assertEqual(self.client.get("/api/homepage?sort=hot").json()["results"][0]["name"], "New")
+
+        # weights below MIN_SCORE are dropped
+        Note.decay_hot_scores(now=timezone.now() + 30 * self.day)
+        self.assertFalse(Note.objects.filter(hot_score__gt=0).exists())
+
+
+class CompressedBodyTest(TestCase):
+    """
+    Checks compressed storage of large note bodies
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username="writer")
+        self.body = "<p>" + "compressible words " * (COMPRESS_THRESHOLD // 10) + "</p>"
+        self.note = Note.objects.create(user=self.user, name="Large", body=self.body)
+
+    @staticmethod
+    def get_stored(note):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT typeof(body), length(body) FROM note_note WHERE id = %s", [note.pk])
+            return cursor.fetchone()
+
+    def test_storage(self):
+        stored_type, size = self.get_stored(self.note)
+        self.assertEqual(stored_type, "blob")
+        self.assertLess(size, len(self.body) / 4)
+        small = Note.objects.create(user=self.user, name="Small", body="<p>small</p>")
+        self.assertEqual(self.get_stored(small)[0], "text")
+        self.assertEqual(Note.objects.get(pk=small.pk).body, "<p>small</p>")
+
+    def test_lazy_decompression(self):
+        note = Note.objects.get(pk=self.note.pk)
+        self.assertIsInstance(note.__dict__["body"], CompressedText)
+        self.assertIsNone(note.__dict__["body"]._text)
+        # saved back as it was loaded
+        note.public = True
+        note.save()
+        self.assertIsNone(note.__dict__["body"]._text)
+        self.assertEqual(note.body, self.body)
+        self.assertEqual(self.get_stored(note)[0], "blob")
+
+    def test_edit(self):
+        self.client.force_login(self.user)
+        body = self.body.replace("words", "phrases")
+        response = self.client.put(f"/api/private/{self.note.pk}/edit", {"name": "Large", "body": body},
+                                   content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(f"/api/private/{self.note.pk}").json()["body"], body)
+        self.assertEqual(SearchResults("phrases", user=self.user).count(), 1)
+
+
+class AsyncViewTest(TransactionTestCase):
+    """
+    Checks async public views and the ASGI middleware stack
+    Database work of async views runs in pool threads with their own connections
+    so the data is committed
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="author")
+        self.note = Note.objects.create(user=self.user, name="Shared", body="<p>body</p>", public=True)
+        Note.objects.create(user=self.user, name="Hidden", body="<p>body</p>")
+
+    def call(self, view, path, **kwargs):
+        with self.settings(NOTES_ASYNC_VIEWS=True):
+            view = offload.async_view(view.as_view())
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        return asyncio.run(view(AsyncRequestFactory().get(path), **kwargs))
+
+    def test_async_views(self):
+        response = self.call(PublicNotesListAPIView, "/api/public")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([note["name"] for note in json.loads(response.content)["results"]], ["Shared"])
+
+        response = self.call(PublicNotesRetrieveAPIView, f"/api/public/{self.note.pk}", pk=self.note.pk)
+        self.assertEqual(json.loads(response.content)["user"], "author")
+        self.assertTrue(response.has_header("ETag"))
+
+        data = json.loads(self.call(HomepageAPIView, "/api/homepage?sort=date").content)
+        self.assertEqual(data["results"][0]["excerpt"], "<p>body</p>")
+        self.assertNotIn("body", data["results"][0])
+        self.assertEqual((data["total_notes"], data["total_pub"], data["total_users"]), (2, 1, 1))
+
+    def test_sync_views_by_default(self):
+        view = PublicNotesListAPIView.as_view()
+        self.assertIs(offload.async_view(view), view)
+        self.assertEqual(self.client.get("/api/homepage").json()["results"][0]["name"], "Shared")
+
+    async def test_asgi_metrics(self):
+        response = await AsyncClient().get("/api/homepage")
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response["Server-Timing"], r'^sql;dur=[\d.]+;desc="[1-9]\d* queries"')
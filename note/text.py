@@ -0,0 +1,47 @@
+"""
+Helpers to turn html note bodies into text previews
+"""
+import html
+
+import bleach
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+# amount of characters shown on note cards
+EXCERPT_LENGTH = 1200
+
+# tags kept in excerpts, the rest is stripped
+EXCERPT_TAGS = bleach.ALLOWED_TAGS + ["p", "br", "span", "h1", "h2", "h3", "h4", "h5", "h6"]
+
+
+def make_excerpt(body):
+    """
+    Truncates html body to EXCERPT_LENGTH characters keeping tags balanced
+    Sanitizes the result so it is safe to render
+    :param body: html
+    :return: str
+    """
+    if not body:
+        return ""
+    # html truncation is slow, short bodies are kept whole
+    if len(get_plain_text(body)) > EXCERPT_LENGTH:
+        body = Truncator(body).chars(EXCERPT_LENGTH, html=True)
+    return bleach.clean(
+        body,
+        tags=EXCERPT_TAGS,
+        attributes=bleach.ALLOWED_ATTRIBUTES,
+        styles=bleach.ALLOWED_STYLES,
+        strip=True,
+        strip_comments=True
+    )
+
+
+def get_plain_text(body):
+    """
+    Returns text of the html body without tags and entities
+    :param body: html
+    :return: str
+    """
+    if not body:
+        return ""
+    return html.unescape(strip_tags(body))
@@ -1,11 +1,15 @@
-from django.views.generic import ListView, DetailView, FormView, UpdateView, DeleteView
+from django.views.generic import View, ListView, DetailView, FormView, UpdateView, DeleteView
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
 from django.contrib import messages
-from django.http.response import Http404
+from django.http.response import Http404, HttpResponse
+from django.utils.http import urlencode
 
-from note.models import Note
+from note import metrics, note_cache
+from note.models import Note, NoteStats
 from note.forms import NoteEditForm
+from note.search import SearchResults
 
 
 class NoteListView(ListView):
@@ -20,6 +24,7 @@ class NoteListView(ListView):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.user = None
+        self.search_query = ""
 
     def get_context_data(self, *, object_list=None, **kwargs):
         """
@@ -40,21 +45,16 @@ class NoteListView(ListView):
         """
         context = super().get_context_data(**kwargs)
 
-        # database query to count notes created by an user
-        context["total_notes"] = Note.objects.filter(user=self.user).count()
+        # search query and url params for pagination links
+        context["search_query"] = self.search_query
+        context["page_url"] = "&" + urlencode({"q": self.search_query}) if self.search_query else ""
 
-        # database query to count public notes created by an user
-        context["total_pub"] = Note.objects.filter(user=self.user, public=True).count()
-
-        # database query to count completed notes created by an user
-        context["tasks"] = Note.objects.filter(user=self.user, completed=False).count()
-
-        # tries to calculate completion percentage
-        # avoids ZeroDivisionError
-        try:
-            context["task_completion"] = 100 - int((context["tasks"] / context["total_notes"]) * 100)
-        except ZeroDivisionError:
-            context["task_completion"] = 0
+        # single database query to get precalculated user's note statistics
+        stats = NoteStats.for_user(self.user)
+        context["total_notes"] = stats.total_notes
+        context["total_pub"] = stats.public_notes
+        context["tasks"] = stats.incomplete_notes
+        context["task_completion"] = stats.task_completion
 
         # splits the notes list into two halves to populate template
         context["object_list_odd"] = []
@@ -66,6 +66,20 @@ class NoteListView(ListView):
                 context["object_list_even"].append(note)
         return context
 
+    def get_queryset(self):
+        """
+        Gets notes created by a current user
+        Favorite notes go first
+        If the "q" url param is provided returns ranked search results instead
+        Cards show precalculated excerpts so bodies are not loaded
+        :return:
+        """
+        self.search_query = self.request.GET.get("q", "").strip()
+        if self.search_query:
+            return SearchResults(self.search_query, user=self.user, include_public=False,
+                                 queryset=Note.objects.defer("body"))
+        return Note.objects.filter(user=self.user).order_by("-favorite", "-date_edited").defer("body")
+
     def get(self, request, *args, **kwargs):
         """
         Override to get method
@@ -81,7 +95,6 @@ class NoteListView(ListView):
         # if user is authenticated set the query set
         if request.user.is_authenticated:
             self.user = request.user
-            self.queryset = Note.objects.filter(user=self.user).order_by("-favorite", "-date_edited")
             return super(NoteListView, self).get(request, *args, **kwargs)
         # else redirect to the login page with a corresponding message
         else:
@@ -95,18 +108,19 @@ class NoteDetailView(DetailView):
     Only allows rendering of a note that is public
     Or current user is an author
     If note is not accessible redirects to 404 page
+    The note is read from the note cache
     """
     model = Note
     template_name = "note_detail.html"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
-        context["user_liked"] = self.get_object().get_user_liked(str(self.request.user))
+        context["user_liked"] = self.object.get_user_liked(self.request.user)
         return context
 
     def get_object(self, queryset=None):
-        obj = super().get_object()
-        if obj.user == str(self.request.user) or obj.public:
+        obj = note_cache.get(self.kwargs[self.pk_url_kwarg])
+        if obj is not None and (obj.user_id == self.request.user.pk or obj.public):
             return obj
         else:
             raise Http404
@@ -174,7 +188,7 @@ class NoteUpdateView(UpdateView):
         :return:
         """
         obj = super().get_object(*args, **kwargs)
-        if not obj.user == str(self.request.user):
+        if obj.user_id != self.request.user.pk:
             raise PermissionDenied
         else:
             return obj
@@ -206,29 +220,31 @@ class NoteUpdateView(UpdateView):
         :return:
         """
         note = form.save(commit=False)
-        note.user = str(self.request.user)
         note.set_date_edited()
         note.save()
         return redirect(self.success_url)
 
 
 class NoteLikeUpdateView(UpdateView):
+    """
+    View to like or unlike a note
+    Likes are stored in the NoteLike table
+    """
     model = Note
-    fields = ["liked_users"]
+    fields = []
 
     def post(self, *args, **kwargs):
         """
-        Get Override method
-        Main purpose to allow note creation only to an authenticated user
+        Post Override method
+        Main purpose to allow liking only to an authenticated user
         :param args:
         :param kwargs:
         :return:
         """
-        # if user is logged returns super method
+        # if user is logged toggles the like without saving the whole note
         if self.request.user.is_authenticated:
             note = self.get_object()
-            note.change_like_user(str(self.request.user))
-            note.save()
+            note.change_like_user(self.request.user)
             return redirect(f"/notes/{note.pk}")
         # else redirects to a login page with a corresponding message
         else:
@@ -256,7 +272,25 @@ class NoteDeleteView(DeleteView):
         """
         obj = super().get_object(*args, **kwargs)
         # if current user is not the author redirects to 403 page
-        if not obj.user == str(self.request.user):
+        if obj.user_id != self.request.user.pk:
             raise PermissionDenied
         else:
             return obj
+
+
+class MetricsView(View):
+    """
+    Request metrics in the Prometheus text format
+    Requires the "Authorization: Bearer {token}" header with NOTES_METRICS_TOKEN
+    Without a token only clients of INTERNAL_IPS can read them
+    """
+
+    def get(self, request, *args, **kwargs):
+        token = settings.NOTES_METRICS_TOKEN
+        if token:
+            allowed = request.META.get("HTTP_AUTHORIZATION") == f"Bearer {token}"
+        else:
+            allowed = request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS
+        if not allowed:
+            raise PermissionDenied
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -2,6 +2,13 @@
 ASGI config for notes project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+This is an opt-in entry point, notes.wsgi is recommended (see README), e.g.:
+
+    uvicorn notes.asgi:application --workers 4
+
+Public read endpoints are served by async views here,
+their database work runs in a bounded thread pool (see note/offload.py).
+Other views run on a single thread per worker under Django 3.2.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -12,5 +19,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'notes.settings')
+os.environ.setdefault('NOTES_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "note.middleware.request_metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -86,6 +87,10 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # seconds a writer waits for the database lock before giving up
+        "OPTIONS": {"timeout": 20},
+        # file based test database, in-memory one can't make concurrent writers wait for the lock
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -136,3 +141,80 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Memcached server shared by all server processes, e.g. "127.0.0.1:11211", requires pymemcache
+# The cache is local to every process if empty
+NOTES_CACHE_LOCATION = os.environ.get("NOTES_CACHE_LOCATION", "")
+
+if NOTES_CACHE_LOCATION:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": NOTES_CACHE_LOCATION,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Whether all server processes see the same cache
+# The homepage, note, token and activity caches are only used with a shared cache, otherwise a note made private
+# or a revoked token would still be accepted by processes that didn't save it
+# Set NOTES_SHARED_CACHE=1 with the process-local cache only when the site runs in a single process
+NOTES_SHARED_CACHE = bool(NOTES_CACHE_LOCATION) or os.environ.get("NOTES_SHARED_CACHE", "") == "1"
+
+# Seconds after which cached site-wide counters are recalculated from the database
+# Without NOTES_SHARED_CACHE counters of every process miss changes of other processes for up to this time
+NOTES_COUNTERS_TIMEOUT = 60 * 60
+
+# Seconds homepage pages are cached for anonymous visitors, 0 turns the cache off, requires NOTES_SHARED_CACHE
+# Public note changes drop cached pages right away, site-wide counters on them may lag behind by this time
+NOTES_HOMEPAGE_CACHE_TIMEOUT = 60
+
+# Seconds in which a like loses half of its weight in the hot ranking of public notes
+NOTES_HOT_HALF_LIFE = 24 * 60 * 60
+
+# Seconds single notes are cached for the note page and the public note api, 0 turns the cache off
+# Requires NOTES_SHARED_CACHE
+# Saved, deleted and liked notes are dropped right away, author names may lag behind by this time
+NOTES_NOTE_CACHE_TIMEOUT = 5 * 60
+
+# Seconds API tokens are cached with their users, 0 turns the cache off, requires NOTES_SHARED_CACHE
+# Rotated and deleted tokens, deactivated and changed users are dropped right away
+NOTES_TOKEN_CACHE_TIMEOUT = 5 * 60
+
+# Rate limits of the private, write and search api endpoints in requests per second, minute, hour or day
+# Authenticated clients are limited per token (or logged user), anonymous ones per IP address
+# Reads and writes are counted separately, a missing or None rate turns the limit off
+# Public read endpoints are not limited
+NOTES_API_THROTTLE_RATES = {
+    "user_read": "600/min",
+    "user_write": "60/min",
+    "ip_read": "300/min",
+    "ip_write": "120/min",
+}
+
+# Maximum amount of notes in a single request to the bulk api endpoints
+NOTES_BULK_MAX_ITEMS = 500
+
+# Per request SQL and timing metrics, sent in Server-Timing headers and served at /metrics
+NOTES_METRICS_ENABLED = True
+# Bearer token required to read /metrics, if empty only clients of INTERNAL_IPS can read it
+NOTES_METRICS_TOKEN = os.environ.get("NOTES_METRICS_TOKEN", "")
+
+# Public read endpoints are served by async views, set by notes/asgi.py for the ASGI entry point
+NOTES_ASYNC_VIEWS = os.environ.get("NOTES_ASYNC_VIEWS", "") == "1"
+# Size of the thread pool async views run database work in, limits database connections per process
+NOTES_ASYNC_DB_THREADS = int(os.environ.get("NOTES_ASYNC_DB_THREADS", "8"))
+
+# Results of the benchmark_views command later runs are compared with, the path can be set by the environment
+NOTES_BENCHMARK_BASELINE = os.environ.get("NOTES_BENCHMARK_BASELINE", BASE_DIR / "benchmark_baseline.json")
+
+# Default amount of months shown in user activity charts: 6, 12 or 24
+NOTES_ACTIVITY_MONTHS = 6
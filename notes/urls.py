@@ -25,6 +25,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 from homepage.views import NoteHomePageView
+from note.views import MetricsView
 
 
 urlpatterns = [
@@ -41,6 +42,9 @@ urlpatterns = [
     # notes url
     path("notes/", include(notes_urls)),
 
+    # request metrics for Prometheus
+    path("metrics", MetricsView.as_view()),
+
     # TinyMCE text editor
     path("tinymce/", include("tinymce.urls")),
 
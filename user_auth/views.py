@@ -3,10 +3,10 @@ from user_auth.forms import RegisterForm, LoginForm, ProfileUpdateForm
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import redirect
 from django.contrib import messages
-import datetime
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
-from note.models import Note
+from note import activity
+from note.models import NoteStats
 from django.contrib.auth.password_validation import validate_password, ValidationError
 
 
@@ -128,7 +128,7 @@ class ProfileView(UpdateView):
         Total notes created
         Total notes published
         User registration date
-        Generates activity data for last 6 months for data chart
+        Generates activity data for last 6, 12 or 24 months for data chart
         Shows user api Token if available
         Otherwise shows button to generate one
         :param kwargs:
@@ -137,34 +137,22 @@ class ProfileView(UpdateView):
         # calls super method
         context = super().get_context_data()
 
-        # gets total and public notes
-        context["total_notes"] = Note.objects.filter(user=self.request.user).count()
-        context["total_pub"] = Note.objects.filter(user=self.request.user, public=True).count()
+        # gets total and public notes from precalculated statistics
+        stats = NoteStats.for_user(self.request.user)
+        context["total_notes"] = stats.total_notes
+        context["total_pub"] = stats.public_notes
 
         # gets user's registration date
         context["date_registered"] = User.objects.get(username=self.request.user).date_joined
 
-        # Generate label and data set consisting of last 6 months
-        now = datetime.datetime.now()
-        context["chart_data_labels"] = []
-        context["chart_data_data"] = []
-
-        # Gets last 6 month names and note stats
-        for _ in range(0, 6):
-            # Appends month name
-            context["chart_data_labels"].append(now.strftime("%B"))
-
-            # Appends amount of notes created in that mounth
-            context["chart_data_data"].append(
-                Note.objects.filter(user=self.request.user, date_created__month=now.strftime("%m")).count()
-            )
-
-            # Gets previous month
-            now = now.replace(day=1) - datetime.timedelta(days=1)
+        # Gets activity data for the chart with a single cached query
+        # window of 6, 12 or 24 months can be selected by the months url param
+        context["activity_months"] = activity.get_window(self.request.GET.get("months"))
+        user_activity = activity.get_activity(self.request.user, context["activity_months"])
 
         # Reverses list (Needed for js data filling)
-        context["chart_data_labels"].reverse()
-        context["chart_data_data"].reverse()
+        context["chart_data_labels"] = [label for label, _ in reversed(user_activity)]
+        context["chart_data_data"] = [count for _, count in reversed(user_activity)]
 
         # If token is generated passes it to context data
         try: